@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for tap-harvest.
+
+Times, in fresh processes, how long it takes to import the tap, to run
+`tap-harvest --discover`, and to run an incremental sync that finds nothing
+new against the mock API (benchmarks/mock_api.py). The slowest imports are
+taken from `python -X importtime`.
+
+    python -m benchmarks.bench_startup --repeat 20 --output startup.json
+    python -m benchmarks.bench_startup --compare startup.json
+
+The empty sync also imports the mock API, which is small next to the tap's
+own imports but is included in its time.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_sync import _git_revision, ensure_dataset
+
+# far enough ahead that every stream is empty
+FUTURE_DATE = "2100-01-01T00:00:00Z"
+
+
+def _write_config(directory):
+    path = os.path.join(directory, "config.json")
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump({"client_id": "bench", "client_secret": "bench",
+                   "refresh_token": "bench", "start_date": FUTURE_DATE,
+                   "user_agent": "tap-harvest-benchmark"}, handle)
+    return path
+
+
+def scenarios(config_path, store_dir):
+    """Returns [(name, command)]."""
+    return [
+        ("import", [sys.executable, "-c", "import tap_harvest"]),
+        ("discover", [sys.executable, "-c", "import tap_harvest; tap_harvest.main()",
+                      "--config", config_path, "--discover"]),
+        ("empty_sync", [sys.executable, "-m", "benchmarks.bench_startup",
+                        "--worker", store_dir, "--config", config_path]),
+    ]
+
+
+def run_worker(store_dir, config_path):
+    """Runs an incremental sync against the mock API in this process."""
+    from benchmarks.mock_api import MockStore, install # pylint: disable=import-outside-toplevel
+
+    with install(MockStore(store_dir)):
+        sys.argv = ["tap-harvest", "--config", config_path]
+        import tap_harvest # pylint: disable=import-outside-toplevel
+        tap_harvest.main()
+
+
+def time_command(command, repeat):
+    # an installed tap has .pyc files, so let the warm-up run write them
+    env = {key: value for key, value in os.environ.items()
+           if key != "PYTHONDONTWRITEBYTECODE"}
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, env=env)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def slowest_imports(count):
+    """Returns [(module, cumulative microseconds)] for the slowest imports of the tap."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import tap_harvest"],
+                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE=""))
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        imports.append((module.rstrip(), int(cumulative)))
+    imports.sort(key=lambda item: -item[1])
+    return imports[:count]
+
+
+def run(args):
+    store_dir = ensure_dataset(args.store_root, args.scale, args.seed)
+    results = {"git_revision": _git_revision(), "repeat": args.repeat, "scenarios": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = _write_config(directory)
+        for name, command in scenarios(config_path, store_dir):
+            # the first run warms the filesystem cache and writes .pyc files
+            time_command(command, 1)
+            timings = time_command(command, args.repeat)
+            results["scenarios"][name] = {"median_ms": statistics.median(timings),
+                                          "best_ms": min(timings)}
+            print("{:<12} {:>8.1f} ms (best {:>8.1f})".format(
+                name, statistics.median(timings), min(timings)), file=sys.stderr)
+
+    results["slowest_imports"] = slowest_imports(args.imports)
+    for module, cumulative in results["slowest_imports"]:
+        print("  {:<40} {:>8.1f} ms".format(module.strip(), cumulative / 1000), file=sys.stderr)
+    return results
+
+
+def compare(baseline, current, threshold):
+    regressions = []
+    for name, scenario in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None or not before["median_ms"]:
+            continue
+        change = (scenario["median_ms"] - before["median_ms"]) / before["median_ms"]
+        if change > threshold:
+            regressions.append((name, before["median_ms"], scenario["median_ms"], change))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--imports", type=int, default=15,
+                        help="Number of slowest imports to report")
+    parser.add_argument("--scale", type=float, default=0.001,
+                        help="Scale of the dataset served to the empty sync")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store-root", default=os.path.join(tempfile.gettempdir(),
+                                                             "tap-harvest-bench"))
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args.worker, args.config)
+        return
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            regressions = compare(json.load(handle), results, args.threshold)
+        for name, before, after, change in regressions:
+            print("REGRESSION {}: {:.1f} -> {:.1f} ms ({:+.1%})".format(
+                name, before, after, change), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for tap-harvest.
+
+Runs `tap_harvest.main_impl` against the mock API (benchmarks/mock_api.py)
+at several dataset sizes, each in a fresh process, and records per-stream
+records/sec, requests issued, bytes read, CPU time, peak RSS and wall time.
+
+    python -m benchmarks.bench_sync --scales 0.001,0.01 --output results.json
+    python -m benchmarks.bench_sync --scales 0.001,0.01 --compare results.json
+
+With --compare, the run is checked against a previous results file and the
+process exits with status 1 if any metric regressed beyond --threshold.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.dataset import generate_dataset
+
+# metric -> True when a larger value is better
+RUN_METRICS = {
+    "wall_time": False,
+    "cpu_time": False,
+    "peak_rss_kb": False,
+    "requests": False,
+    "bytes_read": False,
+    "records_per_sec": True,
+}
+
+STREAM_PATTERN = re.compile(r'^\{"type": "(\w+)", "stream": "(\w+)"')
+
+
+class CountingSink:
+    """
+    Stands in for sys.stdout. Counts RECORD messages per stream and charges
+    the time since the previous message to the stream of the current one.
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self.messages = 0
+        self._last = time.perf_counter()
+
+    def write(self, data):
+        now = time.perf_counter()
+        match = STREAM_PATTERN.match(data)
+        if match is not None:
+            stats = self.streams.setdefault(match.group(2), {"records": 0, "seconds": 0.0})
+            stats["seconds"] += now - self._last
+            if match.group(1) == "RECORD":
+                stats["records"] += 1
+        if data != "\n":
+            self.messages += 1
+        self._last = now
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def lift_rate_limits(tap_harvest):
+    """
+    Lifts the tap's rate limiters, as the mock API has no rate limit and their
+    sleeps would otherwise make up most of the wall time. Returns False when
+    the tap's limiters cannot be reached, as in releases that use
+    singer.utils.ratelimit.
+    """
+    funcs = [getattr(tap_harvest, name, None) for name in ("request", "request_report")]
+    limiters = [getattr(func, "limiter", None) for func in funcs if func is not None]
+    if not limiters or None in limiters:
+        return False
+    for limiter in limiters:
+        limiter.limit = float("inf")
+    return True
+
+
+def run_worker(store_dir, start_date, latency):
+    """Runs one sync in this process and prints its measurements as JSON."""
+    # imported here so the parent process never loads the tap
+    import tap_harvest # pylint: disable=import-outside-toplevel
+    from benchmarks.mock_api import MockStore, install # pylint: disable=import-outside-toplevel
+    from tap_harvest import memory # pylint: disable=import-outside-toplevel
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as handle:
+        json.dump({"client_id": "bench", "client_secret": "bench",
+                   "refresh_token": "bench", "start_date": start_date,
+                   "user_agent": "tap-harvest-benchmark"}, handle)
+        config_path = handle.name
+
+    if not lift_rate_limits(tap_harvest):
+        print("the tap's rate limiters could not be lifted, wall time includes their sleeps",
+              file=sys.stderr)
+    sink = CountingSink()
+    stdout = sys.stdout
+    sys.argv = ["tap-harvest", "--config", config_path]
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    try:
+        with install(MockStore(store_dir), latency=latency) as adapter:
+            sys.stdout = sink
+            tap_harvest.main_impl()
+    finally:
+        sys.stdout = stdout
+        os.unlink(config_path)
+    wall_time = time.perf_counter() - started
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    records = sum(stats["records"] for stats in sink.streams.values())
+    for stats in sink.streams.values():
+        stats["records_per_sec"] = (stats["records"] / stats["seconds"]
+                                    if stats["seconds"] else 0.0)
+    json.dump({
+        "wall_time": wall_time,
+        "cpu_time": (usage.ru_utime + usage.ru_stime
+                     - usage_before.ru_utime - usage_before.ru_stime),
+        "peak_rss_kb": memory.peak_rss_bytes() // 1024,
+        "requests": adapter.requests,
+        "bytes_read": adapter.bytes_sent,
+        "requests_by_resource": adapter.requests_by_resource,
+        "messages": sink.messages,
+        "records": records,
+        "records_per_sec": records / wall_time if wall_time else 0.0,
+        "streams": sink.streams,
+    }, stdout)
+
+
+def ensure_dataset(store_root, scale, seed):
+    store_dir = os.path.join(store_root, "scale-{}-seed-{}".format(scale, seed))
+    if not os.path.exists(os.path.join(store_dir, "manifest.json")):
+        print("generating dataset at scale {} in {}".format(scale, store_dir), file=sys.stderr)
+        generate_dataset(store_dir, scale=scale, seed=seed)
+    return store_dir
+
+
+def run_benchmark(args):
+    runs = []
+    for scale in args.scales:
+        store_dir = ensure_dataset(args.store_root, scale, args.seed)
+        with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as handle:
+            manifest = json.load(handle)
+
+        command = [sys.executable, "-m", "benchmarks.bench_sync", "--worker", store_dir,
+                   "--start-date", manifest["params"]["start_date"],
+                   "--latency", str(args.latency)]
+        result = subprocess.run(command, check=True, stdout=subprocess.PIPE,
+                                stderr=None if args.verbose else subprocess.DEVNULL)
+        run = json.loads(result.stdout)
+        run["scale"] = scale
+        run["dataset"] = manifest["counts"]
+        runs.append(run)
+        print("scale {:<8} {:>10} records {:>8.1f}s wall {:>8.1f}s cpu {:>10} KB rss "
+              "{:>7} requests {:>10.0f} records/s".format(
+                  scale, run["records"], run["wall_time"], run["cpu_time"],
+                  run["peak_rss_kb"], run["requests"], run["records_per_sec"]),
+              file=sys.stderr)
+
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency": args.latency,
+        "runs": runs,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _change(baseline, current, higher_is_better):
+    if not baseline:
+        return 0.0
+    change = (current - baseline) / baseline
+    return -change if higher_is_better else change
+
+
+def compare(baseline, current, threshold, min_records=1000):
+    """
+    Returns a list of (scale, metric, baseline, current, change) regressions.
+    Streams with fewer than `min_records` records are too noisy to compare.
+    """
+    regressions = []
+    baseline_runs = {run["scale"]: run for run in baseline["runs"]}
+    for run in current["runs"]:
+        previous = baseline_runs.get(run["scale"])
+        if previous is None:
+            continue
+
+        checks = [(metric, previous.get(metric), run.get(metric), higher_is_better)
+                  for metric, higher_is_better in RUN_METRICS.items()]
+        for stream, stats in run["streams"].items():
+            before = previous["streams"].get(stream, {})
+            if stats["records"] < min_records:
+                continue
+            checks.append(("{}.records_per_sec".format(stream),
+                           before.get("records_per_sec"), stats["records_per_sec"], True))
+
+        for metric, before, after, higher_is_better in checks:
+            if before is None or after is None:
+                continue
+            change = _change(before, after, higher_is_better)
+            if change > threshold:
+                regressions.append((run["scale"], metric, before, after, change))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="0.001,0.01",
+                        type=lambda value: [float(scale) for scale in value.split(",")],
+                        help="Comma separated dataset scales (see benchmarks/dataset.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store-root", default=os.path.join(tempfile.gettempdir(),
+                                                             "tap-harvest-bench"),
+                        help="Where generated datasets are cached")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Simulated network latency per request, in seconds")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative change that counts as a regression")
+    parser.add_argument("--min-records", type=int, default=1000,
+                        help="Skip per-stream comparisons below this many records")
+    parser.add_argument("--verbose", action="store_true", help="Show the tap's log output")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--start-date", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args.worker, args.start_date, args.latency)
+        return
+
+    results = run_benchmark(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            regressions = compare(json.load(handle), results, args.threshold,
+                                  args.min_records)
+        for scale, metric, before, after, change in regressions:
+            print("REGRESSION scale {} {}: {:.4g} -> {:.4g} ({:+.1%})".format(
+                scale, metric, before, after, change), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("no regressions beyond {:.0%}".format(args.threshold), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
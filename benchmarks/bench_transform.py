@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the per-record transform path of tap-harvest.
+
+Each case runs one stage of `sync_endpoint` over representative rows from a
+generated dataset and reports ns/row (median and best of --repeat runs) and
+allocations/row, measured with tracemalloc as the peak bytes allocated while
+processing the rows and the number of memory blocks still held afterwards.
+Page cases run the whole transform of `sync_endpoint` over pages of rows, on
+the row path and on the columnar path (`columnar_transform`).
+
+    python -m benchmarks.bench_transform --rows 2000 --output transform.json
+    python -m benchmarks.bench_transform --compare transform.json
+"""
+
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import tap_harvest
+from singer import Transformer
+from singer.transform import string_to_datetime
+from tap_harvest.columnar import ColumnarTransform
+
+from benchmarks.bench_sync import ensure_dataset
+from benchmarks.mock_api import MockStore
+
+TIME_ENTRY_OBJECTS = ['user', 'user_assignment', 'client', 'project', 'task',
+                      'task_assignment', 'external_reference', 'invoice']
+EXPENSE_OBJECTS = ['client', 'project', 'expense_category', 'user', 'user_assignment',
+                   'invoice']
+INVOICE_OBJECTS = ['client', 'estimate', 'retainer', 'creator']
+
+
+def load_rows(store_dir, resource, limit):
+    _, rows, _ = MockStore(store_dir).page(resource, per_page=limit)
+    return [json.loads(row) for row in rows]
+
+
+def _prepared(rows, map_handler=None, object_to_id=None, schema=None):
+    """Runs the stages before Transformer.transform, as sync_endpoint does."""
+    prepared = []
+    for row in copy.deepcopy(rows):
+        if map_handler is not None:
+            row = map_handler(row)
+        if object_to_id is not None:
+            tap_harvest.add_object_ids(row, object_to_id)
+        if schema is not None:
+            tap_harvest.remove_empty_date_times(row, schema)
+        prepared.append(row)
+    return prepared
+
+
+def build_cases(store_dir, limit):
+    """Returns [(name, inputs, fn(input))]."""
+    schemas = {name: tap_harvest.load_schema(name)
+               for name in ("time_entries", "expenses", "invoices", "invoice_line_items")}
+    time_entries = load_rows(store_dir, "time_entries", limit)
+    expenses = load_rows(store_dir, "expenses", limit)
+    invoices = load_rows(store_dir, "invoices", limit)
+    line_items = [(line_item, invoice) for invoice in invoices
+                  for line_item in invoice["line_items"]]
+
+    transformer = Transformer()
+    transformed_entries = [
+        transformer.transform(row, schemas["time_entries"])
+        for row in _prepared(time_entries, None, TIME_ENTRY_OBJECTS, schemas["time_entries"])]
+
+    return [
+        ("remove_empty_date_times[time_entries]",
+         _prepared(time_entries, None, TIME_ENTRY_OBJECTS),
+         lambda row: tap_harvest.remove_empty_date_times(row, schemas["time_entries"])),
+        ("append_times_to_dates[time_entries]",
+         transformed_entries,
+         lambda item: tap_harvest.append_times_to_dates(item, ["spent_date"])),
+        ("normalize_datetime[time_entries.updated_at]",
+         [row["updated_at"] for row in time_entries],
+         tap_harvest.normalize_datetime),
+        ("string_to_datetime[time_entries.updated_at]",
+         [row["updated_at"] for row in time_entries],
+         string_to_datetime),
+        ("add_object_ids[time_entries]",
+         time_entries,
+         lambda row: tap_harvest.add_object_ids(row, TIME_ENTRY_OBJECTS)),
+        ("map_expense[expenses]",
+         expenses,
+         tap_harvest.map_expense),
+        ("map_invoice_line_item[invoices]",
+         line_items,
+         lambda pair: tap_harvest.map_invoice_line_item(*pair)),
+        ("Transformer.transform[time_entries]",
+         _prepared(time_entries, None, TIME_ENTRY_OBJECTS, schemas["time_entries"]),
+         lambda row: transformer.transform(row, schemas["time_entries"])),
+        ("Transformer.transform[expenses]",
+         _prepared(expenses, tap_harvest.map_expense, EXPENSE_OBJECTS, schemas["expenses"]),
+         lambda row: transformer.transform(row, schemas["expenses"])),
+        ("Transformer.transform[invoices]",
+         _prepared(invoices, None, INVOICE_OBJECTS, schemas["invoices"]),
+         lambda row: transformer.transform(row, schemas["invoices"])),
+        ("Transformer.transform[invoice_line_items]",
+         [tap_harvest.map_invoice_line_item(*pair) for pair in copy.deepcopy(line_items)],
+         lambda row: transformer.transform(row, schemas["invoice_line_items"])),
+    ]
+
+
+def build_page_cases(store_dir, limit, page_size):
+    """Returns [(name, pages, fn(page))] for the transform of whole pages."""
+    cases = []
+    for stream, map_handler, object_to_id in (
+            ("time_entries", None, TIME_ENTRY_OBJECTS),
+            ("expenses", tap_harvest.map_expense, EXPENSE_OBJECTS)):
+        schema = tap_harvest.load_schema(stream)
+        rows = load_rows(store_dir, stream, limit)
+        pages = [rows[start:start + page_size] for start in range(0, len(rows), page_size)]
+        transformer = Transformer()
+        columns = ColumnarTransform(schema, transformer)
+
+        def row_path(page, schema=schema, map_handler=map_handler, object_to_id=object_to_id,
+                     transformer=transformer):
+            return list(tap_harvest.transform_rows(page, schema, transformer,
+                                                   map_handler=map_handler,
+                                                   object_to_id=object_to_id))
+
+        def columnar_path(page, columns=columns, map_handler=map_handler,
+                          object_to_id=object_to_id):
+            return columns.transform(page, map_handler, object_to_id)
+
+        cases.append(("transform_rows[{}]".format(stream), pages, row_path))
+        cases.append(("ColumnarTransform[{}]".format(stream), pages, columnar_path))
+    return cases
+
+
+def measure(inputs, func, repeat, rows_per_input=1):
+    """
+    Returns ns/row timings of each repeat and allocation figures per row.
+    `rows_per_input` is the number of rows in each input, for pages.
+    """
+    count = len(inputs) * rows_per_input
+    timings = []
+    for _ in range(repeat):
+        # the stages mutate their input, so every repeat gets a fresh copy
+        rows = copy.deepcopy(inputs)
+        started = time.perf_counter_ns()
+        for row in rows:
+            func(row)
+        timings.append((time.perf_counter_ns() - started) / count)
+
+    rows = copy.deepcopy(inputs)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    blocks_before = sys.getallocatedblocks()
+    results = [func(row) for row in rows]
+    current, peak = tracemalloc.get_traced_memory()
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+    del results
+
+    return timings, {
+        "alloc_bytes_per_row": (peak - before) / count,
+        "retained_bytes_per_row": (current - before) / count,
+        "retained_blocks_per_row": (blocks_after - blocks_before) / count,
+    }
+
+
+def run(args):
+    store_dir = ensure_dataset(args.store_root, args.scale, args.seed)
+    cases = {}
+    runs = [(case, False) for case in build_cases(store_dir, args.rows)] + \
+        [(case, True) for case in build_page_cases(store_dir, args.rows, args.page_size)]
+    for (name, inputs, func), paged in runs:
+        if args.filter and args.filter not in name:
+            continue
+        rows_per_input = sum(len(page) for page in inputs) / len(inputs) if paged else 1
+        timings, allocations = measure(inputs, func, args.repeat, rows_per_input)
+        cases[name] = dict(allocations,
+                           rows=round(len(inputs) * rows_per_input),
+                           ns_per_row=statistics.median(timings),
+                           best_ns_per_row=min(timings))
+        print("{:<45} {:>10.0f} ns/row (best {:>8.0f}) {:>9.0f} B/row {:>6.1f} blocks/row".format(
+            name, cases[name]["ns_per_row"], cases[name]["best_ns_per_row"],
+            allocations["alloc_bytes_per_row"], allocations["retained_blocks_per_row"]),
+              file=sys.stderr)
+    return {"scale": args.scale, "rows": args.rows, "repeat": args.repeat, "cases": cases}
+
+
+def compare(baseline, current, threshold):
+    regressions = []
+    for name, case in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None or not before["ns_per_row"]:
+            continue
+        change = (case["ns_per_row"] - before["ns_per_row"]) / before["ns_per_row"]
+        if change > threshold:
+            regressions.append((name, before["ns_per_row"], case["ns_per_row"], change))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000, help="Rows per stream")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--page-size", type=int, default=100,
+                        help="Rows per page in the page cases")
+    parser.add_argument("--filter", help="Only run cases whose name contains this")
+    parser.add_argument("--scale", type=float, default=0.001,
+                        help="Scale of the dataset the rows are drawn from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store-root", default=os.path.join(tempfile.gettempdir(),
+                                                             "tap-harvest-bench"))
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            regressions = compare(json.load(handle), results, args.threshold)
+        for name, before, after, change in regressions:
+            print("REGRESSION {}: {:.0f} -> {:.0f} ns/row ({:+.1%})".format(
+                name, before, after, change), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+Synthetic, referentially valid Harvest dataset generator.
+
+Scalar fields are generated from the JSON schemas in `tap_harvest/schemas/`.
+Rows are then reshaped into the raw API form, i.e. with nested objects
+(`client`, `project`, `line_items`, ...) instead of the `*_id` columns that
+the tap derives itself. The result is written to a store directory that
+`benchmarks/mock_api.py` serves.
+
+Store layout:
+    manifest.json          generation parameters, row counts and company
+    <resource>.rows        one row per line: "<parent id>\t<updated epoch>\t<json>"
+
+    python -m benchmarks.dataset --out /tmp/harvest-small --scale 0.01
+"""
+
+import argparse
+import calendar
+import itertools
+import json
+import os
+import random
+import time
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "tap_harvest", "schemas")
+
+# Row counts at scale=1.0. Children (contacts per client, messages per
+# invoice, ...) are derived from their parents.
+BASE_COUNTS = {
+    "clients": 2000,
+    "contacts": 4000,
+    "roles": 25,
+    "users": 5000,
+    "tasks": 300,
+    "projects": 10000,
+    "expense_categories": 30,
+    "expenses": 200000,
+    "invoice_item_categories": 12,
+    "invoices": 50000,
+    "estimate_item_categories": 12,
+    "estimates": 10000,
+    "time_entries": 2000000,
+    "external_references": 500,
+}
+TASKS_PER_PROJECT = 4
+USERS_PER_PROJECT = 3
+
+# resource (API path, with parent ids removed) -> (schema name, response key)
+RESOURCES = {
+    "clients": ("clients", "clients"),
+    "contacts": ("contacts", "contacts"),
+    "roles": ("roles", "roles"),
+    "users": ("users", "users"),
+    "tasks": ("tasks", "tasks"),
+    "projects": ("projects", "projects"),
+    "task_assignments": ("project_tasks", "task_assignments"),
+    "user_assignments": ("project_users", "user_assignments"),
+    "users/project_assignments": ("user_projects", "project_assignments"),
+    "expense_categories": ("expense_categories", "expense_categories"),
+    "expenses": ("expenses", "expenses"),
+    "invoice_item_categories": ("invoice_item_categories", "invoice_item_categories"),
+    "invoices": ("invoices", "invoices"),
+    "invoices/messages": ("invoice_messages", "invoice_messages"),
+    "invoices/payments": ("invoice_payments", "invoice_payments"),
+    "estimate_item_categories": ("estimate_item_categories", "estimate_item_categories"),
+    "estimates": ("estimates", "estimates"),
+    "estimates/messages": ("estimate_messages", "estimate_messages"),
+    "time_entries": ("time_entries", "time_entries"),
+}
+
+# Columns the tap derives from nested objects; the raw API does not send them.
+DERIVED_FIELDS = {
+    "contacts": ["client_id"],
+    "projects": ["client_id"],
+    "task_assignments": ["project_id", "task_id"],
+    "user_assignments": ["project_id", "user_id"],
+    "users/project_assignments": ["project_id", "client_id", "user_id"],
+    "expenses": ["client_id", "project_id", "expense_category_id", "user_id",
+                 "user_assignment_id", "invoice_id", "receipt_url", "receipt_file_name",
+                 "receipt_file_size", "receipt_content_type"],
+    "invoices": ["client_id", "estimate_id", "retainer_id", "creator_id"],
+    "invoices/messages": ["invoice_id"],
+    "invoices/payments": ["invoice_id", "payment_gateway_id", "payment_gateway_name"],
+    "estimates": ["client_id", "creator_id"],
+    "estimates/messages": ["estimate_id"],
+    "time_entries": ["user_id", "user_assignment_id", "client_id", "project_id", "task_id",
+                     "task_assignment_id", "external_reference_id", "invoice_id"],
+}
+
+# Fields the tap relies on being present, never nulled
+NEVER_NULL = {"id", "created_at", "updated_at", "user_ids", "line_items", "task_assignments"}
+
+# `date-time` fields that Harvest actually sends as plain dates
+DATE_FIELDS = {"spent_date", "issue_date", "due_date", "period_start", "period_end",
+               "paid_date", "send_reminder_on", "over_budget_notification_date",
+               "starts_on", "ends_on"}
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+         "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+         "quebec", "romeo", "sierra", "tango", "uniform", "victor", "whiskey", "yankee"]
+CURRENCIES = ["USD", "EUR", "GBP", "CAD", "AUD"]
+SERVICES = ["jira", "trello", "github", "asana", "basecamp"]
+
+
+def _types(subschema):
+    types = subschema.get("type", [])
+    if not isinstance(types, list):
+        types = [types]
+    return [typ for typ in types if typ != "null"], "null" in types
+
+
+def _stamp(epoch):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+def _date(epoch):
+    return time.strftime("%Y-%m-%d", time.gmtime(epoch))
+
+
+def _epoch(value):
+    return calendar.timegm(time.strptime(value, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+class _Skewed:
+    """Zipf-like picker: item i is chosen with weight 1 / (i + 1) ** skew."""
+
+    def __init__(self, rng, items, skew):
+        self._rng = rng
+        self.items = list(items)
+        weights = [1.0 / (i + 1) ** skew for i in range(len(self.items))]
+        self._cum_weights = list(itertools.accumulate(weights))
+
+    def pick(self):
+        return self._rng.choices(self.items, cum_weights=self._cum_weights)[0]
+
+
+class StoreWriter:
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.counts = {}
+        self._files = {}
+        os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, resource, row, parent_id=None):
+        handle = self._files.get(resource)
+        if handle is None:
+            path = os.path.join(self.out_dir, resource.replace("/", "__") + ".rows")
+            handle = self._files[resource] = open(path, "w", encoding="utf-8")
+            self.counts[resource] = 0
+
+        handle.write("{}\t{}\t{}\n".format("" if parent_id is None else parent_id,
+                                          _epoch(row["updated_at"]),
+                                          json.dumps(row, separators=(",", ":"))))
+        self.counts[resource] += 1
+
+    def close(self, manifest):
+        for handle in self._files.values():
+            handle.close()
+        manifest["counts"] = self.counts
+        with open(os.path.join(self.out_dir, "manifest.json"), "w", encoding="utf-8") as handle:
+            json.dump(manifest, handle, indent=2, sort_keys=True)
+
+
+class DatasetGenerator: # pylint: disable=too-many-instance-attributes
+    """
+    Generates a consistent dataset: every nested reference (client, project,
+    user assignment, task assignment, invoice, ...) points at a row that
+    exists in its own resource.
+
+    scale         multiplier applied to BASE_COUNTS
+    skew          Zipf exponent used to pick users, clients and message counts;
+                  0 is uniform, larger values concentrate activity on fewer rows
+    null_density  probability that a nullable, non-key field is null
+    """
+
+    def __init__(self, scale=0.01, skew=1.1, null_density=0.1, seed=0,
+                 start_date="2017-01-01T00:00:00Z", end_date="2019-01-01T00:00:00Z"):
+        self.scale = scale
+        self.skew = skew
+        self.null_density = null_density
+        self.seed = seed
+        self.start_date = start_date
+        self.end_date = end_date
+        self.rng = random.Random(seed)
+        self._start = _epoch(start_date)
+        self._end = _epoch(end_date)
+        self._schemas = {}
+        self._ids = {}
+
+    def count(self, name):
+        return max(1, int(BASE_COUNTS[name] * self.scale))
+
+    def next_id(self, resource):
+        # Harvest ids are large, per-resource sequences
+        value = self._ids.get(resource, 1000000 * (len(self._ids) + 1))
+        self._ids[resource] = value + 1
+        return value
+
+    def _word(self):
+        return self.rng.choice(WORDS)
+
+    def _text(self, low=2, high=8):
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def _scalar(self, name, typ, fmt, epoch):
+        rng = self.rng
+        if fmt == "date-time":
+            return _date(epoch) if name in DATE_FIELDS else _stamp(epoch)
+        if fmt == "time":
+            return "{}:{:02d}{}".format(rng.randint(1, 12), rng.randint(0, 59),
+                                        rng.choice(["am", "pm"]))
+        if typ == "integer":
+            return rng.randint(0, 1000)
+        if typ == "number":
+            return round(rng.uniform(0, 500), 2)
+        if typ == "boolean":
+            return rng.random() < 0.5
+        if name in DATE_FIELDS:
+            return _date(epoch)
+        if "email" in name:
+            return "{}.{}@example.com".format(self._word(), self._word())
+        if name.endswith("url"):
+            return "https://example.com/{}/{}".format(self._word(), rng.randint(1, 10 ** 6))
+        if name == "currency":
+            return rng.choice(CURRENCIES)
+        if name in ("notes", "body", "description", "subject", "address"):
+            return self._text()
+        return self._text(1, 3)
+
+    def _compiled(self, resource, schema_name=None, derived=()):
+        # [(name, generate(epoch), nullable)] per resource, built once from the schema
+        compiled = self._schemas.get(resource)
+        if compiled is not None:
+            return compiled
+
+        schema_name = schema_name or RESOURCES[resource][0]
+        with open(os.path.join(SCHEMA_DIR, schema_name + ".json"), encoding="utf-8") as handle:
+            schema = json.load(handle)
+
+        derived = set(DERIVED_FIELDS.get(resource, derived))
+        compiled = []
+        for name, subschema in schema["properties"].items():
+            if name in derived or name in ("created_at", "updated_at"):
+                continue
+            types, nullable = _types(subschema)
+            typ = types[0] if types else "string"
+            if typ == "array":
+                item_schema = subschema.get("items", {}).get("properties", {})
+
+                def generate(epoch, item_schema=item_schema):
+                    return [{key: self._scalar(key, _types(sub)[0][0], sub.get("format"), epoch)
+                             for key, sub in item_schema.items()}
+                            for _ in range(self.rng.randint(1, 3))]
+            else:
+                def generate(epoch, name=name, typ=typ, fmt=subschema.get("format")):
+                    return self._scalar(name, typ, fmt, epoch)
+            compiled.append((name, generate, nullable and name not in NEVER_NULL))
+
+        self._schemas[resource] = compiled
+        return compiled
+
+    def row(self, resource, row_id=None):
+        rng = self.rng
+        created = rng.randint(self._start, self._end)
+        updated = min(self._end, created + int(rng.expovariate(1.0 / 86400)))
+        row = {}
+        for name, generate, nullable in self._compiled(resource):
+            if nullable and rng.random() < self.null_density:
+                row[name] = None
+            else:
+                row[name] = generate(created)
+        if "id" in row:
+            row["id"] = row_id if row_id is not None else self.next_id(resource)
+        row["created_at"] = _stamp(created)
+        row["updated_at"] = _stamp(updated)
+        return row
+
+    def _nullable(self, value):
+        return None if self.rng.random() < self.null_density else value
+
+    def generate(self, out_dir): # pylint: disable=too-many-locals,too-many-statements
+        rng = self.rng
+        store = StoreWriter(out_dir)
+
+        clients = []
+        for _ in range(self.count("clients")):
+            client = self.row("clients")
+            store.write("clients", client)
+            clients.append({"id": client["id"], "name": client["name"],
+                            "currency": client["currency"]})
+        skewed_clients = _Skewed(rng, clients, self.skew)
+
+        for _ in range(self.count("contacts")):
+            contact = self.row("contacts")
+            contact["client"] = {"id": skewed_clients.pick()["id"], "name": self._word()}
+            store.write("contacts", contact)
+
+        users = []
+        for _ in range(self.count("users")):
+            user = self.row("users")
+            store.write("users", user)
+            users.append({"id": user["id"],
+                          "name": "{} {}".format(user["first_name"], user["last_name"])})
+
+        for _ in range(self.count("roles")):
+            role = self.row("roles")
+            role["user_ids"] = [user["id"] for user in
+                                rng.sample(users, min(len(users), rng.randint(0, 20)))]
+            store.write("roles", role)
+
+        tasks = []
+        for _ in range(self.count("tasks")):
+            task = self.row("tasks")
+            store.write("tasks", task)
+            tasks.append({"id": task["id"], "name": task["name"]})
+
+        projects = []
+        projects_by_client = {}
+        for _ in range(self.count("projects")):
+            project = self.row("projects")
+            client = skewed_clients.pick()
+            project["client"] = client
+            store.write("projects", project)
+            ref = {"id": project["id"], "name": project["name"], "code": project["code"],
+                   "client": {"id": client["id"], "name": client["name"]}}
+            projects.append(ref)
+            projects_by_client.setdefault(client["id"], []).append(ref)
+
+        # Task assignments, kept per project so time entries can reference them
+        task_assignments = {}
+        for project in projects:
+            raw = []
+            for task in rng.sample(tasks, min(len(tasks), TASKS_PER_PROJECT)):
+                assignment = self.row("task_assignments")
+                assignment["project"] = {key: project[key] for key in ("id", "name", "code")}
+                assignment["task"] = task
+                store.write("task_assignments", assignment)
+                raw.append(assignment)
+            task_assignments[project["id"]] = raw
+
+        # User assignments are served both from /user_assignments and from
+        # /users/{id}/project_assignments with the same ids. Heavy users
+        # (low index under the skew) end up on many projects.
+        skewed_users = _Skewed(rng, users, self.skew)
+        assignments_by_user = {}
+        for project in projects:
+            for user in {skewed_users.pick()["id"]: None
+                         for _ in range(USERS_PER_PROJECT)}:
+                assignment = self.row("user_assignments")
+                assignment["project"] = {key: project[key] for key in ("id", "name", "code")}
+                assignment["user"] = {"id": user, "name": self._word()}
+                store.write("user_assignments", assignment)
+
+                project_assignment = {key: value for key, value in assignment.items()
+                                      if key != "user"}
+                project_assignment["client"] = project["client"]
+                project_assignment["task_assignments"] = [
+                    {key: value for key, value in task_assignment.items() if key != "project"}
+                    for task_assignment in task_assignments[project["id"]]]
+                store.write("users/project_assignments", project_assignment, parent_id=user)
+                assignments_by_user.setdefault(user, []).append(
+                    ({"id": assignment["id"], "is_project_manager":
+                      assignment["is_project_manager"]}, project))
+
+        # Only users with assignments can log time or expenses
+        active_users = _Skewed(rng, [user for user in users if user["id"] in assignments_by_user],
+                               self.skew)
+
+        categories = []
+        for _ in range(self.count("expense_categories")):
+            category = self.row("expense_categories")
+            store.write("expense_categories", category)
+            categories.append({"id": category["id"], "name": category["name"],
+                               "unit_price": category["unit_price"],
+                               "unit_name": category["unit_name"]})
+
+        for _ in range(self.count("invoice_item_categories")):
+            store.write("invoice_item_categories", self.row("invoice_item_categories"))
+        for _ in range(self.count("estimate_item_categories")):
+            store.write("estimate_item_categories", self.row("estimate_item_categories"))
+
+        estimates = []
+        for _ in range(self.count("estimates")):
+            estimate = self.row("estimates")
+            client = skewed_clients.pick()
+            estimate["client"] = {"id": client["id"], "name": client["name"]}
+            estimate["creator"] = active_users.pick()
+            estimate["line_items"] = self._line_items("estimate_line_items", None)
+            store.write("estimates", estimate)
+            estimates.append({"id": estimate["id"], "client_key": estimate["client_key"]})
+            for _ in range(self._message_count()):
+                store.write("estimates/messages", self.row("estimates/messages"),
+                            parent_id=estimate["id"])
+
+        invoices = []
+        for _ in range(self.count("invoices")):
+            invoice = self.row("invoices")
+            client = skewed_clients.pick()
+            invoice["client"] = {"id": client["id"], "name": client["name"]}
+            invoice["creator"] = active_users.pick()
+            invoice["estimate"] = ({"id": rng.choice(estimates)["id"]}
+                                   if rng.random() < 0.2 else None)
+            invoice["retainer"] = ({"id": self.next_id("retainers")}
+                                   if rng.random() < 0.05 else None)
+            invoice["line_items"] = self._line_items("invoice_line_items",
+                                                     projects_by_client.get(client["id"]))
+            store.write("invoices", invoice)
+            invoices.append({"id": invoice["id"], "number": invoice["number"]})
+
+            for _ in range(self._message_count()):
+                store.write("invoices/messages", self.row("invoices/messages"),
+                            parent_id=invoice["id"])
+            for _ in range(rng.randint(0, 3)):
+                payment = self.row("invoices/payments")
+                # the schema types payment_gateway_name as an integer, so
+                # only the gateway-less shape is valid
+                payment["payment_gateway"] = {"id": None, "name": None}
+                store.write("invoices/payments", payment, parent_id=invoice["id"])
+
+        for _ in range(self.count("expenses")):
+            expense = self.row("expenses")
+            user = active_users.pick()
+            user_assignment, project = rng.choice(assignments_by_user[user["id"]])
+            expense["user"] = user
+            expense["user_assignment"] = user_assignment
+            expense["project"] = {key: project[key] for key in ("id", "name", "code")}
+            expense["client"] = project["client"]
+            expense["expense_category"] = rng.choice(categories)
+            expense["invoice"] = rng.choice(invoices) if rng.random() < 0.2 else None
+            expense["receipt"] = self._nullable({
+                "url": "https://example.com/receipts/{}".format(expense["id"]),
+                "file_name": "receipt.pdf",
+                "file_size": rng.randint(1000, 10 ** 6),
+                "content_type": "application/pdf"})
+            store.write("expenses", expense)
+
+        # A small pool of external references shared by many time entries
+        external_references = []
+        for _ in range(self.count("external_references")):
+            service = rng.choice(SERVICES)
+            reference_id = str(rng.randint(10 ** 6, 10 ** 8))
+            external_references.append({
+                "id": reference_id,
+                "group_id": str(rng.randint(1, 10 ** 4)),
+                "permalink": "https://{}.example.com/issues/{}".format(service, reference_id),
+                "service": "{}.example.com".format(service),
+                "service_icon_url": "https://{}.example.com/icon.png".format(service)})
+
+        for _ in range(self.count("time_entries")):
+            entry = self.row("time_entries")
+            user = active_users.pick()
+            user_assignment, project = rng.choice(assignments_by_user[user["id"]])
+            task_assignment = rng.choice(task_assignments[project["id"]])
+            entry["user"] = user
+            entry["user_assignment"] = user_assignment
+            entry["project"] = {key: project[key] for key in ("id", "name", "code")}
+            entry["client"] = project["client"]
+            entry["task"] = task_assignment["task"]
+            entry["task_assignment"] = {"id": task_assignment["id"],
+                                        "billable": task_assignment["billable"]}
+            entry["external_reference"] = (rng.choice(external_references)
+                                           if rng.random() < 0.3 else None)
+            entry["invoice"] = rng.choice(invoices) if rng.random() < 0.2 else None
+            store.write("time_entries", entry)
+
+        store.close({
+            "params": {"scale": self.scale, "skew": self.skew,
+                       "null_density": self.null_density, "seed": self.seed,
+                       "start_date": self.start_date, "end_date": self.end_date},
+            "company": {"name": "Benchmark Co", "base_uri": "https://benchmark.harvestapp.com",
+                        "is_active": True, "expense_feature": True,
+                        "invoice_feature": True, "estimate_feature": True},
+        })
+        return store.counts
+
+    def _line_items(self, schema_name, projects):
+        items = []
+        for _ in range(self.rng.randint(1, 5)):
+            # line items are not a resource of their own, compile them on the side
+            compiled = self._compiled("line_items:" + schema_name, schema_name,
+                                      ["invoice_id", "estimate_id", "project_id"])
+            item = {name: generate(self._start) for name, generate, _ in compiled}
+            item["id"] = self.next_id(schema_name)
+            if schema_name == "invoice_line_items":
+                project = self.rng.choice(projects) if projects else None
+                item["project"] = ({key: project[key] for key in ("id", "name", "code")}
+                                   if project else None)
+            items.append(item)
+        return items
+
+    def _message_count(self):
+        # Most invoices get a couple of messages, long-lived ones get hundreds
+        return min(500, int(self.rng.paretovariate(max(self.skew, 0.5)))) - 1
+
+
+def generate_dataset(out_dir, **kwargs):
+    return DatasetGenerator(**kwargs).generate(out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", required=True, help="Store directory to write")
+    parser.add_argument("--scale", type=float, default=0.01,
+                        help="Multiplier for BASE_COUNTS (1.0 = 2M time entries)")
+    parser.add_argument("--skew", type=float, default=1.1,
+                        help="Zipf exponent for heavy users/clients (0 = uniform)")
+    parser.add_argument("--null-density", type=float, default=0.1,
+                        help="Probability that a nullable field is null")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.time()
+    counts = generate_dataset(args.out, scale=args.scale, skew=args.skew,
+                              null_density=args.null_density, seed=args.seed)
+    for resource, count in sorted(counts.items()):
+        print("{:<30} {:>10}".format(resource, count))
+    print("generated in {:.1f}s".format(time.time() - started))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Local stand-in for the Harvest API, served from a store written by
+`benchmarks/dataset.py`.
+
+`HarvestMockAdapter` is a `requests` transport adapter, so the tap runs
+unchanged: `install()` routes every request to the Harvest hosts (including
+the `requests.request` calls made by `Auth`) through the adapter.
+
+    with install(MockStore("/tmp/harvest-small")) as adapter:
+        tap_harvest.main_impl()
+    print(adapter.requests, adapter.bytes_sent)
+"""
+
+import calendar
+import contextlib
+import json
+import os
+import threading
+import time
+from array import array
+from unittest import mock
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+
+from benchmarks.dataset import RESOURCES
+
+API_HOST = "api.harvestapp.com"
+ID_HOST = "id.getharvest.com"
+DEFAULT_PER_PAGE = 2000
+
+# report (API path after /reports/) -> (resource, nested objects the rows are grouped by)
+REPORTS = {
+    "time/clients": ("time_entries", ("client",)),
+    "time/projects": ("time_entries", ("client", "project")),
+    "time/tasks": ("time_entries", ("task",)),
+    "time/team": ("time_entries", ("user",)),
+    "expenses/clients": ("expenses", ("client",)),
+    "expenses/projects": ("expenses", ("client", "project")),
+    "expenses/categories": ("expenses", ("expense_category",)),
+    "expenses/team": ("expenses", ("user",)),
+}
+
+
+def _since_epoch(value):
+    # updated_since is sent as "%Y-%m-%dT%H:%M:%SZ"
+    return calendar.timegm(time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+class _Resource:
+    """Line offsets of one .rows file, grouped by parent id."""
+
+    def __init__(self, path):
+        self.path = path
+        # parent id -> (array of line offsets, array of updated epochs)
+        self.offsets = {}
+        self.updated = {}
+        with open(path, "rb") as handle:
+            offset = 0
+            for line in handle:
+                parent, updated, _ = line.split(b"\t", 2)
+                parent = int(parent) if parent else None
+                if parent not in self.offsets:
+                    self.offsets[parent] = array("q")
+                    self.updated[parent] = array("q")
+                self.offsets[parent].append(offset)
+                self.updated[parent].append(int(updated))
+                offset += len(line)
+        self._handle = open(path, "rb") # pylint: disable=consider-using-with
+
+    def select(self, parent, since):
+        offsets = self.offsets.get(parent, array("q"))
+        if since is None:
+            return offsets
+        updated = self.updated.get(parent, array("q"))
+        return array("q", (offset for offset, stamp in zip(offsets, updated) if stamp >= since))
+
+    def read(self, offsets):
+        rows = []
+        for offset in offsets:
+            self._handle.seek(offset)
+            rows.append(self._handle.readline().split(b"\t", 2)[2].rstrip(b"\n"))
+        return rows
+
+
+class MockStore:
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as handle:
+            self.manifest = json.load(handle)
+        self._resources = {}
+        self._indexes = {}
+
+    def resource(self, name):
+        if name not in self._resources:
+            path = os.path.join(self.store_dir, name.replace("/", "__") + ".rows")
+            self._resources[name] = _Resource(path) if os.path.exists(path) else None
+        return self._resources[name]
+
+    def page(self, name, parent=None, updated_since=None, page=1, per_page=DEFAULT_PER_PAGE):
+        """Returns (response key, rows as raw json bytes, total entries)."""
+        resource = self.resource(name)
+        if resource is None:
+            return RESOURCES[name][1], [], 0
+        since = _since_epoch(updated_since) if updated_since else None
+        selected = resource.select(parent, since)
+        start = (page - 1) * per_page
+        return RESOURCES[name][1], resource.read(selected[start:start + per_page]), len(selected)
+
+    def _rows(self, name):
+        """Every row of a resource, parsed."""
+        resource = self.resource(name)
+        if resource is None:
+            return []
+        offsets = array("q", (offset for group in resource.offsets.values() for offset in group))
+        return [json.loads(raw) for raw in resource.read(offsets)]
+
+    def _indexed(self, key, build):
+        # indexes are kept next to the resources and built on first use
+        if key not in self._indexes:
+            self._indexes[key] = build()
+        return self._indexes[key]
+
+    def _rows_by_day(self, name):
+        def build():
+            by_day = {}
+            for row in self._rows(name):
+                by_day.setdefault(row["spent_date"], []).append(row)
+            return by_day
+        return self._indexed("by_day/" + name, build)
+
+    def _lookup(self, name, field):
+        return self._indexed("{}/{}".format(name, field),
+                             lambda: {row["id"]: row[field] for row in self._rows(name)})
+
+    def report(self, report, day_from, day_to):
+        """Rows of a time or expense report for the days from `day_from` to `day_to`."""
+        resource, groups = REPORTS[report]
+        currencies = self._lookup("clients", "currency")
+        contractors = self._lookup("users", "is_contractor")
+        by_day = self._rows_by_day(resource)
+        results = {}
+        for day, rows in by_day.items():
+            if day is None or not day_from <= day <= day_to:
+                continue
+            for row in rows:
+                currency = currencies.get(row["client"]["id"])
+                key = tuple(row[group]["id"] for group in groups) + (currency,)
+                if key not in results:
+                    result = results[key] = {"currency": currency}
+                    for group in groups:
+                        result[group + "_id"] = row[group]["id"]
+                        result[group + "_name"] = row[group]["name"]
+                    if "user" in groups:
+                        result["is_contractor"] = contractors.get(row["user"]["id"])
+                    if resource == "time_entries":
+                        result.update(total_hours=0.0, billable_hours=0.0, billable_amount=0.0)
+                    else:
+                        result.update(total_amount=0.0, billable_amount=0.0)
+                result = results[key]
+                if resource == "time_entries":
+                    hours = row["hours"] or 0.0
+                    result["total_hours"] += hours
+                    if row["billable"]:
+                        result["billable_hours"] += hours
+                        result["billable_amount"] += hours * (row["billable_rate"] or 0.0)
+                else:
+                    cost = row["total_cost"] or 0.0
+                    result["total_amount"] += cost
+                    if row["billable"]:
+                        result["billable_amount"] += cost
+        return [json.dumps(result, separators=(",", ":")).encode()
+                for _, result in sorted(results.items(), key=lambda item: str(item[0]))]
+
+
+class HarvestMockAdapter(BaseAdapter):
+    """
+    Serves the Harvest v2 API from a MockStore. `latency` adds a fixed
+    delay per request to emulate the network.
+    """
+
+    def __init__(self, store, latency=0.0):
+        super().__init__()
+        self.store = store
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self.requests_by_resource = {}
+        # the store reads rows through shared file handles
+        self._lock = threading.Lock()
+
+    def close(self):
+        pass
+
+    def send(self, request, **kwargs): # pylint: disable=arguments-differ,unused-argument
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(request.url)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        with self._lock:
+            if url.netloc == ID_HOST:
+                status, body = self._identity(url.path)
+            else:
+                status, body = self._api(url, params)
+
+            self.requests += 1
+            self.bytes_sent += len(body)
+        return self._response(request, status, body)
+
+    @staticmethod
+    def _identity(path):
+        if path.endswith("oauth2/token"):
+            return 200, json.dumps({"access_token": "mock-access-token",
+                                    "refresh_token": "mock-refresh-token",
+                                    "token_type": "bearer",
+                                    "expires_in": 64800}).encode()
+        if path.endswith("accounts"):
+            return 200, json.dumps({"accounts": [{"id": 1, "name": "Benchmark Co",
+                                                  "product": "harvest"}]}).encode()
+        return 404, b'{"error":"not_found"}'
+
+    def _api(self, url, params):
+        segments = url.path.split("/v2/", 1)[-1].strip("/").split("/")
+        if segments == ["company"]:
+            return 200, json.dumps(self.store.manifest["company"]).encode()
+
+        if segments[0] == "reports":
+            report = "/".join(segments[1:])
+            if report not in REPORTS:
+                return 404, b'{"error":"not_found"}'
+            day_from, day_to = (time.strftime("%Y-%m-%d", time.strptime(params[key], "%Y%m%d"))
+                                for key in ("from", "to"))
+            rows = self.store.report(report, day_from, day_to)
+            return 200, self._page_body(url, params, "results", rows)
+
+        parent = None
+        if len(segments) == 3:
+            parent = int(segments[1])
+            name = "{}/{}".format(segments[0], segments[2])
+        else:
+            name = segments[0]
+        if name not in RESOURCES:
+            return 404, b'{"error":"not_found"}'
+        self.requests_by_resource[name] = self.requests_by_resource.get(name, 0) + 1
+
+        page = int(params.get("page", 1))
+        per_page = int(params.get("per_page", DEFAULT_PER_PAGE))
+        key, rows, total = self.store.page(name, parent, params.get("updated_since"),
+                                           page, per_page)
+        return 200, self._page_body(url, params, key, rows, total)
+
+    @staticmethod
+    def _page_body(url, params, key, rows, total=None):
+        """A page of `rows` under `key`, with Harvest's pagination fields."""
+        page = int(params.get("page", 1))
+        per_page = int(params.get("per_page", DEFAULT_PER_PAGE))
+        if total is None:
+            # `rows` holds every row rather than one page
+            total = len(rows)
+            rows = rows[(page - 1) * per_page:page * per_page]
+        total_pages = max(1, -(-total // per_page))
+        base = "{}://{}{}".format(url.scheme, url.netloc, url.path)
+
+        def link(number):
+            if number is None:
+                return None
+            return base + "?" + urlencode(dict(params, page=number, per_page=per_page))
+
+        next_page = page + 1 if page < total_pages else None
+        previous_page = page - 1 if page > 1 else None
+        meta = {"per_page": per_page, "total_pages": total_pages, "total_entries": total,
+                "next_page": next_page, "previous_page": previous_page, "page": page,
+                "links": {"first": link(1), "next": link(next_page),
+                          "previous": link(previous_page), "last": link(total_pages)}}
+        return (b'{"' + key.encode() + b'":[' + b",".join(rows) + b"],"
+                + json.dumps(meta)[1:].encode())
+
+    @staticmethod
+    def _response(request, status, body):
+        response = requests.Response()
+        response.status_code = status
+        response._content = body # pylint: disable=protected-access
+        response.headers["Content-Type"] = "application/json; charset=utf-8"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+
+@contextlib.contextmanager
+def install(store, latency=0.0):
+    """Routes requests to the Harvest hosts through a HarvestMockAdapter."""
+    adapter = HarvestMockAdapter(store, latency=latency)
+    get_adapter = requests.Session.get_adapter
+
+    def route(session, url):
+        if urlparse(url).netloc in (API_HOST, ID_HOST):
+            return adapter
+        return get_adapter(session, url)
+
+    with mock.patch.object(requests.Session, "get_adapter", route):
+        yield adapter
@@ -12,10 +12,11 @@ setup(name='tap-harvest',
       install_requires=[
           'singer-python==5.12.1',
           'requests==2.31.0',
-          'pendulum==1.2.0',
-          'backoff==1.8.0',
           'pytz==2018.4',
       ],
+      extras_require={
+          'parquet': ['pyarrow==26.0.0'],
+      },
       entry_points='''
           [console_scripts]
           tap-harvest=tap_harvest:main
@@ -30,6 +31,10 @@ setup(name='tap-harvest',
               "estimate_messages.json",
               "estimates.json",
               "expense_categories.json",
+              "expense_report_categories.json",
+              "expense_report_clients.json",
+              "expense_report_projects.json",
+              "expense_report_team.json",
               "expenses.json",
               "external_reference.json",
               "invoice_item_categories.json",
@@ -43,6 +48,10 @@ setup(name='tap-harvest',
               "tasks.json",
               "time_entries.json",
               "time_entry_external_reference.json",
+              "time_report_clients.json",
+              "time_report_projects.json",
+              "time_report_tasks.json",
+              "time_report_team.json",
               "user_project_tasks.json",
               "user_projects.json",
               "user_roles.json",
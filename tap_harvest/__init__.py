@@ -1,13 +1,27 @@
 #!/usr/bin/env python3
+# pylint: disable=too-many-lines
 
+import argparse
+import collections
+import datetime
+import functools
+import json
 import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
 
-import backoff
 import requests
-import pendulum
 
 import singer
-from singer import Transformer, utils
+from singer import Transformer, metadata, metrics, utils
+from singer.catalog import Catalog, CatalogEntry
+from singer.schema import Schema
+from singer.transform import string_to_datetime
+
+from tap_harvest import (dedupe, idset, memory, profiling, request_log, retry, schema_bundle,
+                         telemetry)
 
 LOGGER = singer.get_logger()
 SESSION = requests.Session()
@@ -27,8 +41,153 @@ STATE = {}
 # which leads to data loss as it is updated after every sync
 TAP_STATE = {}
 AUTH = {}
+# writes the OpenMetrics textfile when `metrics_textfile` is configured
+EXPORTER = None
+# shrinks the page size near `max_rss_mb`, see tap_harvest.memory
+MEMORY_CEILING = None
+# samples request logs and logs per-stream progress, see tap_harvest.request_log
+REQUEST_LOG = request_log.RequestLogger()
+# retries of the token refresh and of API requests, see tap_harvest.retry
+RETRY_POLICY = retry.RetryPolicy()
+# requests child streams' first pages ahead when `max_concurrency` is above 1,
+# see tap_harvest.concurrency
+PREFETCHER = None
+# sends a second copy of requests slower than usual when `hedge_requests` is
+# set, see tap_harvest.hedging
+HEDGER = None
+# fingerprints of the records written for child streams read from their own
+# endpoint, kept across runs when `fingerprint_dir` is set, see
+# tap_harvest.fingerprints
+FINGERPRINTS = None
+# id snapshots of the previous run, set when the run detects deletes instead
+# of syncing, see tap_harvest.deletes
+SNAPSHOTS = None
+# writes records to Parquet files instead of stdout when `export_dir` is set,
+# see tap_harvest.parquet_export
+PARQUET = None
+# transforms and serializes large pages in worker processes when
+# `transform_workers` is set, see tap_harvest.workers
+TRANSFORM_POOL = None
 # timeout request after 300 seconds
 REQUEST_TIMEOUT = 300
+# days before a report stream's bookmark that are read again, as time and
+# expenses can be logged or edited after the day they are for
+DEFAULT_REPORT_LOOKBACK_DAYS = 7
+# report streams read from further back than this without a bookmark are
+# warned about, as each day is a request and the reports API allows 100
+# requests per 15 minutes
+LONG_REPORT_BACKFILL_DAYS = 100
+
+# stream -> key properties and, for child streams that are synced once per
+# parent row, the parent stream and the endpoint the child is read from, if
+# any, with a placeholder for the parent id. Report streams have the path of their report
+# and are replicated by `date`. Streams are discovered in this order.
+STREAMS = {
+    'clients': {'key_properties': ['id']},
+    'contacts': {'key_properties': ['id']},
+    'roles': {'key_properties': ['id']},
+    'user_roles': {'key_properties': ['user_id', 'role_id'], 'parent': 'roles'},
+    'projects': {'key_properties': ['id']},
+    'tasks': {'key_properties': ['id']},
+    'project_tasks': {'key_properties': ['id']},
+    'project_users': {'key_properties': ['id']},
+    'users': {'key_properties': ['id']},
+    'user_projects': {'key_properties': ['id'], 'parent': 'users',
+                      'endpoint': 'users/{}/project_assignments'},
+    'user_project_tasks': {'key_properties': ['user_id', 'project_task_id'],
+                           'parent': 'user_projects'},
+    'expense_categories': {'key_properties': ['id']},
+    'expenses': {'key_properties': ['id']},
+    'invoice_item_categories': {'key_properties': ['id']},
+    'invoices': {'key_properties': ['id']},
+    'invoice_messages': {'key_properties': ['id'], 'parent': 'invoices',
+                         'endpoint': 'invoices/{}/messages'},
+    'invoice_payments': {'key_properties': ['id'], 'parent': 'invoices',
+                         'endpoint': 'invoices/{}/payments'},
+    'invoice_line_items': {'key_properties': ['id'], 'parent': 'invoices'},
+    'estimate_item_categories': {'key_properties': ['id']},
+    'estimates': {'key_properties': ['id']},
+    'estimate_messages': {'key_properties': ['id'], 'parent': 'estimates',
+                          'endpoint': 'estimates/{}/messages'},
+    'estimate_line_items': {'key_properties': ['id'], 'parent': 'estimates'},
+    'time_entries': {'key_properties': ['id']},
+    'external_reference': {'key_properties': ['id'], 'parent': 'time_entries'},
+    'time_entry_external_reference': {'key_properties': ['time_entry_id',
+                                                        'external_reference_id'],
+                                      'parent': 'time_entries'},
+    'time_report_clients': {'key_properties': ['date', 'client_id', 'currency'],
+                            'report': 'time/clients', 'replication_key': 'date'},
+    'time_report_projects': {'key_properties': ['date', 'project_id', 'currency'],
+                             'report': 'time/projects', 'replication_key': 'date'},
+    'time_report_tasks': {'key_properties': ['date', 'task_id', 'currency'],
+                          'report': 'time/tasks', 'replication_key': 'date'},
+    'time_report_team': {'key_properties': ['date', 'user_id', 'currency'],
+                         'report': 'time/team', 'replication_key': 'date'},
+    'expense_report_clients': {'key_properties': ['date', 'client_id', 'currency'],
+                               'report': 'expenses/clients', 'replication_key': 'date'},
+    'expense_report_projects': {'key_properties': ['date', 'project_id', 'currency'],
+                                'report': 'expenses/projects', 'replication_key': 'date'},
+    'expense_report_categories': {'key_properties': ['date', 'expense_category_id', 'currency'],
+                                  'report': 'expenses/categories', 'replication_key': 'date'},
+    'expense_report_team': {'key_properties': ['date', 'user_id', 'currency'],
+                            'report': 'expenses/team', 'replication_key': 'date'},
+}
+# Top-level streams whose deletes can be detected -> (endpoint, company feature
+# the endpoint needs, if any). Streams are swept in this order.
+DELETE_DETECTION = {
+    'clients': ('clients', None),
+    'contacts': ('contacts', None),
+    'roles': ('roles', None),
+    'projects': ('projects', None),
+    'tasks': ('tasks', None),
+    'project_tasks': ('task_assignments', None),
+    'project_users': ('user_assignments', None),
+    'users': ('users', None),
+    'expense_categories': ('expense_categories', 'expense_feature'),
+    'expenses': ('expenses', 'expense_feature'),
+    'invoice_item_categories': ('invoice_item_categories', 'invoice_feature'),
+    'invoices': ('invoices', 'invoice_feature'),
+    'estimate_item_categories': ('estimate_item_categories', 'estimate_feature'),
+    'estimates': ('estimates', 'estimate_feature'),
+    'time_entries': ('time_entries', None),
+}
+# Endpoints of DELETE_DETECTION whose records can only be read by id under
+# their project, so their missing ids are confirmed by reading them again
+SWEEP_CONFIRMED = {'task_assignments', 'user_assignments'}
+# Streams transformed a page at a time when `columnar_transform` is set, see
+# tap_harvest.columnar
+COLUMNAR_STREAMS = {'time_entries', 'expenses'}
+# Child streams whose endpoint accepts `updated_since`, so only the children
+# changed since the child stream's bookmark are read. An endpoint that rejects
+# it is read in full, and filtered on our side, for the rest of the run.
+CHILD_UPDATED_SINCE = {
+    'invoice_messages': True,
+    'invoice_payments': True,
+    'estimate_messages': True,
+    'user_projects': True,
+}
+# streams selected in the catalog; None when no catalog is given, which syncs every stream
+SELECTED_STREAMS = None
+# stream -> properties selected in the catalog; streams not in here keep every property
+SELECTED_FIELDS = {}
+# stream -> ids of the records written in this run, to drop rows that moved
+# between pages and were read twice
+EMITTED_IDS = collections.defaultdict(idset.IdSet)
+# records updated after this (the start of the sync) are left for the next run
+UPDATED_BEFORE = None
+# (stream, selected properties) -> schema, see get_schema
+SCHEMAS = {}
+# streams whose SCHEMA message has been written in this run
+WRITTEN_SCHEMAS = set()
+
+# Retries the decorated function under RETRY_POLICY, looked up when it is called
+def retried(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return RETRY_POLICY.call(func, *args, **kwargs)
+
+    return wrapper
+
 
 class Auth:
     def __init__(self, client_id, client_secret, refresh_token):
@@ -36,16 +195,13 @@ class Auth:
         self._client_secret = client_secret
         self._refresh_token = refresh_token
         self._account_id = None
+        # prefetch threads can ask for the token at the same time
+        self._lock = threading.Lock()
         self._refresh_access_token()
 
-    # backoff for Timeout error is already included in "requests.exceptions.RequestException"
-    # as it is a parent class of "Timeout" error
-    @backoff.on_exception(
-        backoff.expo,
-        requests.exceptions.RequestException,
-        max_tries=5,
-        giveup=lambda e: e.response is not None and 400 <= e.response.status_code < 500,
-        factor=2)
+    # Timeout errors are retried too, "requests.exceptions.Timeout" is a
+    # "requests.exceptions.RequestException"
+    @retried
     def _make_refresh_token_request(self):
         return requests.request('POST',
                                 url=BASE_ID_URL + 'oauth2/token',
@@ -62,7 +218,7 @@ class Auth:
         LOGGER.info("Refreshing access token")
         resp = self._make_refresh_token_request()
         expires_in_seconds = resp.json().get('expires_in', 17 * 60 * 60)
-        self._expires_at = pendulum.now().add(seconds=expires_in_seconds)
+        self._expires_at = utils.now() + datetime.timedelta(seconds=expires_in_seconds)
         resp_json = {}
         try:
             resp_json = resp.json()
@@ -76,11 +232,12 @@ class Auth:
         LOGGER.info("Got refreshed access token")
 
     def get_access_token(self):
-        if self._access_token is not None and self._expires_at > pendulum.now():
-            return self._access_token
+        with self._lock:
+            if self._access_token is not None and self._expires_at > utils.now():
+                return self._access_token
 
-        self._refresh_access_token()
-        return self._access_token
+            self._refresh_access_token()
+            return self._access_token
 
     def get_account_id(self):
         if self._account_id is not None:
@@ -103,16 +260,92 @@ def get_abs_path(path):
     return os.path.join(os.path.dirname(os.path.realpath(__file__)), path)
 
 
+# Schemas are read from the bundle generated by tap_harvest.bundle_schemas,
+# which saves opening and parsing a file per schema.
 def load_schema(entity):
+    if entity in schema_bundle.SCHEMAS:
+        return json.loads(schema_bundle.SCHEMAS[entity])
     return utils.load_json(get_abs_path("schemas/{}.json".format(entity)))
 
 
+# The stream's schema without the properties deselected in the catalog. Rows
+# are projected onto it before transform, so deselected properties are never
+# transformed or written. Schemas are loaded once per run, as child streams
+# ask for theirs once per parent row.
+def get_schema(stream_name):
+    fields = SELECTED_FIELDS.get(stream_name)
+    key = (stream_name, frozenset(fields) if fields is not None else None)
+    if key not in SCHEMAS:
+        schema = load_schema(stream_name)
+        if fields is not None:
+            schema['properties'] = {name: subschema
+                                    for name, subschema in schema['properties'].items()
+                                    if name in fields}
+        SCHEMAS[key] = schema
+    return SCHEMAS[key]
+
+
+def project(row, schema):
+    return {key: row[key] for key in schema['properties'] if key in row}
+
+
 def load_and_write_schema(name, key_properties='id', bookmark_property='updated_at'):
-    schema = load_schema(name)
-    singer.write_schema(name, schema, key_properties, bookmark_properties=[bookmark_property])
+    schema = get_schema(name)
+    if name not in WRITTEN_SCHEMAS:
+        if PARQUET is not None:
+            PARQUET.set_schema(name, schema, bookmark_property)
+        else:
+            singer.write_schema(name, schema, key_properties,
+                                bookmark_properties=[bookmark_property])
+        WRITTEN_SCHEMAS.add(name)
     return schema
 
 
+# Without a catalog every stream is synced except the report streams, which
+# have to be selected.
+def is_selected(stream_name):
+    if SELECTED_STREAMS is None:
+        return 'report' not in STREAMS.get(stream_name, {})
+    return stream_name in SELECTED_STREAMS
+
+
+# A stream has to be fetched when it is selected or when one of its child
+# streams is, as child streams are synced once per parent row.
+def should_sync(stream_name):
+    if is_selected(stream_name):
+        return True
+    return any(should_sync(child) for child, stream in STREAMS.items()
+               if stream.get('parent') == stream_name)
+
+
+def get_selected_streams(catalog):
+    if catalog is None:
+        return None
+    return {entry.tap_stream_id for entry in catalog.streams if entry.is_selected()}
+
+
+# Properties are selected unless their metadata says `"selected": false`. Key
+# properties and the replication key are always selected.
+def get_selected_fields(catalog):
+    selected_fields = {}
+    if catalog is None:
+        return selected_fields
+
+    for entry in catalog.streams:
+        mdata = metadata.to_map(entry.metadata)
+        stream = STREAMS.get(entry.tap_stream_id, {})
+        automatic = set(stream.get('key_properties', []))
+        automatic.add(stream.get('replication_key', 'updated_at'))
+        fields = set()
+        for key in (entry.schema.properties or {}):
+            field_metadata = mdata.get(('properties', key), {})
+            if key in automatic or field_metadata.get('inclusion') == 'automatic' \
+               or field_metadata.get('selected') is not False:
+                fields.add(key)
+        selected_fields[entry.tap_stream_id] = fields
+    return selected_fields
+
+
 def get_start(key):
     if key not in STATE:
         STATE[key] = CONFIG['start_date']
@@ -120,6 +353,18 @@ def get_start(key):
     return STATE[key]
 
 
+def get_updated_since(key):
+    return utils.strptime_to_utc(get_start(key)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# State key of the position of a stream fetched only for its selected child
+# streams. It is kept apart from the stream's own bookmark, so that selecting
+# the stream later syncs it from the start date instead of skipping the rows
+# its children were synced past.
+def children_bookmark_key(stream_name):
+    return '{}__children'.format(stream_name)
+
+
 def get_url(endpoint):
     return BASE_API_URL + endpoint
 
@@ -135,15 +380,58 @@ def get_request_timeout():
         request_timeout = REQUEST_TIMEOUT
     return request_timeout
 
-# backoff for Timeout error is already included in "requests.exceptions.RequestException"
-# as it is a parent class of "Timeout" error
-@backoff.on_exception(
-    backoff.expo,
-    requests.exceptions.RequestException,
-    max_tries=5,
-    giveup=lambda e: e.response is not None and 400 <= e.response.status_code < 500,
-    factor=2)
-@utils.ratelimit(100, 15)
+# singer.utils.ratelimit, with the time spent asleep reported as a metric. The
+# adaptive concurrency controller is told when requests have to wait.
+class RateLimiter:
+    def __init__(self, limit, every):
+        self.limit = limit
+        self.every = every
+        self._times = collections.deque()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            if len(self._times) >= self.limit:
+                tim0 = self._times.pop()
+                tim = time.time()
+                sleep_time = self.every - (tim - tim0)
+                if sleep_time > 0:
+                    if PREFETCHER is not None:
+                        PREFETCHER.controller.on_throttle()
+                    time.sleep(sleep_time)
+                    telemetry.add_sleep(telemetry.RATE_LIMIT_SLEEP, sleep_time)
+
+            self._times.appendleft(time.time())
+
+    def try_take(self):
+        """Takes a request out of the limit if that needs no wait."""
+        with self._lock:
+            if len(self._times) >= self.limit:
+                if time.time() - self._times[-1] < self.every:
+                    return False
+                self._times.pop()
+            self._times.appendleft(time.time())
+            return True
+
+
+def ratelimit(limit, every):
+    def limitdecorator(func):
+        limiter = RateLimiter(limit, every)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            limiter.wait()
+            return func(*args, **kwargs)
+
+        wrapper.limiter = limiter
+        return wrapper
+
+    return limitdecorator
+
+# Timeout errors are retried too, "requests.exceptions.Timeout" is a
+# "requests.exceptions.RequestException"
+@retried
+@ratelimit(100, 15)
 def request(url, params=None):
     params = params or {}
     access_token = AUTH.get_access_token()
@@ -152,10 +440,46 @@ def request(url, params=None):
                "Authorization": "Bearer " + access_token,
                "User-Agent": CONFIG.get("user_agent")}
     req = requests.Request("GET", url=url, params=params, headers=headers).prepare()
-    LOGGER.info("GET {}".format(req.url))
-    resp = SESSION.send(req, timeout=get_request_timeout())
+    started = time.perf_counter()
+    try:
+        with telemetry.http_request_timer(url.replace(BASE_API_URL, '')) as timer:
+            resp = send(req, url.replace(BASE_API_URL, ''))
+            timer.tags[metrics.Tag.http_status_code] = int(resp.status_code)
+    except requests.exceptions.Timeout:
+        if PREFETCHER is not None:
+            PREFETCHER.controller.on_response(started, time.perf_counter() - started)
+        raise
+    duration = time.perf_counter() - started
+    if PREFETCHER is not None:
+        PREFETCHER.controller.on_response(started, duration, resp.status_code)
+    telemetry.increment(telemetry.HTTP_REQUEST_COUNT)
+    telemetry.increment(telemetry.HTTP_RESPONSE_BYTES, len(resp.content))
+    if resp.status_code == 429:
+        telemetry.increment(telemetry.HTTP_429_COUNT)
+    if not resp.ok:
+        REQUEST_LOG.log(req.url, resp.status_code, duration, len(resp.content), 0, failed=True)
     resp.raise_for_status()
-    return resp.json()
+    response_json = resp.json()
+    REQUEST_LOG.log(req.url, resp.status_code, duration, len(resp.content),
+                    request_log.count_rows(response_json))
+    return response_json
+
+
+# Sends a prepared request, hedged when HEDGER is set. A hedge is only sent
+# when request()'s rate limiter has room for it.
+def send(req, path):
+    if HEDGER is None:
+        return SESSION.send(req, timeout=get_request_timeout())
+    from tap_harvest import hedging  # pylint: disable=import-outside-toplevel
+    return HEDGER.send(hedging.endpoint_key(path),
+                       lambda timeout: SESSION.send(req, timeout=timeout),
+                       request.limiter.try_take, get_request_timeout())
+
+
+# Harvest allows 100 requests per 15 minutes to the reports API
+@ratelimit(100, 15 * 60)
+def request_report(url, params=None):
+    return request(url, params)
 
 
 # Any date-times values can either be a string or a null.
@@ -181,95 +505,408 @@ def append_times_to_dates(item, date_fields):
                 item[date_field] = utils.strftime(utils.strptime_with_tz(item[date_field]))
 
 
+# The value Transformer.transform gives a date-time, e.g.
+# "2017-06-26T21:36:23Z" -> "2017-06-26T21:36:23.000000Z". Harvest sends
+# UTC timestamps in that one shape, which is rewritten without parsing it.
+def normalize_datetime(value):
+    if value is None:
+        return None
+    if len(value) == 20 and value[19] == 'Z' and value[10] == 'T' \
+       and value[4] == value[7] == '-' and value[13] == value[16] == ':':
+        return value[:19] + '.000000Z'
+    return string_to_datetime(value)
+
+
+# Adds a `<key>_id` column for each nested object referenced by the row,
+# e.g. `client` -> `client_id`
+def add_object_ids(row, object_to_id):
+    for key in object_to_id:
+        if row[key] is not None:
+            row[key + '_id'] = row[key]['id']
+        else:
+            row[key + '_id'] = None
+
+
+def map_expense(expense):
+    if expense['receipt'] is None:
+        expense['receipt_url'] = None
+        expense['receipt_file_name'] = None
+        expense['receipt_file_size'] = None
+        expense['receipt_content_type'] = None
+    else:
+        expense['receipt_url'] = expense['receipt']['url']
+        expense['receipt_file_name'] = expense['receipt']['file_name']
+        expense['receipt_file_size'] = expense['receipt']['file_size']
+        expense['receipt_content_type'] = expense['receipt']['content_type']
+    return expense
+
+
+def map_invoice_line_item(line_item, invoice):
+    line_item['invoice_id'] = invoice['id']
+    if line_item['project'] is not None:
+        line_item['project_id'] = line_item['project']['id']
+    else:
+        line_item['project_id'] = None
+    return line_item
+
+
+def map_report_row(row, date):
+    row['date'] = date
+    return row
+
+
+def write_record(stream_name, record, time_extracted):
+    with telemetry.timed(telemetry.WRITE_TIME):
+        if PARQUET is not None:
+            PARQUET.write(stream_name, record)
+        elif TRANSFORM_POOL is not None:
+            TRANSFORM_POOL.write(stream_name, record, time_extracted)
+        else:
+            singer.write_record(stream_name, record, time_extracted=time_extracted)
+    telemetry.increment(metrics.Metric.record_count, stream_name=stream_name)
+
+
+# Writes the STATE message. In export mode, the Parquet files written so far
+# are committed with the state instead, but only for top-level streams: a child
+# stream's bookmark can be ahead of the children of parents not synced yet.
+def write_state(stream_name=None):
+    if PARQUET is None:
+        singer.write_state(TAP_STATE)
+    elif stream_name is None or 'parent' not in STREAMS[stream_name]:
+        PARQUET.commit(TAP_STATE)
+
+
 def get_company():
     url = get_url('company')
     return request(url)
 
 
-def sync_endpoint(schema_name, endpoint=None, path=None, date_fields=None, with_updated_since=True, #pylint: disable=too-many-arguments
-                  for_each_handler=None, map_handler=None, object_to_id=None):
-    schema = load_schema(schema_name)
-    bookmark_property = 'updated_at'
+# Fetch stage of the sync pipeline. Yields each page's rows as a deque, so
+# they can be released one by one as they are written.
+def get_pages(url, path, params, fetch=None):
+    fetch = fetch or request
+    params = dict(params, page=1)
+    per_page = None
+    prefetched = PREFETCHER.take(url, params) if PREFETCHER is not None else None
+    while url is not None:
+        if prefetched is not None:
+            with telemetry.timed(telemetry.HTTP_TIME):
+                response = prefetched.result()
+            prefetched = None
+            # prefetched pages have Harvest's default size
+            per_page = memory.DEFAULT_PER_PAGE
+        else:
+            if MEMORY_CEILING is not None:
+                new_per_page = MEMORY_CEILING.per_page()
+                if per_page is not None and new_per_page != per_page and 'page' in params:
+                    params['page'] = memory.next_page(int(params['page']), per_page,
+                                                      new_per_page)
+                per_page = params['per_page'] = new_per_page
+            response = fetch(url, params)
+        telemetry.increment(telemetry.PAGE_COUNT)
+        if EXPORTER is not None:
+            EXPORTER.maybe_write(TAP_STATE)
+        url, params = get_next_page(url, params, response)
+        rows = collections.deque(response[path])
+        del response
+        yield rows, utils.now()
+
+
+# (child stream, url, params) of the first page of every child stream read
+# from its own endpoint, for each row of a parent page that will be synced,
+# in the order the children are synced.
+def child_requests(stream_name, rows, bookmark_property, start, updated_before):
+    children = [(child, stream) for child, stream in STREAMS.items()
+                if stream.get('parent') == stream_name and 'endpoint' in stream
+                and should_sync(child)]
+    if not children:
+        return []
+
+    params = {}
+    for child, _ in children:
+        params[child] = {'page': 1}
+        if CHILD_UPDATED_SINCE.get(child):
+            params[child]['updated_since'] = get_updated_since(child)
+    return [(child, get_url(stream['endpoint'].format(row['id'])), params[child])
+            for row in filter_rows(iter(rows), bookmark_property, start, updated_before)
+            for child, stream in children]
+
+
+# get_pages for a child stream. Passes the child bookmark as `updated_since`
+# when the endpoint supports it, and reads the endpoint in full when it
+# answers that with 400 or 422.
+def get_child_pages(schema_name, url, path, updated_since):
+    if CHILD_UPDATED_SINCE.get(schema_name):
+        try:
+            yield from get_pages(url, path, {"updated_since": updated_since})
+            return
+        except requests.exceptions.HTTPError as err:
+            if err.response is None or err.response.status_code not in (400, 422):
+                raise
+            LOGGER.warning("%s does not accept updated_since (%s), reading it in full",
+                           schema_name, err.response.status_code)
+            CHILD_UPDATED_SINCE[schema_name] = False
+            if PREFETCHER is not None:
+                # scheduled with updated_since
+                PREFETCHER.discard(schema_name)
+    yield from get_pages(url, path, {})
+
+
+# Follows `links.next` when the response has one, as on endpoints with cursor
+# pagination it stays correct when rows move between pages. Otherwise asks for
+# `next_page`. Returns (None, None) after the last page.
+def get_next_page(url, params, response):
+    links = response.get('links')
+    if links is not None and 'next' in links:
+        if links['next'] is None:
+            return None, None
+        next_url = urlsplit(links['next'])
+        return urlunsplit(next_url._replace(query='')), dict(parse_qsl(next_url.query))
+    if response.get('next_page') is None:
+        return None, None
+    return url, dict(params, page=response['next_page'])
+
+
+# Releases each row of a page from the page as it is consumed.
+def drain(rows):
+    while rows:
+        yield rows.popleft()
+
+
+# Filter stage of the sync pipeline. Drops, before they are transformed, rows
+# that were already written in this run (their id is in `emitted_ids`) and
+# rows whose raw bookmark is before `start` or after `updated_before`. Child
+# streams get every row back from the API, so most of theirs end here.
+def filter_rows(rows, bookmark_property, start, updated_before=None, emitted_ids=None):
+    for row in rows:
+        if emitted_ids is not None and row.get('id') in emitted_ids:
+            telemetry.increment(telemetry.DUPLICATE_COUNT)
+            continue
+        bookmark = normalize_datetime(row.get(bookmark_property))
+        if bookmark is not None and (bookmark < start or (
+                updated_before is not None and bookmark > updated_before)):
+            continue
+        yield row
+
+
+# Maps and transforms one row, as transform_rows does without timing it.
+def transform_row(row, schema, transformer, *, map_handler=None, object_to_id=None, #pylint: disable=too-many-arguments
+                  date_fields=None):
+    if map_handler is not None:
+        row = map_handler(row)
+
+    if object_to_id is not None:
+        add_object_ids(row, object_to_id)
+
+    item = project(row, schema)
+
+    remove_empty_date_times(item, schema)
+
+    item = transformer.transform(item, schema)
+
+    append_times_to_dates(item, date_fields)
+    return row, item
+
+
+# Map and transform stage of the sync pipeline. Yields (raw row, record); the
+# raw row is kept for the for_each_handler.
+def transform_rows(rows, schema, transformer, *, map_handler=None, object_to_id=None, #pylint: disable=too-many-arguments
+                   date_fields=None):
+    for row in rows:
+        transform_started = time.perf_counter()
+        pair = transform_row(row, schema, transformer, map_handler=map_handler,
+                             object_to_id=object_to_id, date_fields=date_fields)
+        telemetry.add_time(telemetry.TRANSFORM_TIME, time.perf_counter() - transform_started)
+        yield pair
+
+
+# transform_rows for a whole page, see tap_harvest.columnar
+def transform_page(rows, columns, map_handler=None, object_to_id=None):
+    transform_started = time.perf_counter()
+    pairs = columns.transform(list(rows), map_handler, object_to_id)
+    telemetry.add_time(telemetry.TRANSFORM_TIME, time.perf_counter() - transform_started)
+    return pairs
+
+
+# Run by tap_harvest.workers on rows that were already mapped: transforms a
+# page's rows and serializes each record to its RECORD message. Returns
+# ([(bookmark, message)], seconds).
+def serialize_page(rows, time_extracted, *, stream_name, schema, bookmark_property, #pylint: disable=too-many-arguments
+                   date_fields, use_columnar):
+    transform_started = time.perf_counter()
+    with Transformer() as transformer:
+        if use_columnar:
+            from tap_harvest import columnar  # pylint: disable=import-outside-toplevel
+            pairs = columnar.ColumnarTransform(schema, transformer).transform(rows)
+        else:
+            pairs = [transform_row(row, schema, transformer, date_fields=date_fields)
+                     for row in rows]
+    messages = [(item[bookmark_property], singer.format_message(singer.RecordMessage(
+        stream=stream_name, record=item, time_extracted=time_extracted))) for _, item in pairs]
+    return messages, time.perf_counter() - transform_started
+
+
+# The map stage of transform_row, run in the main process when the rest is
+# run by TRANSFORM_POOL, so the for_each_handler gets the same rows.
+def map_rows(rows, map_handler=None, object_to_id=None):
+    for row in rows:
+        if map_handler is not None:
+            row = map_handler(row)
+        if object_to_id is not None:
+            add_object_ids(row, object_to_id)
+        yield row
+
+
+# (raw row, workers.Serialized) for each serialized record of a page. Pages
+# are filtered ahead of the rows being written, so rows written in the
+# meantime are dropped here.
+def serialized_pairs(rows, messages, emitted_ids, bookmark_property):
+    from tap_harvest import workers  # pylint: disable=import-outside-toplevel
+    for row, (bookmark, line) in zip(rows, messages):
+        if row.get('id') in emitted_ids:
+            telemetry.increment(telemetry.DUPLICATE_COUNT)
+            continue
+        yield row, workers.Serialized(bookmark_property, bookmark, line)
+
+
+# Transform stage of the sync pipeline run by TRANSFORM_POOL. Yields each
+# page's serialized_pairs and time_extracted.
+def serialize_pages(pages, emitted_ids, bookmark_property, serialize):
+    pages = ((list(rows), time_extracted) for rows, time_extracted in pages)
+    for (rows, time_extracted), (messages, seconds) in TRANSFORM_POOL.map_pages(serialize, pages):
+        telemetry.add_time(telemetry.TRANSFORM_TIME, seconds)
+        yield serialized_pairs(rows, messages, emitted_ids, bookmark_property), time_extracted
+
+
+# The ColumnarTransform of a stream when `columnar_transform` is set, see
+# tap_harvest.columnar
+def get_columnar_transform(schema_name, schema, transformer):
+    if schema_name not in COLUMNAR_STREAMS or \
+            str(CONFIG.get('columnar_transform', '')).lower() not in ('true', '1'):
+        return None
+    from tap_harvest import columnar  # pylint: disable=import-outside-toplevel
+    return columnar.ColumnarTransform(schema, transformer)
 
-    singer.write_schema(schema_name,
-                        schema,
-                        ["id"],
-                        bookmark_properties=[bookmark_property])
 
-    start = get_start(schema_name)
-    start_dt = pendulum.parse(start)
-    updated_since = start_dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+def sync_endpoint(schema_name, endpoint=None, path=None, date_fields=None, with_updated_since=True, #pylint: disable=too-many-arguments
+                  for_each_handler=None, map_handler=None, object_to_id=None):
+    if not should_sync(schema_name):
+        return
 
-    with Transformer() as transformer:
-        page = 1
-        while page is not None:
-            url = get_url(endpoint or schema_name)
-            params = {"updated_since": updated_since} if with_updated_since else {}
-            params['page'] = page
-            response = request(url, params)
-            path = path or schema_name
-            data = response[path]
-            time_extracted = utils.now()
-
-            # update state with 'start' to add bookmark if no record is returned
-            utils.update_state(TAP_STATE, schema_name, start)
-            for row in data:
-                if map_handler is not None:
-                    row = map_handler(row)
-
-                if object_to_id is not None:
-                    for key in object_to_id:
-                        if row[key] is not None:
-                            row[key + '_id'] = row[key]['id']
-                        else:
-                            row[key + '_id'] = None
-
-                remove_empty_date_times(row, schema)
-
-                item = transformer.transform(row, schema)
-
-                append_times_to_dates(item, date_fields)
+    selected = is_selected(schema_name)
+    bookmark_property = 'updated_at'
+    if selected:
+        schema = load_and_write_schema(schema_name, ["id"], bookmark_property)
+    else:
+        schema = get_schema(schema_name)
+
+    state_key = schema_name if selected else children_bookmark_key(schema_name)
+    start = get_start(state_key)
+    updated_since = get_updated_since(state_key)
+    # child streams are read in full for each parent, so only the streams
+    # paged by updated_since need an upper bound
+    updated_before = UPDATED_BEFORE if with_updated_since else None
+    emitted_ids = EMITTED_IDS[schema_name]
+    # child streams read from their own endpoint skip records written
+    # unchanged in an earlier run; only records that are written are fingerprinted
+    index = None
+    if selected and FINGERPRINTS is not None and 'endpoint' in STREAMS[schema_name]:
+        index = FINGERPRINTS.index
+
+    with profiling.profile(schema_name), telemetry.stream(schema_name), \
+         Transformer() as transformer:
+        columns = get_columnar_transform(schema_name, schema, transformer)
+        url = get_url(endpoint or schema_name)
+        if with_updated_since:
+            pages = get_pages(url, path or schema_name, {"updated_since": updated_since})
+        else:
+            pages = get_child_pages(schema_name, url, path or schema_name, updated_since)
+
+        def filtered_pages():
+            for rows, time_extracted in pages:
+                # update state with 'start' to add bookmark if no record is returned
+                utils.update_state(TAP_STATE, state_key, start)
+                if PREFETCHER is not None and for_each_handler is not None:
+                    PREFETCHER.schedule(child_requests(schema_name, rows, bookmark_property,
+                                                       start, updated_before))
+                yield filter_rows(drain(rows), bookmark_property, start, updated_before,
+                                  emitted_ids), time_extracted
+
+        # the records Singer messages are written for are serialized by the pool
+        if TRANSFORM_POOL is not None and selected and PARQUET is None and index is None:
+            transformed = serialize_pages(
+                ((map_rows(rows, map_handler, object_to_id), time_extracted)
+                 for rows, time_extracted in filtered_pages()),
+                emitted_ids, bookmark_property,
+                functools.partial(serialize_page, stream_name=schema_name, schema=schema,
+                                  bookmark_property=bookmark_property, date_fields=date_fields,
+                                  use_columnar=columns is not None))
+        elif columns is not None:
+            transformed = ((transform_page(rows, columns, map_handler, object_to_id),
+                            time_extracted) for rows, time_extracted in filtered_pages())
+        else:
+            transformed = ((transform_rows(rows, schema, transformer, map_handler=map_handler,
+                                           object_to_id=object_to_id, date_fields=date_fields),
+                            time_extracted)
+                           for rows, time_extracted in filtered_pages())
+        for pairs, time_extracted in transformed:
+            for row, item in pairs:
+                if updated_before is not None and item[bookmark_property] > updated_before:
+                    continue
 
                 if item[bookmark_property] >= start:
-                    singer.write_record(schema_name,
-                                        item,
-                                        time_extracted=time_extracted)
+                    if index is not None and index.unchanged(schema_name, row.get('id'), item):
+                        telemetry.increment(telemetry.UNCHANGED_COUNT)
+                    elif selected:
+                        write_record(schema_name, item, time_extracted)
+                    if 'id' in row:
+                        emitted_ids.add(row['id'])
 
                     # take any additional actions required for the currently loaded endpoint
                     if for_each_handler is not None:
                         for_each_handler(row, time_extracted=time_extracted)
 
-                    utils.update_state(TAP_STATE, schema_name, item[bookmark_property])
-            page = response['next_page']
+                    utils.update_state(TAP_STATE, state_key, item[bookmark_property])
 
-    singer.write_state(TAP_STATE)
+    write_state(schema_name)
 
 
+@profiling.profiled("time_entries")
 def sync_time_entries():
+    # each distinct external reference is written once per run
+    seen_external_references = dedupe.SeenIndex(
+        int(CONFIG.get('external_reference_cache_size') or dedupe.DEFAULT_MAX_SIZE))
+
     def for_each_time_entry(time_entry, time_extracted):
         # Extract external_reference
-        external_reference_schema = load_and_write_schema("external_reference")
-        load_and_write_schema("time_entry_external_reference",
-                              key_properties=["time_entry_id", "external_reference_id"])
+        if is_selected("external_reference"):
+            external_reference_schema = load_and_write_schema("external_reference")
+        if is_selected("time_entry_external_reference"):
+            load_and_write_schema("time_entry_external_reference",
+                                  key_properties=["time_entry_id", "external_reference_id"])
         if time_entry['external_reference'] is not None:
-            with Transformer() as transformer:
-                external_reference = time_entry['external_reference']
-                external_reference = transformer.transform(external_reference,
-                                                           external_reference_schema)
+            external_reference = time_entry['external_reference']
+            if is_selected("external_reference"):
+                if seen_external_references.seen(external_reference['id'], external_reference):
+                    telemetry.increment(telemetry.DUPLICATE_COUNT,
+                                        stream_name="external_reference")
+                else:
+                    with Transformer() as transformer:
+                        with telemetry.timed(telemetry.TRANSFORM_TIME):
+                            record = transformer.transform(
+                                project(external_reference, external_reference_schema),
+                                external_reference_schema)
 
-                singer.write_record("external_reference",
-                                    external_reference,
-                                    time_extracted=time_extracted)
+                        write_record("external_reference", record, time_extracted)
 
+            if is_selected("time_entry_external_reference"):
                 # Create pivot row for time_entry and external_reference
                 pivot_row = {
                     'time_entry_id': time_entry['id'],
                     'external_reference_id': external_reference['id']
                 }
 
-                singer.write_record("time_entry_external_reference",
-                                    pivot_row,
-                                    time_extracted=time_extracted)
+                write_record("time_entry_external_reference", pivot_row, time_extracted)
 
     sync_endpoint("time_entries", for_each_handler=for_each_time_entry,
                   object_to_id=[
@@ -284,6 +921,7 @@ def sync_time_entries():
                   ])
 
 
+@profiling.profiled("invoices")
 def sync_invoices():
     def for_each_invoice(invoice, time_extracted):
         def map_invoice_message(message):
@@ -298,38 +936,37 @@ def sync_invoices():
 
         # Sync invoice messages
         sync_endpoint("invoice_messages",
-                      endpoint=("invoices/{}/messages".format(invoice['id'])),
+                      endpoint=STREAMS["invoice_messages"]['endpoint'].format(invoice['id']),
                       path="invoice_messages",
                       with_updated_since=False,
                       map_handler=map_invoice_message)
 
         # Sync invoice payments
         sync_endpoint("invoice_payments",
-                      endpoint=("invoices/{}/payments".format(invoice['id'])),
+                      endpoint=STREAMS["invoice_payments"]['endpoint'].format(invoice['id']),
                       path="invoice_payments",
                       with_updated_since=False,
                       map_handler=map_invoice_payment,
                       date_fields=["send_reminder_on"])
 
         # Extract all invoice_line_items
+        if not is_selected("invoice_line_items"):
+            return
         line_items_schema = load_and_write_schema("invoice_line_items")
         with Transformer() as transformer:
             for line_item in invoice['line_items']:
-                line_item['invoice_id'] = invoice['id']
-                if line_item['project'] is not None:
-                    line_item['project_id'] = line_item['project']['id']
-                else:
-                    line_item['project_id'] = None
-                line_item = transformer.transform(line_item, line_items_schema)
+                with telemetry.timed(telemetry.TRANSFORM_TIME):
+                    line_item = map_invoice_line_item(line_item, invoice)
+                    line_item = transformer.transform(project(line_item, line_items_schema),
+                                                      line_items_schema)
 
-                singer.write_record("invoice_line_items",
-                                    line_item,
-                                    time_extracted=time_extracted)
+                write_record("invoice_line_items", line_item, time_extracted)
 
     sync_endpoint("invoices", for_each_handler=for_each_invoice,
                   object_to_id=['client', 'estimate', 'retainer', 'creator'])
 
 
+@profiling.profiled("estimates")
 def sync_estimates():
     def for_each_estimate(estimate, time_extracted):
         # create "estimate_id" field in the child stream records
@@ -340,22 +977,24 @@ def sync_estimates():
 
         # Sync estimate messages
         sync_endpoint("estimate_messages",
-                      endpoint=("estimates/{}/messages".format(estimate['id'])),
+                      endpoint=STREAMS["estimate_messages"]['endpoint'].format(estimate['id']),
                       path="estimate_messages",
                       with_updated_since=False,
                       date_fields=["send_reminder_on"],
                       map_handler=map_estimate_message)
 
         # Extract all estimate_line_items
+        if not is_selected("estimate_line_items"):
+            return
         line_items_schema = load_and_write_schema("estimate_line_items")
         with Transformer() as transformer:
             for line_item in estimate['line_items']:
-                line_item['estimate_id'] = estimate['id']
-                line_item = transformer.transform(line_item, line_items_schema)
+                with telemetry.timed(telemetry.TRANSFORM_TIME):
+                    line_item['estimate_id'] = estimate['id']
+                    line_item = transformer.transform(project(line_item, line_items_schema),
+                                                      line_items_schema)
 
-                singer.write_record("estimate_line_items",
-                                    line_item,
-                                    time_extracted=time_extracted)
+                write_record("estimate_line_items", line_item, time_extracted)
 
     sync_endpoint("estimates",
                   for_each_handler=for_each_estimate,
@@ -363,9 +1002,12 @@ def sync_estimates():
                   object_to_id=['client', 'creator'])
 
 
+@profiling.profiled("roles")
 def sync_roles():
     def for_each_role(role, time_extracted):
         # Extract user_roles
+        if not is_selected("user_roles"):
+            return
         load_and_write_schema("user_roles", key_properties=["user_id", "role_id"])
         for user_id in role['user_ids']:
             pivot_row = {
@@ -373,21 +1015,23 @@ def sync_roles():
                 'user_id': user_id
             }
 
-            singer.write_record("user_roles",
-                                pivot_row,
-                                time_extracted=time_extracted)
+            write_record("user_roles", pivot_row, time_extracted)
 
     sync_endpoint("roles", for_each_handler=for_each_role)
 
 
+@profiling.profiled("users")
 def sync_users():
     def for_each_user(user, time_extracted): #pylint: disable=unused-argument
+        # only the id is needed, for `user_id`
         def map_user_projects(project_assignment):
-            project_assignment['user'] = user
+            project_assignment['user'] = {'id': user['id']}
             return project_assignment
 
         def for_each_user_project(user_project_assignment, time_extracted):
             # Extract user_project_tasks
+            if not is_selected("user_project_tasks"):
+                return
             load_and_write_schema("user_project_tasks",
                                   key_properties=["user_id", "project_task_id"])
             for project_task in user_project_assignment['task_assignments']:
@@ -396,12 +1040,10 @@ def sync_users():
                     'project_task_id': project_task['id']
                 }
 
-                singer.write_record("user_project_tasks",
-                                    pivot_row,
-                                    time_extracted=time_extracted)
+                write_record("user_project_tasks", pivot_row, time_extracted)
 
         sync_endpoint("user_projects",
-                      endpoint=("users/{}/project_assignments".format(user['id'])),
+                      endpoint=STREAMS["user_projects"]['endpoint'].format(user['id']),
                       path="project_assignments",
                       with_updated_since=False,
                       object_to_id=['project', 'client', 'user'],
@@ -411,20 +1053,8 @@ def sync_users():
     sync_endpoint("users", for_each_handler=for_each_user)
 
 
+@profiling.profiled("expenses")
 def sync_expenses():
-    def map_expense(expense):
-        if expense['receipt'] is None:
-            expense['receipt_url'] = None
-            expense['receipt_file_name'] = None
-            expense['receipt_file_size'] = None
-            expense['receipt_content_type'] = None
-        else:
-            expense['receipt_url'] = expense['receipt']['url']
-            expense['receipt_file_name'] = expense['receipt']['file_name']
-            expense['receipt_file_size'] = expense['receipt']['file_size']
-            expense['receipt_content_type'] = expense['receipt']['content_type']
-        return expense
-
     sync_endpoint("expenses",
                   map_handler=map_expense,
                   object_to_id=[
@@ -437,8 +1067,67 @@ def sync_expenses():
                   ])
 
 
+# The first day a report stream reads: `report_lookback_days` before its
+# bookmark, or without one `start_date`, or `report_backfill_days` before today
+# if that is set and later. Never before `start_date`.
+def get_report_start(schema_name):
+    start = utils.strptime_to_utc(CONFIG['start_date'])
+    if schema_name in STATE:
+        lookback = datetime.timedelta(days=int(CONFIG.get('report_lookback_days',
+                                                          DEFAULT_REPORT_LOOKBACK_DAYS)))
+        return max(utils.strptime_to_utc(STATE[schema_name]) - lookback, start)
+
+    if CONFIG.get('report_backfill_days'):
+        backfill = datetime.timedelta(days=int(CONFIG['report_backfill_days']))
+        backfill_start = datetime.datetime.combine(utils.now().date() - backfill,
+                                                   datetime.time(), datetime.timezone.utc)
+        if backfill_start > start:
+            LOGGER.warning("%s has no bookmark, reading it from %s (report_backfill_days) "
+                           "instead of start_date %s, earlier days are not synced",
+                           schema_name, backfill_start.date(), start.date())
+            return backfill_start
+    days = (utils.now() - start).days
+    if days > LONG_REPORT_BACKFILL_DAYS:
+        LOGGER.warning("%s has no bookmark, reading %s days from start_date at a request a "
+                       "day, about %s minutes; set report_backfill_days to read fewer",
+                       schema_name, days, days * 15 // 100)
+    return start
+
+
+# Report streams are read one day at a time, so each record holds one day's
+# totals. A run starts `report_lookback_days` before the bookmark, and the
+# bookmark is saved after each day.
+def sync_report(schema_name):
+    if not is_selected(schema_name):
+        return
+
+    stream = STREAMS[schema_name]
+    schema = load_and_write_schema(schema_name, stream['key_properties'], 'date')
+    day = get_report_start(schema_name).date()
+    today = utils.now().date()
+
+    with profiling.profile(schema_name), telemetry.stream(schema_name), \
+         Transformer() as transformer:
+        url = get_url('reports/' + stream['report'])
+        while day <= today:
+            date = utils.strftime(datetime.datetime.combine(day, datetime.time(),
+                                                            datetime.timezone.utc))
+            params = {'from': day.strftime('%Y%m%d'), 'to': day.strftime('%Y%m%d')}
+            for rows, time_extracted in get_pages(url, 'results', params, fetch=request_report):
+                map_handler = functools.partial(map_report_row, date=date)
+                for _, item in transform_rows(drain(rows), schema, transformer,
+                                              map_handler=map_handler):
+                    write_record(schema_name, item, time_extracted)
+
+            utils.update_state(TAP_STATE, schema_name, date)
+            write_state(schema_name)
+            day += datetime.timedelta(days=1)
+
+
 def do_sync():
+    global UPDATED_BEFORE  # pylint: disable=global-statement
     LOGGER.info("Starting sync")
+    UPDATED_BEFORE = utils.strftime(utils.now())
 
     company = get_company()
 
@@ -463,6 +1152,10 @@ def do_sync():
         # Sync expenses and their categories
         sync_endpoint("expense_categories")
         sync_expenses()
+        sync_report("expense_report_clients")
+        sync_report("expense_report_projects")
+        sync_report("expense_report_categories")
+        sync_report("expense_report_team")
     else:
         LOGGER.info("Expense Feature not enabled, skipping.")
 
@@ -483,16 +1176,197 @@ def do_sync():
     # Sync Time Entries along with their external reference objects
     sync_time_entries()
 
+    # Aggregated hours per day, from the reports API
+    sync_report("time_report_clients")
+    sync_report("time_report_projects")
+    sync_report("time_report_tasks")
+    sync_report("time_report_team")
+
+    if FINGERPRINTS is not None:
+        FINGERPRINTS.commit(TAP_STATE)
+        write_state()
+    if PARQUET is not None:
+        PARQUET.commit(TAP_STATE, force=True)
+
     LOGGER.info("Sync complete")
 
+# Reads every page of a stream and keeps only the ids.
+def sweep_ids(endpoint):
+    ids = idset.IdSet()
+    for rows, _ in get_pages(get_url(endpoint), endpoint, {}):
+        for row in drain(rows):
+            ids.add(row['id'])
+    return ids
+
+
+# The record with id `record_id`, or None when the endpoint answers 404.
+def get_record(endpoint, record_id):
+    try:
+        return request(get_url('{}/{}'.format(endpoint, record_id)))
+    except requests.exceptions.HTTPError as err:
+        if err.response is None or err.response.status_code != 404:
+            raise
+        return None
+
+
+# The ids of `missing` that the stream still has. Each id is requested on its
+# own, unless that takes more requests than reading the stream again, which
+# is also how endpoints that cannot be read by id are confirmed.
+def confirm_ids(endpoint, sweep, missing):
+    sweep_pages = len(sweep) // memory.DEFAULT_PER_PAGE + 1
+    if endpoint in SWEEP_CONFIRMED or len(missing) > sweep_pages:
+        return sweep_ids(endpoint)
+    ids = idset.IdSet()
+    for record_id in missing:
+        if get_record(endpoint, record_id) is not None:
+            ids.add(record_id)
+    return ids
+
+
+# Writes a record with `_sdc_deleted_at` for each id of the stream that is gone
+# since the previous snapshot, see tap_harvest.deletes.
+def sync_deletes(stream_name, endpoint, deleted_at):
+    from tap_harvest import deletes  # pylint: disable=import-outside-toplevel
+    with telemetry.stream(stream_name):
+        sweep = sweep_ids(endpoint)
+        missing = SNAPSHOTS.deleted(stream_name, sweep,
+                                    functools.partial(confirm_ids, endpoint, sweep))
+        if not missing:
+            return
+        LOGGER.info("%s: %s records deleted", stream_name, len(missing))
+        schema = dict(get_schema(stream_name))
+        schema['properties'] = dict(schema['properties'], **{
+            deletes.DELETED_AT: {'type': ['null', 'string'], 'format': 'date-time'}})
+        singer.write_schema(stream_name, schema, STREAMS[stream_name]['key_properties'],
+                            bookmark_properties=['updated_at'])
+        time_extracted = utils.now()
+        for record_id in missing:
+            write_record(stream_name, {'id': record_id, deletes.DELETED_AT: deleted_at},
+                         time_extracted)
+            telemetry.increment(telemetry.DELETED_COUNT)
+
+
+def do_detect_deletes():
+    LOGGER.info("Starting delete detection")
+    company = get_company()
+    deleted_at = utils.strftime(utils.now())
+    for stream_name, (endpoint, feature) in DELETE_DETECTION.items():
+        if not is_selected(stream_name):
+            continue
+        if feature is not None and not company[feature]:
+            LOGGER.info("%s is not enabled, skipping %s.", feature, stream_name)
+            continue
+        sync_deletes(stream_name, endpoint, deleted_at)
+
+    SNAPSHOTS.commit(TAP_STATE)
+    singer.write_state(TAP_STATE)
+    LOGGER.info("Delete detection complete")
+
+def get_catalog():
+    entries = []
+    for stream_name, stream in STREAMS.items():
+        schema = load_schema(stream_name)
+        replication_key = stream.get('replication_key', 'updated_at')
+        replication_keys = [replication_key] if replication_key in schema['properties'] else None
+        mdata = metadata.to_map(metadata.get_standard_metadata(
+            schema=schema,
+            key_properties=stream['key_properties'],
+            valid_replication_keys=replication_keys,
+            replication_method='INCREMENTAL' if replication_keys else 'FULL_TABLE'))
+        if replication_keys:
+            mdata = metadata.write(mdata, ('properties', replication_key), 'inclusion',
+                                   'automatic')
+        if stream.get('parent'):
+            mdata = metadata.write(mdata, (), 'parent-tap-stream-id', stream['parent'])
+        entries.append(CatalogEntry(tap_stream_id=stream_name,
+                                    stream=stream_name,
+                                    schema=Schema.from_dict(schema),
+                                    key_properties=stream['key_properties'],
+                                    metadata=metadata.to_list(mdata)))
+    return Catalog(entries)
+
 def do_discover():
-    print('{"streams":[]}')
+    json.dump(get_catalog().to_dict(), sys.stdout, indent=2)
+
+def parse_args():
+    # `--profile DIR` is handled here, everything else by singer's parser
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile', dest='profile_dir')
+    parser.add_argument('--detect-deletes', dest='detect_deletes', action='store_true')
+    known, remaining = parser.parse_known_args()
+    sys.argv = sys.argv[:1] + remaining
+    args = utils.parse_args(REQUIRED_CONFIG_KEYS)
+    args.profile_dir = known.profile_dir
+    args.detect_deletes = known.detect_deletes
+    return args
+
+# pyarrow is an optional dependency, imported only for export mode
+def get_parquet_export():
+    if not CONFIG.get('export_dir'):
+        return None
+    try:
+        from tap_harvest import parquet_export  # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise Exception("export_dir needs pyarrow, install it with "
+                        "`pip install tap-harvest[parquet]`") from err
+    return parquet_export.from_config(CONFIG)
+
+# The optional features below are only imported when the config sets them, to
+# keep startup fast. Their from_config still decides whether they are enabled.
+def get_snapshots(detect_deletes):
+    if not detect_deletes and not CONFIG.get('detect_deletes'):
+        return None
+    from tap_harvest import deletes  # pylint: disable=import-outside-toplevel
+    return deletes.from_config(CONFIG, STATE, detect_deletes)
+
+def get_fingerprints():
+    if not CONFIG.get('fingerprint_dir'):
+        return None
+    from tap_harvest import fingerprints  # pylint: disable=import-outside-toplevel
+    return fingerprints.from_config(CONFIG, STATE)
+
+def get_prefetcher():
+    if not CONFIG.get('max_concurrency'):
+        return None
+    from tap_harvest import concurrency  # pylint: disable=import-outside-toplevel
+    return concurrency.from_config(CONFIG, request)
+
+def get_hedger(max_concurrency):
+    if not CONFIG.get('hedge_requests'):
+        return None
+    from tap_harvest import hedging  # pylint: disable=import-outside-toplevel
+    return hedging.from_config(CONFIG, max_concurrency)
+
+def get_transform_pool():
+    if not CONFIG.get('transform_workers'):
+        return None
+    from tap_harvest import workers  # pylint: disable=import-outside-toplevel
+    return workers.from_config(CONFIG)
+
+# Stops the threads and processes started for the sync.
+def close_workers():
+    for pool in (PREFETCHER, HEDGER, TRANSFORM_POOL):
+        if pool is not None:
+            pool.close()
+
 
 def main_impl():
-    args = utils.parse_args(REQUIRED_CONFIG_KEYS)
+    args = parse_args()
     CONFIG.update(args.config)
-    global AUTH  # pylint: disable=global-statement
-    AUTH = Auth(CONFIG['client_id'], CONFIG['client_secret'], CONFIG['refresh_token'])
+    global AUTH, EXPORTER, MEMORY_CEILING, PREFETCHER, REQUEST_LOG  # pylint: disable=global-statement
+    global FINGERPRINTS, HEDGER, PARQUET, RETRY_POLICY, SNAPSHOTS  # pylint: disable=global-statement
+    global TRANSFORM_POOL  # pylint: disable=global-statement
+    global SELECTED_STREAMS, SELECTED_FIELDS  # pylint: disable=global-statement
+    if CONFIG.get('metrics_textfile'):
+        # only imported when used, to keep startup fast
+        from tap_harvest import openmetrics  # pylint: disable=import-outside-toplevel
+        EXPORTER = openmetrics.from_config(CONFIG)
+    REQUEST_LOG = request_log.from_config(CONFIG)
+    MEMORY_CEILING = memory.from_config(CONFIG)
+    RETRY_POLICY = retry.from_config(CONFIG)
+    profile_dir = args.profile_dir or CONFIG.get('profile_dir')
+    if profile_dir:
+        profiling.enable(profile_dir, CONFIG.get('profile_top_n', profiling.DEFAULT_TOP_N))
     STATE.update(args.state)
     # making a copy of STATE for saving child stream bookmark
     # when data is not available for parent stream
@@ -500,7 +1374,39 @@ def main_impl():
     if args.discover:
         do_discover()
     else:
-        do_sync()
+        # discovery needs no credentials, so the token is only fetched to sync
+        AUTH = Auth(CONFIG['client_id'], CONFIG['client_secret'], CONFIG['refresh_token'])
+        catalog = args.catalog
+        if catalog is None and args.properties:
+            catalog = Catalog.from_dict(args.properties)
+        SELECTED_STREAMS = get_selected_streams(catalog)
+        SELECTED_FIELDS = get_selected_fields(catalog)
+        SNAPSHOTS = get_snapshots(args.detect_deletes)
+        PARQUET = get_parquet_export() if SNAPSHOTS is None else None
+        if PARQUET is None:
+            # unchanged records are only skipped in the Singer output
+            FINGERPRINTS = get_fingerprints()
+        PREFETCHER = get_prefetcher()
+        if PREFETCHER is not None:
+            # a pooled connection for each request in flight
+            SESSION.mount(BASE_API_URL, requests.adapters.HTTPAdapter(
+                pool_maxsize=PREFETCHER.controller.max_window + 1))
+        HEDGER = get_hedger(PREFETCHER.controller.max_window if PREFETCHER is not None else 1)
+        TRANSFORM_POOL = get_transform_pool()
+        completed = False
+        try:
+            if SNAPSHOTS is not None:
+                do_detect_deletes()
+            else:
+                do_sync()
+            completed = True
+        finally:
+            close_workers()
+            telemetry.report()
+            telemetry.flush()
+            profiling.write_summary()
+            if EXPORTER is not None:
+                EXPORTER.write(TAP_STATE, complete=completed)
 
 def main():
     try:
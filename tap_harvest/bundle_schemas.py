@@ -0,0 +1,50 @@
+"""
+Writes tap_harvest/schema_bundle.py from the JSON schemas in tap_harvest/schemas/.
+
+The bundle keeps every schema as a compact JSON string in one module, so all
+of them are read with the module's single .pyc read, and only the schemas a
+run uses are parsed. Run it after adding or changing a schema:
+
+    python -m tap_harvest.bundle_schemas
+"""
+
+import json
+import os
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'schemas')
+BUNDLE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'schema_bundle.py')
+
+HEADER = '''\
+# Generated from tap_harvest/schemas/*.json by `python -m tap_harvest.bundle_schemas`.
+# Do not edit; regenerate the bundle after changing a schema.
+# pylint: disable=line-too-long,too-many-lines
+'''
+
+
+def read_schemas(schemas_dir=SCHEMAS_DIR):
+    """stream -> compact JSON text of its schema, in file name order."""
+    schemas = {}
+    for file_name in sorted(os.listdir(schemas_dir)):
+        if not file_name.endswith('.json'):
+            continue
+        with open(os.path.join(schemas_dir, file_name), encoding='utf-8') as handle:
+            schemas[file_name[:-len('.json')]] = json.dumps(json.load(handle),
+                                                            separators=(',', ':'))
+    return schemas
+
+
+def render(schemas):
+    lines = [HEADER, 'SCHEMAS = {']
+    for name, text in schemas.items():
+        lines.append('    {!r}: {!r},'.format(name, text))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    with open(BUNDLE_PATH, 'w', encoding='utf-8') as handle:
+        handle.write(render(read_schemas()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Columnar transform for high-volume streams.
+
+With `columnar_transform` set in the config, time entries and expenses are
+transformed a page at a time instead of a record at a time. Each property of
+the schema becomes a column, converted by a function chosen once per schema:
+
+* Integers, numbers, booleans and strings that already have their type are
+  kept as they are.
+* Date-times Harvest sends as `2017-06-26T21:36:23Z` or `2017-06-26` are
+  rewritten without being parsed, and empty date-times are dropped.
+* `<object>_id` columns are read from the nested objects.
+
+Any other value goes through `singer.Transformer`, so records are the same
+as on the row path, down to the order of their keys.
+"""
+
+import datetime
+
+from singer.transform import SchemaMismatch
+
+from tap_harvest import schema_types
+
+# a property the row does not have, which the record leaves out
+MISSING = object()
+
+
+def _is_valid(value):
+    try:
+        datetime.datetime.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_utc_timestamp(value):
+    # e.g. 2017-06-26T21:36:23Z
+    return len(value) == 20 and value[19] == 'Z' and value[10] == 'T' \
+        and value[4] == value[7] == '-' and value[13] == value[16] == ':' and _is_valid(value)
+
+
+def _is_date(value):
+    # e.g. 2017-06-26
+    return len(value) == 10 and value[4] == value[7] == '-' and _is_valid(value)
+
+
+class ColumnarTransform:
+    def __init__(self, schema, transformer):
+        self.schema = schema
+        self.transformer = transformer
+        self.columns = [(name, self._converter(subschema))
+                        for name, subschema in schema['properties'].items()]
+
+    def _slow(self, subschema):
+        transformer = self.transformer
+
+        def convert(value):
+            success, result = transformer.transform_recur(value, subschema, [])
+            if not success:
+                raise SchemaMismatch(transformer.errors)
+            return result
+        return convert
+
+    def _converter(self, subschema):
+        """A function converting a column's values as Transformer would."""
+        slow = self._slow(subschema)
+        types = schema_types.non_null(subschema)
+        if types == ['string'] and subschema.get('format') == 'date-time':
+            def convert_datetimes(values):
+                return [MISSING if value is None else _datetime(value, slow) for value in values]
+            return convert_datetimes
+
+        kind = None
+        if len(types) == 1 and subschema.get('format') not in ('date-time', 'singer.decimal'):
+            kind = {'integer': int, 'number': float, 'boolean': bool, 'string': str}.get(types[0])
+        if kind is None:
+            def convert(values):
+                return [value if value is MISSING else slow(value) for value in values]
+            return convert
+
+        def convert_typed(values):
+            # bool is an int, but Transformer turns it into 0 or 1
+            return [value if value.__class__ is kind or value is MISSING else slow(value)
+                    for value in values]
+        return convert_typed
+
+    def transform(self, rows, map_handler=None, object_to_id=None):
+        """(row, record) for each row of the page, as `transform_rows` yields them."""
+        if map_handler is not None:
+            rows = [map_handler(row) for row in rows]
+        object_ids = {key + '_id': key for key in object_to_id or ()}
+
+        records = [{} for _ in rows]
+        for name, convert in self.columns:
+            if name in object_ids:
+                key = object_ids[name]
+                values = [None if row[key] is None else row[key]['id'] for row in rows]
+            else:
+                values = [row.get(name, MISSING) for row in rows]
+            for record, value in zip(records, convert(values)):
+                if value is not MISSING:
+                    record[name] = value
+        return list(zip(rows, records))
+
+
+def _datetime(value, slow):
+    if value is MISSING:
+        return MISSING
+    if value.__class__ is str:
+        if _is_utc_timestamp(value):
+            return value[:19] + '.000000Z'
+        if _is_date(value):
+            return value + 'T00:00:00.000000Z'
+    return slow(value)
@@ -0,0 +1,190 @@
+"""
+Adaptive concurrency for requests made ahead of the sync.
+
+With `max_concurrency` above 1 in the config, the first page of each child
+stream (invoice and estimate messages, invoice payments, user projects) is
+requested on worker threads while the parent's page is still being synced.
+Records are still written in the same order as without it.
+
+How many of those requests are in flight at once, the window, is set by an
+AIMD controller. It starts at 1 and grows by one for each window's worth of
+responses that come back without errors and without a latency spike (slower
+than `LATENCY_FACTOR` times the smoothed latency). It is halved on 429s, 5xx
+responses and timeouts, at most once per round of requests: responses to
+requests sent before the last cut do not cut it again. While the rate limiter
+makes requests wait, more of them in flight would not help, so the window is
+not kept above the number in flight.
+"""
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+import singer
+
+from tap_harvest import telemetry
+
+LOGGER = singer.get_logger()
+
+DEFAULT_MAX_CONCURRENCY = 1
+MIN_WINDOW = 1
+# factor applied to the window on a 429, 5xx or timeout
+DECREASE_FACTOR = 0.5
+# latency above this multiple of the smoothed latency counts as a spike
+LATENCY_FACTOR = 2.0
+# weight of the latest latency in the smoothed latency
+LATENCY_SMOOTHING = 0.1
+
+
+def is_congested(status):
+    """Whether a response status (None for a timeout) means the API is overloaded."""
+    return status is None or status == 429 or status >= 500
+
+
+class AIMDController:
+    def __init__(self, max_window):
+        self.max_window = max_window
+        self.window = float(MIN_WINDOW)
+        self.in_flight = 0
+        self._latency = None
+        self._last_cut = 0.0
+        self._condition = threading.Condition()
+        telemetry.set_gauge(telemetry.CONCURRENCY_WINDOW, self.window)
+
+    def acquire(self):
+        """Waits until the window has room for another request."""
+        with self._condition:
+            while self.in_flight >= int(self.window):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_response(self, started, latency, status=None):
+        """Adjusts the window for a response to a request sent at `started` (perf_counter)."""
+        with self._condition:
+            if is_congested(status):
+                if started >= self._last_cut:
+                    self._set_window(self.window * DECREASE_FACTOR)
+                    self._last_cut = time.perf_counter()
+                    LOGGER.info("Concurrency window cut to %.1f after %s", self.window,
+                                status or "a timeout")
+                return
+
+            spike = self._latency is not None and latency > LATENCY_FACTOR * self._latency
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency += LATENCY_SMOOTHING * (latency - self._latency)
+            if not spike:
+                self._set_window(self.window + 1 / self.window)
+
+    def on_throttle(self):
+        """Called when the rate limiter makes a request wait."""
+        with self._condition:
+            self._set_window(min(self.window, self.in_flight))
+
+    def _set_window(self, window):
+        window = min(self.max_window, max(MIN_WINDOW, window))
+        if int(window) > int(self.window):
+            self._condition.notify_all()
+        self.window = window
+        telemetry.set_gauge(telemetry.CONCURRENCY_WINDOW, window)
+
+
+class Prefetcher:
+    """
+    Requests the first pages the sync will ask for next, in that order, up to
+    `max_window` ahead. `take` hands over the request for a page, and drops
+    the ones scheduled before it, which the sync skipped.
+    """
+
+    def __init__(self, controller, fetch):
+        self.controller = controller
+        self._fetch = fetch
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=controller.max_window, thread_name_prefix='tap-harvest-prefetch')
+        # [stream, url, params, future or None until submitted]
+        self._entries = collections.deque()
+
+    @staticmethod
+    def key(url, params):
+        return url, tuple(sorted(params.items()))
+
+    def schedule(self, requests):
+        """Adds (stream, url, params) in the order the sync will ask for them."""
+        for stream_name, url, params in requests:
+            self._entries.append([stream_name, url, params, None])
+        self._fill()
+
+    def take(self, url, params):
+        """
+        The future of a scheduled request, or None if it was not scheduled. A
+        request scheduled for the same page with other params, which the sync
+        no longer sends, is dropped on a miss, with the ones before it, so it
+        does not hold a place in the window.
+        """
+        key = self.key(url, params)
+        stale = None
+        for index, entry in enumerate(self._entries):
+            if self.key(entry[1], entry[2]) == key:
+                break
+            if stale is None and entry[1] == url and entry[2].get('page') == params.get('page'):
+                stale = index
+        else:
+            if stale is not None:
+                self._drop(stale + 1)
+                self._fill()
+            return None
+
+        self._drop(index)
+        self._fill()
+        return self._entries.popleft()[3]
+
+    def discard(self, stream_name):
+        """Drops the stream's scheduled requests, whose params are out of date."""
+        for entry in self._entries:
+            if entry[0] == stream_name and entry[3] is not None:
+                entry[3].cancel()
+        self._entries = collections.deque(entry for entry in self._entries
+                                          if entry[0] != stream_name)
+        self._fill()
+
+    def _drop(self, count):
+        for _ in range(count):
+            skipped = self._entries.popleft()
+            if skipped[3] is not None:
+                skipped[3].cancel()
+
+    def close(self):
+        for entry in self._entries:
+            if entry[3] is not None:
+                entry[3].cancel()
+        self._entries.clear()
+        self._executor.shutdown(wait=True)
+
+    def _fill(self):
+        for index, entry in enumerate(self._entries):
+            if index >= self.controller.max_window:
+                break
+            if entry[3] is None:
+                entry[3] = self._executor.submit(self._run, entry[0], entry[1], entry[2])
+
+    def _run(self, stream_name, url, params):
+        self.controller.acquire()
+        try:
+            with telemetry.background(stream_name):
+                return self._fetch(url, params)
+        finally:
+            self.controller.release()
+
+
+def from_config(config, fetch):
+    max_concurrency = int(config.get('max_concurrency') or DEFAULT_MAX_CONCURRENCY)
+    if max_concurrency <= 1:
+        return None
+    return Prefetcher(AIMDController(max_concurrency), fetch)
@@ -0,0 +1,43 @@
+"""
+Run-scoped deduplication of records that many rows embed.
+
+Many time entries point at the same external reference (a Jira issue, a
+Trello card, ...). SeenIndex remembers the id and a content fingerprint of
+the records written recently, so a record is written again only when it is
+new or has changed. It is an LRU bounded to `max_size` entries, so memory
+stays flat however many distinct records a run sees; a record evicted from it
+is simply written again the next time it comes up.
+"""
+
+import collections
+import hashlib
+import json
+
+DEFAULT_MAX_SIZE = 100000
+
+
+def fingerprint(record):
+    text = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+class SeenIndex:
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._fingerprints = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def seen(self, key, record):
+        """True when `record` was already recorded under `key`; records it otherwise."""
+        digest = fingerprint(record)
+        if self._fingerprints.get(key) == digest:
+            self._fingerprints.move_to_end(key)
+            return True
+
+        self._fingerprints[key] = digest
+        self._fingerprints.move_to_end(key)
+        if len(self._fingerprints) > self.max_size:
+            self._fingerprints.popitem(last=False)
+        return False
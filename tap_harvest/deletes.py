@@ -0,0 +1,97 @@
+"""
+Delete detection from snapshots of record ids.
+
+Harvest does not report deleted records. With `--detect-deletes` (or
+`detect_deletes` in the config) the tap does not sync records. Instead it
+reads every page of each selected top-level stream and keeps only the
+ids, which spares transforming and writing the records. Each stream's ids
+are compared with the snapshot taken by the previous run, and a record with
+`_sdc_deleted_at` set is written for each id that is gone.
+
+Rows can move between pages while a stream is read, so an id missing from
+the sweep is only taken as deleted once it is confirmed: each missing id is
+requested on its own and taken as deleted on a 404. When that takes more
+requests than reading the stream again, or the endpoint cannot be read by
+id, the stream is read a second time instead. The first run only takes the
+snapshots.
+
+Snapshots are kept in `snapshot_dir` as compressed bitmaps (see
+`tap_harvest.idset`), in a new file each run that the state points to under
+`id_snapshots` (see `tap_harvest.sidecar`).
+"""
+
+import singer
+
+from tap_harvest import idset, sidecar
+
+LOGGER = singer.get_logger()
+
+STATE_KEY = 'id_snapshots'
+MAGIC = b'tap-harvest-id-snapshots 1\n'
+FILE_PREFIX = 'ids-'
+FILE_SUFFIX = '.bin'
+DELETED_AT = '_sdc_deleted_at'
+
+
+def save(path, snapshots):
+    blobs = [(stream, snapshots[stream].to_bytes()) for stream in sorted(snapshots)]
+    header = {'streams': [[stream, len(blob)] for stream, blob in blobs]}
+    with sidecar.writing(path, MAGIC, header) as handle:
+        for _, blob in blobs:
+            handle.write(blob)
+
+
+def load(path):
+    snapshots = {}
+    with sidecar.reading(path, MAGIC, "an id snapshot") as (header, handle):
+        for stream, size in header['streams']:
+            snapshots[stream] = idset.IdSet.from_bytes(handle.read(size))
+    return snapshots
+
+
+class SnapshotStore:
+    """The snapshots of the previous run, where they are saved and the file the state pointed to."""
+
+    def __init__(self, directory, previous_path=None):
+        self.directory = directory
+        self.previous_path = previous_path
+        self.snapshots = {}
+        if previous_path is None:
+            return
+        try:
+            self.snapshots = load(previous_path)
+        except (OSError, ValueError) as err:
+            # without the previous snapshots, this run only takes new ones
+            LOGGER.warning("Could not read id snapshots %s (%s), no deletes are detected",
+                           previous_path, err)
+
+    def deleted(self, stream, sweep, confirm):
+        """
+        Ids of the stream's previous snapshot that are missing from `sweep` and
+        from the ids `confirm(missing)` returns, the ids the stream still has.
+        It is only called when ids are missing. The stream's snapshot becomes
+        the ids of both.
+        """
+        previous = self.snapshots.get(stream)
+        missing = previous.difference(sweep) if previous is not None else idset.IdSet()
+        if missing:
+            second = confirm(missing)
+            missing = missing.difference(second)
+            sweep.update(second)
+        self.snapshots[stream] = sweep
+        return missing
+
+    def commit(self, state):
+        """Saves the snapshots to a new file and points `state` at it."""
+        path = state[STATE_KEY] = sidecar.commit(
+            self.directory, FILE_PREFIX, FILE_SUFFIX, self.previous_path,
+            lambda path: save(path, self.snapshots))
+        return path
+
+
+def from_config(config, state, enabled=False):
+    if not enabled and str(config.get('detect_deletes', '')).lower() not in ('true', '1'):
+        return None
+    if not config.get('snapshot_dir'):
+        raise Exception("Delete detection needs `snapshot_dir` in the config")
+    return SnapshotStore(config['snapshot_dir'], state.get(STATE_KEY))
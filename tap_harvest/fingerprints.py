@@ -0,0 +1,134 @@
+"""
+Change fingerprints of the child streams read without `updated_since`.
+
+Invoice and estimate messages, invoice payments and user projects are read
+in full for each parent whenever their endpoint does not take
+`updated_since`, so most of their rows come back unchanged run after run.
+With `fingerprint_dir` set in the config, the tap keeps the id and a 64-bit
+fingerprint of the content of each record it writes for those streams, and
+does not write a record again while its fingerprint is unchanged.
+
+The index is saved at the end of each run to a new file in `fingerprint_dir`,
+and the state written after it has the file's path under `fingerprint_index`
+(see `tap_harvest.sidecar`).
+
+Each stream's index is kept as two sorted arrays, of ids and fingerprints,
+16 bytes a record, plus a dict of the records that changed in the run.
+"""
+
+import bisect
+import sys
+from array import array
+
+import singer
+
+from tap_harvest import dedupe, sidecar
+
+LOGGER = singer.get_logger()
+
+STATE_KEY = 'fingerprint_index'
+MAGIC = b'tap-harvest-fingerprints 1\n'
+FILE_PREFIX = 'fingerprints-'
+FILE_SUFFIX = '.bin'
+# ids that fit in the arrays; records with other ids are always written
+MAX_ID = (1 << 63) - 1
+
+
+def fingerprint(record):
+    return int.from_bytes(dedupe.fingerprint(record), 'little')
+
+
+class FingerprintIndex:
+    def __init__(self, streams=None):
+        # stream -> (sorted ids, fingerprints), as loaded
+        self._loaded = streams or {}
+        # stream -> id -> fingerprint, for the records written in this run
+        self._changed = {}
+
+    def get(self, stream, key):
+        changed = self._changed.get(stream)
+        if changed is not None and key in changed:
+            return changed[key]
+        ids, digests = self._loaded.get(stream, ((), ()))
+        position = bisect.bisect_left(ids, key)
+        if position < len(ids) and ids[position] == key:
+            return digests[position]
+        return None
+
+    def unchanged(self, stream, key, record):
+        """
+        True when `record` was written under `key` with the same content;
+        records its fingerprint otherwise.
+        """
+        if not isinstance(key, int) or not 0 <= key <= MAX_ID:
+            return False
+        digest = fingerprint(record)
+        if self.get(stream, key) == digest:
+            return True
+        self._changed.setdefault(stream, {})[key] = digest
+        return False
+
+    def merged(self, stream):
+        """(ids, fingerprints) of the stream as sorted arrays, with this run's changes."""
+        ids, digests = self._loaded.get(stream, (array('q'), array('Q')))
+        changed = self._changed.get(stream)
+        if not changed:
+            return ids, digests
+        entries = dict(zip(ids, digests))
+        entries.update(changed)
+        keys = sorted(entries)
+        return array('q', keys), array('Q', (entries[key] for key in keys))
+
+    def save(self, path):
+        streams = sorted(set(self._loaded) | set(self._changed))
+        arrays = [(stream,) + self.merged(stream) for stream in streams]
+        header = {'byteorder': sys.byteorder,
+                  'streams': [[stream, len(ids)] for stream, ids, _ in arrays]}
+        with sidecar.writing(path, MAGIC, header) as handle:
+            for _, ids, digests in arrays:
+                ids.tofile(handle)
+                digests.tofile(handle)
+
+    @classmethod
+    def load(cls, path):
+        streams = {}
+        with sidecar.reading(path, MAGIC, "a fingerprint index") as (header, handle):
+            for stream, count in header['streams']:
+                ids, digests = array('q'), array('Q')
+                ids.fromfile(handle, count)
+                digests.fromfile(handle, count)
+                if header['byteorder'] != sys.byteorder:
+                    ids.byteswap()
+                    digests.byteswap()
+                streams[stream] = (ids, digests)
+        return cls(streams)
+
+
+class FingerprintStore:
+    """The index of a run, where it is saved and the file the state pointed to."""
+
+    def __init__(self, directory, previous_path=None):
+        self.directory = directory
+        self.previous_path = previous_path
+        self.index = FingerprintIndex()
+        if previous_path is None:
+            return
+        try:
+            self.index = FingerprintIndex.load(previous_path)
+        except (OSError, ValueError, EOFError) as err:
+            # an empty index only means every record is written
+            LOGGER.warning("Could not read fingerprint index %s (%s), writing every record",
+                           previous_path, err)
+
+    def commit(self, state):
+        """Saves the index to a new file and points `state` at it."""
+        path = state[STATE_KEY] = sidecar.commit(self.directory, FILE_PREFIX, FILE_SUFFIX,
+                                                 self.previous_path, self.index.save)
+        return path
+
+
+def from_config(config, state):
+    directory = config.get('fingerprint_dir')
+    if not directory:
+        return None
+    return FingerprintStore(directory, state.get(STATE_KEY))
@@ -0,0 +1,163 @@
+"""
+Hedged requests for slow pages.
+
+With `hedge_requests` set in the config, the latency of the last 1000
+responses of each endpoint is kept, and each request gets a soft deadline
+of `hedge_factor` (default 2) times the endpoint's 99th percentile. A
+request still waiting at its deadline is sent a second time, if the rate
+limiter has room for it, and whichever response arrives first is used.
+Endpoints are told apart by their path with ids left out, so the messages of
+every invoice share one percentile. No request is hedged before its endpoint
+has `MIN_SAMPLES` responses, or while the worker threads are busy, as
+requests that lost a race can hold them until they time out.
+
+Requests that can be hedged time out after `TIMEOUT_FACTOR` times their
+deadline, so a request that lost a race holds its thread, and the exit of
+the tap, for a bounded time. Each request's own latency is kept, the losers'
+as well, so slow requests still count in the percentile when a hedge beat
+them.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import re
+import threading
+import time
+
+from tap_harvest import telemetry
+
+DEFAULT_FACTOR = 2.0
+WINDOW = 1000
+MIN_SAMPLES = 50
+# percentiles are recomputed after this many new samples
+REFRESH_EVERY = 10
+# deadlines are never shorter than this, in seconds
+MIN_DEADLINE = 1.0
+# requests that can be hedged time out after this many times their deadline
+TIMEOUT_FACTOR = 4
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_key(path):
+    """`invoices/12/messages` -> `invoices/{id}/messages`."""
+    return _ID_SEGMENT.sub('/{id}', '/' + path.strip('/'))[1:]
+
+
+class LatencyTracker:
+    def __init__(self, window=WINDOW):
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._percentiles = {}
+        self._pending = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            samples = self._samples[endpoint]
+            samples.append(seconds)
+            self._pending[endpoint] += 1
+            if len(samples) >= MIN_SAMPLES and (endpoint not in self._percentiles or
+                                                self._pending[endpoint] >= REFRESH_EVERY):
+                ordered = sorted(samples)
+                self._percentiles[endpoint] = ordered[min(len(ordered) - 1,
+                                                          int(len(ordered) * 0.99))]
+                self._pending[endpoint] = 0
+
+    def p99(self, endpoint):
+        """The endpoint's 99th percentile latency, or None until it has enough samples."""
+        return self._percentiles.get(endpoint)
+
+
+class Hedger:
+    def __init__(self, factor=DEFAULT_FACTOR, max_workers=4):
+        self.factor = factor
+        self.max_workers = max_workers
+        self.latencies = LatencyTracker()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='tap-harvest-hedge')
+        self._busy = 0
+        self._lock = threading.Lock()
+
+    def deadline(self, endpoint):
+        p99 = self.latencies.p99(endpoint)
+        return None if p99 is None else max(MIN_DEADLINE, p99 * self.factor)
+
+    def send(self, endpoint, send, try_take, timeout=None):
+        """
+        Calls `send(timeout)` and returns its response. If it is still waiting
+        at the endpoint's deadline and `try_take()` grants a slot of the rate
+        limiter, `send` is called again and the first response to arrive is
+        returned. Requests that can be hedged are sent with a timeout of at
+        most TIMEOUT_FACTOR times the deadline.
+        """
+        deadline = self.deadline(endpoint)
+        if deadline is None or not self._reserve(2):
+            return self._timed(endpoint, functools.partial(send, timeout))
+        bounded = deadline * TIMEOUT_FACTOR
+        if timeout is not None:
+            bounded = min(timeout, bounded)
+        return self._send_hedged(endpoint, functools.partial(send, bounded), deadline, try_take)
+
+    def _timed(self, endpoint, send):
+        started = time.perf_counter()
+        response = send()
+        self.latencies.record(endpoint, time.perf_counter() - started)
+        return response
+
+    def _reserve(self, workers):
+        with self._lock:
+            if self._busy + workers > self.max_workers:
+                return False
+            self._busy += workers
+            return True
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._busy -= 1
+
+    def _submit(self, endpoint, send):
+        future = self._executor.submit(self._timed, endpoint, send)
+        future.add_done_callback(self._release)
+        return future
+
+    def _send_hedged(self, endpoint, send, deadline, try_take):
+        primary = self._submit(endpoint, send)
+        hedge = None
+        try:
+            try:
+                return primary.result(timeout=deadline)
+            except concurrent.futures.TimeoutError:
+                pass
+            if not try_take():
+                return primary.result()
+            telemetry.increment(telemetry.HEDGE_COUNT)
+            hedge = self._submit(endpoint, send)
+        finally:
+            if hedge is None:
+                # the worker kept for the hedge is not needed
+                self._release()
+
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        telemetry.increment(telemetry.HEDGE_WIN_COUNT)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def from_config(config, max_concurrency=1):
+    if str(config.get('hedge_requests', '')).lower() not in ('true', '1'):
+        return None
+    factor = float(config.get('hedge_factor') or DEFAULT_FACTOR)
+    # a request and its hedge for the sync and for each prefetch thread
+    return Hedger(factor, max_workers=2 * (max_concurrency + 1))
@@ -0,0 +1,227 @@
+"""
+Compact set of record ids.
+
+Harvest ids are positive integers, spread thinly over billions. IdSet splits
+them into chunks of 65536 ids, as roaring bitmaps do. A chunk holding up to
+`ARRAY_MAX` ids keeps them as a sorted array of 16-bit offsets, two bytes an
+id. A fuller chunk becomes a bitmap of 8 KB, a bit an id. A few million
+sparse ids take a few bytes each, instead of the tens a Python set of ints
+needs, and dense ranges take about a bit each. Any other id is kept in a
+plain set.
+
+Sets are compared chunk by chunk, and saved as their zlib-compressed
+chunks, so a snapshot of a stream's ids is small on disk as well.
+"""
+
+import bisect
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+CHUNK_BYTES = (1 << CHUNK_BITS) // 8
+# chunks with more ids than this are bitmaps, which are then the smaller
+ARRAY_MAX = 4096
+
+
+class IdSet:
+    def __init__(self, ids=()):
+        # chunk key -> sorted array('H') of offsets, or bitmap bytearray
+        self._chunks = {}
+        self._others = set()
+        self._length = 0
+        for value in ids:
+            self.add(value)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        """Integer ids in ascending order, then the other ids."""
+        for key in sorted(self._chunks):
+            base = key << CHUNK_BITS
+            yield from (base + offset for offset in _offsets(self._chunks[key]))
+        yield from self._others
+
+    def __contains__(self, value):
+        if isinstance(value, int) and value >= 0:
+            chunk = self._chunks.get(value >> CHUNK_BITS)
+            return chunk is not None and _contains(chunk, value & CHUNK_MASK)
+        return value in self._others
+
+    def add(self, value):
+        """Adds `value`; returns False when it was already in the set."""
+        if isinstance(value, int) and value >= 0:
+            key, offset = value >> CHUNK_BITS, value & CHUNK_MASK
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                self._chunks[key] = array('H', [offset])
+            elif isinstance(chunk, bytearray):
+                bit = 1 << (offset & 7)
+                if chunk[offset >> 3] & bit:
+                    return False
+                chunk[offset >> 3] |= bit
+            else:
+                index = bisect.bisect_left(chunk, offset)
+                if index < len(chunk) and chunk[index] == offset:
+                    return False
+                chunk.insert(index, offset)
+                if len(chunk) > ARRAY_MAX:
+                    self._chunks[key] = _bitmap(chunk)
+        else:
+            if value in self._others:
+                return False
+            self._others.add(value)
+        self._length += 1
+        return True
+
+    def update(self, other):
+        """Adds every id of the IdSet `other`."""
+        # pylint: disable=protected-access
+        for key, chunk in other._chunks.items():
+            mine = self._chunks.get(key)
+            if mine is None:
+                self._chunks[key] = _copy(chunk)
+            elif isinstance(mine, bytearray) or isinstance(chunk, bytearray):
+                merged = _bits_int(mine) | _bits_int(chunk)
+                self._chunks[key] = bytearray(merged.to_bytes(CHUNK_BYTES, 'little'))
+            else:
+                self._chunks[key] = _container(sorted(set(mine).union(chunk)))
+        self._others |= other._others
+        self._length = sum(_count(chunk) for chunk in self._chunks.values()) + len(self._others)
+
+    def difference(self, other):
+        """A new IdSet with the ids that are in this set but not in `other`."""
+        # pylint: disable=protected-access
+        result = IdSet()
+        for key, chunk in self._chunks.items():
+            theirs = other._chunks.get(key)
+            if theirs is None:
+                left = _copy(chunk)
+            elif isinstance(chunk, bytearray):
+                bits = _bits_int(chunk) & ~_bits_int(theirs)
+                left = _shrink(bytearray(bits.to_bytes(CHUNK_BYTES, 'little')))
+            else:
+                left = array('H', (offset for offset in chunk
+                                   if not _contains(theirs, offset)))
+            if not _count(left):
+                continue
+            result._chunks[key] = left
+            result._length += _count(left)
+        for value in self._others - other._others:
+            result.add(value)
+        return result
+
+    def to_bytes(self):
+        """
+        The set's zlib-compressed chunks. The header lists each chunk as
+        [key, ids], where chunks of more than ARRAY_MAX ids are bitmaps.
+        """
+        keys = sorted(self._chunks)
+        chunks = [self._chunks[key] for key in keys]
+        header = json.dumps({'chunks': [[key, _count(chunk)] for key, chunk in zip(keys, chunks)],
+                             'others': list(self._others)}).encode('utf-8')
+        return zlib.compress(struct.pack('<I', len(header)) + header +
+                             b''.join(_to_bytes(chunk) for chunk in chunks))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = zlib.decompress(data)
+        size, = struct.unpack_from('<I', data)
+        header = json.loads(data[4:4 + size])
+        ids = cls(header['others'])
+        offset = 4 + size
+        for key, count in header['chunks']:
+            length = 2 * count if count <= ARRAY_MAX else CHUNK_BYTES
+            if len(data) < offset + length:
+                raise ValueError("Truncated id set")
+            if length == CHUNK_BYTES:
+                chunk = _shrink(bytearray(data[offset:offset + length]))
+            else:
+                chunk = _from_bytes(data[offset:offset + length])
+            ids._chunks[key] = chunk
+            ids._length += _count(chunk)
+            offset += length
+        return ids
+
+    def nbytes(self):
+        """Approximate memory used by the chunks."""
+        return sys.getsizeof(self._chunks) + sum(sys.getsizeof(chunk)
+                                                 for chunk in self._chunks.values())
+
+
+def _contains(chunk, offset):
+    if isinstance(chunk, bytearray):
+        return bool(chunk[offset >> 3] & (1 << (offset & 7)))
+    index = bisect.bisect_left(chunk, offset)
+    return index < len(chunk) and chunk[index] == offset
+
+
+def _count(chunk):
+    if isinstance(chunk, bytearray):
+        return bin(int.from_bytes(chunk, 'little')).count('1')
+    return len(chunk)
+
+
+def _copy(chunk):
+    return bytearray(chunk) if isinstance(chunk, bytearray) else array('H', chunk)
+
+
+def _bitmap(offsets):
+    chunk = bytearray(CHUNK_BYTES)
+    for offset in offsets:
+        chunk[offset >> 3] |= 1 << (offset & 7)
+    return chunk
+
+
+def _bits_int(chunk):
+    if not isinstance(chunk, bytearray):
+        chunk = _bitmap(chunk)
+    return int.from_bytes(chunk, 'little')
+
+
+def _container(offsets):
+    """The chunk for the sorted `offsets`: an array, or a bitmap past ARRAY_MAX of them."""
+    chunk = array('H', offsets)
+    return _bitmap(chunk) if len(chunk) > ARRAY_MAX else chunk
+
+
+def _shrink(bitmap):
+    """`bitmap`, or an array of its offsets when it has no more than ARRAY_MAX of them."""
+    return bitmap if _count(bitmap) > ARRAY_MAX else array('H', _bits(bitmap, 0))
+
+
+def _to_bytes(chunk):
+    if isinstance(chunk, bytearray):
+        return bytes(chunk)
+    if sys.byteorder == 'big':
+        chunk = array('H', chunk)
+        chunk.byteswap()
+    return chunk.tobytes()
+
+
+def _from_bytes(data):
+    chunk = array('H')
+    chunk.frombytes(data)
+    if sys.byteorder == 'big':
+        chunk.byteswap()
+    return chunk
+
+
+def _offsets(chunk):
+    """The offsets in `chunk`, in order."""
+    if not isinstance(chunk, bytearray):
+        return chunk
+    return list(_bits(chunk, 0))
+
+
+def _bits(chunk, base):
+    """The ids of the bits set in `chunk`, which starts at id `base`, in order."""
+    for index, byte in enumerate(chunk):
+        if byte:
+            for bit in range(8):
+                if byte & (1 << bit):
+                    yield base + (index << 3) + bit
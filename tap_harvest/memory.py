@@ -0,0 +1,67 @@
+"""
+Memory ceiling for sync runs.
+
+When `max_rss_mb` is set in the config, the tap checks its resident set size
+before each page request. Once RSS passes 90% of the ceiling the page size is
+halved, from Harvest's maximum of 2000 rows down to 125. Each halving divides
+the previous page size, so the next page number can be worked out from the
+offset reached so far without skipping or repeating rows.
+"""
+
+import os
+import resource
+import sys
+
+import singer
+
+LOGGER = singer.get_logger()
+
+DEFAULT_PER_PAGE = 2000
+MIN_PER_PAGE = 125
+# fraction of the ceiling at which pages are made smaller
+PRESSURE_RATIO = 0.9
+
+
+def current_rss_bytes():
+    """Resident set size of the tap, or its peak where /proc is not available."""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Peak resident set size of the tap."""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def next_page(page, per_page, new_per_page):
+    """The page, in pages of `new_per_page` rows, that starts where `page` did."""
+    return (page - 1) * per_page // new_per_page + 1
+
+
+class MemoryCeiling:
+    def __init__(self, max_rss_mb, per_page=DEFAULT_PER_PAGE):
+        self.max_rss_bytes = int(max_rss_mb * 1024 * 1024)
+        self._per_page = per_page
+
+    def under_pressure(self):
+        return current_rss_bytes() >= self.max_rss_bytes * PRESSURE_RATIO
+
+    def per_page(self):
+        """Page size for the next request, halved while RSS is near the ceiling."""
+        if self._per_page > MIN_PER_PAGE and self.under_pressure():
+            self._per_page = max(MIN_PER_PAGE, self._per_page // 2)
+            LOGGER.warning("RSS is near max_rss_mb (%s MB), requesting %s rows per page",
+                           self.max_rss_bytes // (1024 * 1024), self._per_page)
+        return self._per_page
+
+
+def from_config(config):
+    max_rss_mb = config.get('max_rss_mb')
+    if not max_rss_mb:
+        return None
+    return MemoryCeiling(float(max_rss_mb))
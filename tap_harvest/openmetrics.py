@@ -0,0 +1,140 @@
+"""
+OpenMetrics textfile exporter for sync runs.
+
+When `metrics_textfile` is set in the config, the run totals kept by
+`tap_harvest.telemetry` are written to that path every
+`metrics_textfile_interval` seconds and once more when the run ends. The file
+is replaced atomically so a node-exporter textfile collector never reads a
+partial file.
+"""
+
+import os
+import time
+
+from singer import metrics, utils
+
+from tap_harvest import memory, telemetry
+
+PREFIX = 'tap_harvest_'
+DEFAULT_INTERVAL = 60
+
+# (family, type, telemetry metric, help)
+STREAM_FAMILIES = [
+    ('records', 'counter', metrics.Metric.record_count, 'Records written'),
+    ('pages', 'counter', telemetry.PAGE_COUNT, 'Pages fetched'),
+    ('duplicate_records', 'counter', telemetry.DUPLICATE_COUNT,
+     'Records not written again because an identical copy was already written'),
+    ('unchanged_records', 'counter', telemetry.UNCHANGED_COUNT,
+     'Records not written because they are unchanged since an earlier run'),
+    ('deleted_records', 'counter', telemetry.DELETED_COUNT,
+     'Records written with _sdc_deleted_at because their id is gone'),
+    ('http_requests', 'counter', telemetry.HTTP_REQUEST_COUNT, 'HTTP requests sent'),
+    ('http_retries', 'counter', telemetry.HTTP_RETRY_COUNT, 'HTTP requests retried'),
+    ('http_429', 'counter', telemetry.HTTP_429_COUNT, 'HTTP 429 responses'),
+    ('hedged_requests', 'counter', telemetry.HEDGE_COUNT,
+     'Requests sent a second time because the first was slower than usual'),
+    ('hedge_wins', 'counter', telemetry.HEDGE_WIN_COUNT,
+     'Hedged requests whose second copy answered first'),
+    ('retry_budget_spent', 'counter', telemetry.RETRY_BUDGET_SPENT,
+     'Failed requests not retried because the retry budget was spent'),
+    ('http_response_bytes', 'counter', telemetry.HTTP_RESPONSE_BYTES,
+     'Bytes of HTTP response bodies read'),
+    ('rate_limit_sleep_seconds', 'counter', telemetry.RATE_LIMIT_SLEEP,
+     'Seconds spent waiting on the rate limiter'),
+    ('backoff_sleep_seconds', 'counter', telemetry.BACKOFF_SLEEP,
+     'Seconds spent waiting between retries'),
+    ('stream_duration_seconds', 'gauge', telemetry.STREAM_DURATION,
+     'Wall time spent syncing the stream, including its child streams'),
+]
+
+# (family, telemetry gauge, help), rendered when the gauge has been set
+RUN_GAUGES = [
+    ('concurrency_window', telemetry.CONCURRENCY_WINDOW,
+     'Requests the adaptive concurrency controller allows in flight'),
+]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def bookmark_lags(state, now=None):
+    """Seconds between now and each stream's bookmark."""
+    now = now or utils.now()
+    lags = {}
+    for stream, bookmark in state.items():
+        if not isinstance(bookmark, str):
+            continue
+        try:
+            lags[stream] = (now - utils.strptime_to_utc(bookmark)).total_seconds()
+        except ValueError:
+            continue
+    return lags
+
+
+def render(totals, state, started_at, complete=False):
+    lines = []
+
+    def family(name, typ, help_text, samples):
+        lines.append('# TYPE {}{} {}'.format(PREFIX, name, typ))
+        lines.append('# HELP {}{} {}'.format(PREFIX, name, help_text))
+        suffix = '_total' if typ == 'counter' else ''
+        for labels, value in samples:
+            label_text = ','.join('{}="{}"'.format(key, _escape(val))
+                                  for key, val in sorted(labels.items()))
+            lines.append('{}{}{}{} {}'.format(PREFIX, name, suffix,
+                                              '{' + label_text + '}' if label_text else '',
+                                              repr(float(value))))
+
+    streams = sorted(stream for stream in totals if stream)
+    for name, typ, metric, help_text in STREAM_FAMILIES:
+        family(name, typ, help_text,
+               [({'stream': stream}, totals[stream][metric]) for stream in streams
+                if metric in totals[stream]])
+
+    family('stream_time_seconds', 'gauge',
+           'Wall time of the stream, excluding its child streams, by phase',
+           [({'stream': stream, 'phase': phase}, seconds)
+            for stream, phases in sorted(telemetry.time_breakdown(totals).items())
+            for phase, seconds in sorted(phases.items()) if phase != 'total'])
+    family('bookmark_lag_seconds', 'gauge', 'Seconds between now and the stream bookmark',
+           [({'stream': stream}, lag) for stream, lag in sorted(bookmark_lags(state).items())])
+    for name, gauge, help_text in RUN_GAUGES:
+        if gauge in telemetry.GAUGES:
+            family(name, 'gauge', help_text, [({}, telemetry.GAUGES[gauge])])
+    family('peak_rss_bytes', 'gauge', 'Peak resident set size of the tap process',
+           [({}, memory.peak_rss_bytes())])
+    family('run_start_timestamp_seconds', 'gauge', 'When the run started', [({}, started_at)])
+    family('run_duration_seconds', 'gauge', 'Wall time of the run so far',
+           [({}, time.time() - started_at)])
+    family('run_complete', 'gauge', '1 once the run has finished successfully',
+           [({}, int(complete))])
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+class TextfileExporter:
+    def __init__(self, path, interval=DEFAULT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.started_at = time.time()
+        self._last_write = time.monotonic()
+
+    def maybe_write(self, state):
+        if time.monotonic() - self._last_write >= self.interval:
+            self.write(state)
+
+    def write(self, state, complete=False):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            handle.write(render(telemetry.snapshot(), state, self.started_at, complete))
+        os.replace(tmp_path, self.path)
+        self._last_write = time.monotonic()
+
+
+def from_config(config):
+    path = config.get('metrics_textfile')
+    if not path:
+        return None
+    interval = float(config.get('metrics_textfile_interval') or DEFAULT_INTERVAL)
+    return TextfileExporter(path, interval)
@@ -0,0 +1,231 @@
+"""
+Parquet export mode for backfills.
+
+When `export_dir` is set in the config, records are written to Parquet files
+instead of Singer messages on stdout. Each stream gets a directory,
+partitioned by the date of the stream's replication key, as in
+`time_entries/updated_at_date=2021-01-02/part-<run>-<n>.parquet`. Records
+whose key is null go to the `__HIVE_DEFAULT_PARTITION__` partition, which
+Arrow and Hive read as null. Streams whose schema has no replication key,
+such as invoice line items, are not partitioned. Column types come from the stream's schema in
+`tap_harvest/schemas`:
+
+    integer             int64
+    number              double
+    boolean             bool
+    string, date-time   timestamp[us, UTC]
+    other strings       string
+    array, object       list, struct
+    string or number    string
+
+Rows are buffered and written `export_row_group_size` (default 50000) at a
+time, compressed with `export_compression` (default snappy).
+
+Files are written under a `.inprogress` name, and up to `MAX_OPEN_FILES`
+are open at once. They are committed when the tap would write the state of
+a top-level stream, if 20 row groups' worth of rows have been written since
+the last commit, and at the end of the run. A commit closes the open files,
+writes the state and the files it covers to `_commit.json`, and then renames
+the files and writes the state to `state.json` in `export_dir`. A Singer run
+given that file with `--state` continues from where the export ended. The
+next export finishes a commit that was interrupted after `_commit.json` was
+written, and removes the files of any later, uncommitted rows.
+
+pyarrow is only imported when this module is, so it is an optional
+dependency: `pip install tap-harvest[parquet]`.
+"""
+
+import collections
+import itertools
+import json
+import os
+
+import pyarrow
+import pyarrow.parquet
+import singer
+from singer import utils
+
+from tap_harvest import schema_types
+
+LOGGER = singer.get_logger()
+
+DEFAULT_ROW_GROUP_SIZE = 50000
+DEFAULT_COMPRESSION = 'snappy'
+# row groups' worth of rows written between commits
+COMMIT_ROW_GROUPS = 20
+STATE_FILE = 'state.json'
+COMMIT_FILE = '_commit.json'
+IN_PROGRESS = '.inprogress'
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+# files of other partitions are closed, though not committed, past this many
+MAX_OPEN_FILES = 16
+TIMESTAMP = pyarrow.timestamp('us', tz='UTC')
+SCALAR_TYPES = {
+    'integer': pyarrow.int64(),
+    'number': pyarrow.float64(),
+    'boolean': pyarrow.bool_(),
+}
+
+
+def arrow_type(schema, date_time=TIMESTAMP):
+    """The Arrow type of a JSON schema. `date_time` is the type of date-time strings."""
+    types = schema_types.non_null(schema)
+    if len(types) != 1:
+        return pyarrow.string()
+    typ = types[0]
+    if typ in SCALAR_TYPES:
+        return SCALAR_TYPES[typ]
+    if typ == 'string':
+        return date_time if schema.get('format') == 'date-time' else pyarrow.string()
+    if typ == 'array':
+        return pyarrow.list_(arrow_type(schema.get('items', {}), date_time))
+    if typ == 'object' and schema.get('properties'):
+        return pyarrow.struct([(name, arrow_type(subschema, date_time))
+                               for name, subschema in schema['properties'].items()])
+    return pyarrow.string()
+
+
+def _column(schema, values):
+    """An Arrow array of a column's values. Date-times are parsed by Arrow."""
+    if len(schema_types.non_null(schema)) > 1:
+        values = [None if value is None else str(value) for value in values]
+    elif schema_types.non_null(schema) == ['object'] and not schema.get('properties'):
+        values = [None if value is None else json.dumps(value) for value in values]
+    column = pyarrow.array(values, type=arrow_type(schema, date_time=pyarrow.string()))
+    return column.cast(arrow_type(schema))
+
+
+def _write_json(path, value):
+    with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+        json.dump(value, handle)
+    os.replace(path + '.tmp', path)
+
+
+def partition(record, replication_key):
+    """The partition directory of a record, from the date of its replication key."""
+    if replication_key is None:
+        return ''
+    value = record.get(replication_key)
+    return '{}_date={}'.format(replication_key, value[:10] if value else NULL_PARTITION)
+
+
+class StreamFile:
+    """The open Parquet file of a partition and the rows buffered for it."""
+
+    def __init__(self, path, schema, row_group_size, compression):
+        self.path = path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.rows = []
+        self.arrow_schema = pyarrow.schema([(name, arrow_type(subschema))
+                                            for name, subschema in schema['properties'].items()])
+        self._writer = pyarrow.parquet.ParquetWriter(path + IN_PROGRESS, self.arrow_schema,
+                                                     compression=compression)
+
+    def append(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        properties = self.schema['properties']
+        columns = [_column(subschema, [row.get(name) for row in self.rows])
+                   for name, subschema in properties.items()]
+        self._writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.arrow_schema),
+                                 row_group_size=self.row_group_size)
+        self.rows = []
+
+    def close(self):
+        """Finishes the file, which keeps its .inprogress name until it is committed."""
+        self.flush()
+        self._writer.close()
+
+
+class ParquetExport: # pylint: disable=too-many-instance-attributes
+    def __init__(self, directory, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                 compression=DEFAULT_COMPRESSION):
+        self.directory = directory
+        self.row_group_size = row_group_size
+        self.compression = compression
+        run = utils.now().strftime('%Y%m%dT%H%M%S')
+        self._names = ('part-{}-{:05d}.parquet'.format(run, part) for part in itertools.count(1))
+        # stream -> (schema, replication key)
+        self._schemas = {}
+        # (stream, partition) -> StreamFile, least recently written first
+        self._files = collections.OrderedDict()
+        # paths of the files written since the last commit
+        self._uncommitted = []
+        # rows written since the last commit
+        self._pending = 0
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, COMMIT_FILE)):
+            self._finish_commit()
+        self._remove_uncommitted()
+
+    def _finish_commit(self):
+        """Renames the files listed in the commit file and writes its state."""
+        with open(os.path.join(self.directory, COMMIT_FILE), encoding='utf-8') as handle:
+            commit = json.load(handle)
+        for name in commit['files']:
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path + IN_PROGRESS):
+                os.replace(path + IN_PROGRESS, path)
+        _write_json(os.path.join(self.directory, STATE_FILE), commit['state'])
+
+    def _remove_uncommitted(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(IN_PROGRESS):
+                    LOGGER.info("Removing uncommitted export file %s", os.path.join(root, name))
+                    os.remove(os.path.join(root, name))
+
+    def set_schema(self, stream, schema, replication_key='updated_at'):
+        if replication_key not in schema['properties']:
+            replication_key = None
+        self._schemas[stream] = (schema, replication_key)
+
+    def write(self, stream, record):
+        schema, replication_key = self._schemas[stream]
+        key = (stream, partition(record, replication_key))
+        stream_file = self._files.get(key)
+        if stream_file is None:
+            if len(self._files) >= MAX_OPEN_FILES:
+                self._files.popitem(last=False)[1].close()
+            directory = os.path.join(self.directory, *key)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, next(self._names))
+            stream_file = self._files[key] = StreamFile(
+                path, schema, self.row_group_size, self.compression)
+            self._uncommitted.append(os.path.relpath(path, self.directory))
+        else:
+            self._files.move_to_end(key)
+        stream_file.append(record)
+        self._pending += 1
+
+    def commit(self, state, force=False):
+        """
+        Closes the open files and commits them with `state`, unless fewer than
+        COMMIT_ROW_GROUPS row groups' worth of rows were written since the last commit.
+        """
+        if not force and self._pending < self.row_group_size * COMMIT_ROW_GROUPS:
+            return
+        self._pending = 0
+        for stream_file in self._files.values():
+            stream_file.close()
+        self._files.clear()
+        # the files and the state are committed once this file is written
+        _write_json(os.path.join(self.directory, COMMIT_FILE),
+                    {'state': state, 'files': self._uncommitted})
+        self._uncommitted = []
+        self._finish_commit()
+
+
+def from_config(config):
+    directory = config.get('export_dir')
+    if not directory:
+        return None
+    return ParquetExport(directory,
+                         int(config.get('export_row_group_size') or DEFAULT_ROW_GROUP_SIZE),
+                         config.get('export_compression') or DEFAULT_COMPRESSION)
@@ -0,0 +1,133 @@
+"""
+Per-stream profiling, enabled with `--profile DIR` or `profile_dir` in the config.
+
+Each top-level stream sync runs under cProfile with tracemalloc tracing.
+Child streams synced inside a parent (invoice messages, project assignments,
+...) are part of the parent's profile. For every stream this writes:
+
+    <stream>.prof   pstats data, for snakeviz / `python -m pstats`
+    <stream>.txt    top functions by own and cumulative time, and top allocation sites
+
+When the run ends, `summary.txt` and `all.prof` combine every stream.
+
+cProfile, pstats and tracemalloc are only imported once profiling is enabled.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import contextlib
+import functools
+import io
+import os
+
+import singer
+
+LOGGER = singer.get_logger()
+
+DEFAULT_TOP_N = 25
+
+# set by enable(); profiling is off while this is None
+PROFILE_DIR = None
+TOP_N = DEFAULT_TOP_N
+
+_ACTIVE = []
+_PROFILES = []
+
+
+def enable(profile_dir, top_n=DEFAULT_TOP_N):
+    global PROFILE_DIR, TOP_N  # pylint: disable=global-statement
+    import tracemalloc
+    os.makedirs(profile_dir, exist_ok=True)
+    PROFILE_DIR = profile_dir
+    TOP_N = int(top_n)
+    tracemalloc.start()
+    LOGGER.info("Profiling enabled, writing profiles to %s", profile_dir)
+
+
+def _stats_text(stats, sort_key):
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort_key).print_stats(TOP_N)
+    return out.getvalue()
+
+
+def _snapshot():
+    import tracemalloc
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def _allocations_text(before, after):
+    lines = ["Top {} allocation sites (size and count growth)".format(TOP_N)]
+    for stat in after.compare_to(before, 'lineno')[:TOP_N]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+
+def _profile_path(name, extension):
+    path = os.path.join(PROFILE_DIR, name + extension)
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(PROFILE_DIR, "{}.{}{}".format(name, suffix, extension))
+    return path
+
+
+@contextlib.contextmanager
+def profile(name):
+    """Profiles the block as stream `name`, unless profiling is off or already running."""
+    if PROFILE_DIR is None or _ACTIVE:
+        yield
+        return
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    _ACTIVE.append(name)
+    before = _snapshot()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        after = _snapshot()
+        _ACTIVE.pop()
+
+        prof_path = _profile_path(name, '.prof')
+        profiler.dump_stats(prof_path)
+        _PROFILES.append(prof_path)
+        stats = pstats.Stats(profiler)
+        with open(prof_path[:-len('.prof')] + '.txt', 'w', encoding='utf-8') as handle:
+            handle.write("Stream: {}\n\n".format(name))
+            handle.write(_stats_text(stats, 'tottime'))
+            handle.write(_stats_text(stats, 'cumulative'))
+            handle.write(_allocations_text(before, after))
+
+
+def profiled(name):
+    """Decorator form of profile() for the sync_* helpers."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def write_summary():
+    if PROFILE_DIR is None or not _PROFILES:
+        return
+
+    import pstats
+    stats = pstats.Stats(*_PROFILES)
+    stats.dump_stats(os.path.join(PROFILE_DIR, 'all.prof'))
+    with open(os.path.join(PROFILE_DIR, 'summary.txt'), 'w', encoding='utf-8') as handle:
+        handle.write("Streams: {}\n\n".format(", ".join(
+            os.path.basename(path)[:-len('.prof')] for path in _PROFILES)))
+        handle.write(_stats_text(stats, 'tottime'))
+        handle.write(_stats_text(stats, 'cumulative'))
+        top = _snapshot().statistics('lineno')[:TOP_N]
+        handle.write("Top {} allocation sites still held at the end of the run\n".format(TOP_N))
+        handle.write("\n".join(str(stat) for stat in top) + "\n")
+    LOGGER.info("Wrote profile summary to %s", os.path.join(PROFILE_DIR, 'summary.txt'))
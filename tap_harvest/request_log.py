@@ -0,0 +1,97 @@
+"""
+Sampled, structured logging of HTTP requests.
+
+Only a sample of requests is logged, as one JSON object per line with the
+stream, URL, status, duration, response size and number of rows returned.
+Requests slower than `slow_request_threshold` seconds, and failed responses,
+are always logged. Every `progress_log_interval` seconds a progress
+summary is logged with the records, pages and requests of each stream so far.
+
+    request_log_sample_rate   fraction of requests to log (default 0.01)
+    slow_request_threshold    seconds (default 10)
+    progress_log_interval     seconds, 0 disables the summary (default 60)
+"""
+
+import json
+import random
+import time
+
+import singer
+from singer import metrics
+
+from tap_harvest import telemetry
+
+LOGGER = singer.get_logger()
+
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_SLOW_THRESHOLD = 10
+DEFAULT_PROGRESS_INTERVAL = 60
+
+
+def count_rows(response_json):
+    """Number of rows in a page, i.e. the items of its list values."""
+    if not isinstance(response_json, dict):
+        return 0
+    return sum(len(value) for value in response_json.values() if isinstance(value, list))
+
+
+class RequestLogger:
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, slow_threshold=DEFAULT_SLOW_THRESHOLD,
+                 progress_interval=DEFAULT_PROGRESS_INTERVAL):
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.progress_interval = progress_interval
+        self._random = random.Random()
+        self._last_progress = time.monotonic()
+
+    def log(self, url, status, duration, size, rows, *, failed=False):  # pylint: disable=too-many-arguments
+        slow = duration >= self.slow_threshold
+        if slow or failed or self._random.random() < self.sample_rate:
+            line = json.dumps({'stream': telemetry.current_stream(),
+                               'url': url,
+                               'status': status,
+                               'duration_seconds': round(duration, 3),
+                               'bytes': size,
+                               'rows': rows,
+                               'slow': slow}, sort_keys=True, default=str)
+            if slow or failed:
+                LOGGER.warning("request %s", line)
+            else:
+                LOGGER.info("request %s", line)
+        self.maybe_log_progress()
+
+    def maybe_log_progress(self):
+        if not self.progress_interval:
+            return
+        if time.monotonic() - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = time.monotonic()
+        snapshot = telemetry.snapshot()
+        for stream_name in sorted(stream for stream in snapshot if stream):
+            totals = snapshot[stream_name]
+            LOGGER.info("progress %s", json.dumps({
+                'stream': stream_name,
+                'records': totals[metrics.Metric.record_count],
+                'pages': totals[telemetry.PAGE_COUNT],
+                'requests': totals[telemetry.HTTP_REQUEST_COUNT],
+                'http_seconds': round(totals[telemetry.HTTP_TIME], 3),
+            }, sort_keys=True))
+        if telemetry.CONCURRENCY_WINDOW in telemetry.GAUGES:
+            LOGGER.info("progress %s", json.dumps({
+                'concurrency_window': round(telemetry.GAUGES[telemetry.CONCURRENCY_WINDOW], 2),
+            }))
+
+
+def _config_float(config, key, default):
+    value = config.get(key)
+    if value is None or value == '':
+        return default
+    return float(value)
+
+
+def from_config(config):
+    return RequestLogger(
+        sample_rate=_config_float(config, 'request_log_sample_rate', DEFAULT_SAMPLE_RATE),
+        slow_threshold=_config_float(config, 'slow_request_threshold', DEFAULT_SLOW_THRESHOLD),
+        progress_interval=_config_float(config, 'progress_log_interval',
+                                        DEFAULT_PROGRESS_INTERVAL))
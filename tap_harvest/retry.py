@@ -0,0 +1,130 @@
+"""
+Retry policy shared by the token refresh and every API request.
+
+A call is tried up to 5 times. Connection errors, timeouts, 429s and 5xx
+responses are retried, other 4xx responses are not. A 429 or 503 with a
+`Retry-After` header is retried after the time the API asks for. Other
+retries wait with decorrelated jitter: a random time between 2 seconds and
+three times the previous wait, at most 60 seconds.
+
+Retries that are not asked for by `Retry-After` come out of a budget for the
+whole run, so an API that keeps failing is not sent several times the usual
+number of requests:
+
+    retry_budget_ratio   retries allowed per call (default 0.1)
+    retry_budget_min     retries allowed on top of that (default 10)
+
+Once the budget is spent, failures are raised without retrying.
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+import requests
+import singer
+
+from tap_harvest import telemetry
+
+LOGGER = singer.get_logger()
+
+MAX_TRIES = 5
+BASE_DELAY = 2
+MAX_DELAY = 60
+# longest `Retry-After` honoured, in seconds
+MAX_RETRY_AFTER = 15 * 60
+RETRY_AFTER_STATUSES = (429, 503)
+DEFAULT_BUDGET_RATIO = 0.1
+DEFAULT_BUDGET_MIN = 10
+
+
+def retry_after(response):
+    """Seconds the `Retry-After` header of a 429 or 503 asks to wait, or None."""
+    if response is None or response.status_code not in RETRY_AFTER_STATUSES:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = date.timestamp() - time.time()
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+
+def is_retryable(error):
+    response = error.response
+    if response is None:
+        return True
+    return response.status_code == 429 or response.status_code >= 500
+
+
+class RetryBudget:
+    """Allows `minimum` retries plus `ratio` of the calls made so far."""
+
+    def __init__(self, ratio=DEFAULT_BUDGET_RATIO, minimum=DEFAULT_BUDGET_MIN):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.calls = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def spend(self):
+        """Takes a retry out of the budget, or returns False when it is spent."""
+        with self._lock:
+            if self.retries >= self.minimum + self.ratio * self.calls:
+                return False
+            self.retries += 1
+            return True
+
+
+class RetryPolicy:
+    def __init__(self, budget=None, max_tries=MAX_TRIES):
+        self.budget = budget or RetryBudget()
+        self.max_tries = max_tries
+        self._random = random.Random()
+
+    def next_delay(self, delay):
+        """Decorrelated jitter: the wait after a wait of `delay` seconds."""
+        return min(MAX_DELAY, self._random.uniform(BASE_DELAY, delay * 3))
+
+    def call(self, func, *args, **kwargs):
+        self.budget.record_call()
+        delay = BASE_DELAY
+        for attempt in range(1, self.max_tries + 1):
+            try:
+                return func(*args, **kwargs)
+            except requests.exceptions.RequestException as err:
+                if attempt == self.max_tries or not is_retryable(err):
+                    raise
+                wait = retry_after(err.response)
+                if wait is None:
+                    if not self.budget.spend():
+                        LOGGER.warning("Retry budget spent, not retrying: %s", err)
+                        telemetry.increment(telemetry.RETRY_BUDGET_SPENT)
+                        raise
+                    delay = wait = self.next_delay(delay)
+
+                telemetry.increment(telemetry.HTTP_RETRY_COUNT)
+                telemetry.add_sleep(telemetry.BACKOFF_SLEEP, wait)
+                LOGGER.info("Attempt %s of %s failed (%s), retrying in %.1f seconds",
+                            attempt, self.max_tries, err, wait)
+                time.sleep(wait)
+        return None
+
+
+def from_config(config):
+    ratio = config.get('retry_budget_ratio')
+    minimum = config.get('retry_budget_min')
+    return RetryPolicy(RetryBudget(
+        ratio=DEFAULT_BUDGET_RATIO if ratio in (None, '') else float(ratio),
+        minimum=DEFAULT_BUDGET_MIN if minimum in (None, '') else int(minimum)))
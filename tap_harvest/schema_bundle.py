@@ -0,0 +1,39 @@
+# Generated from tap_harvest/schemas/*.json by `python -m tap_harvest.bundle_schemas`.
+# Do not edit; regenerate the bundle after changing a schema.
+# pylint: disable=line-too-long,too-many-lines
+
+SCHEMAS = {
+    'clients': '{"type":"object","properties":{"id":{"type":["null","integer"]},"name":{"type":["null","string"]},"is_active":{"type":["null","boolean"]},"address":{"type":["null","string"]},"currency":{"type":["null","string"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'contacts': '{"type":"object","properties":{"id":{"type":["null","integer"]},"client_id":{"type":["null","integer"]},"title":{"type":["null","string"]},"first_name":{"type":["null","string"]},"last_name":{"type":["null","string"]},"email":{"type":["null","string"]},"phone_office":{"type":["null","string"]},"phone_mobile":{"type":["null","string"]},"fax":{"type":["null","string"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'estimate_item_categories': '{"type":"object","properties":{"id":{"type":["null","integer"]},"name":{"type":["null","string"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'estimate_line_items': '{"type":"object","properties":{"id":{"type":["null","integer"]},"estimate_id":{"type":["null","integer"]},"kind":{"type":["null","string"]},"description":{"type":["null","string"]},"quantity":{"type":["null","integer"]},"unit_price":{"type":["null","number"]},"amount":{"type":["null","number"]},"taxed":{"type":["null","boolean"]},"taxed2":{"type":["null","boolean"]}}}',
+    'estimate_messages': '{"type":"object","properties":{"id":{"type":["null","integer"]},"sent_by":{"type":["null","string"]},"sent_by_email":{"type":["null","string"]},"sent_from":{"type":["null","string"]},"sent_from_email":{"type":["null","string"]},"subject":{"type":["null","string"]},"body":{"type":["null","string"]},"send_me_a_copy":{"type":["null","boolean"]},"event_type":{"type":["null","string"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"},"estimate_id":{"type":["null","integer"]},"recipients":{"items":{"properties":{"name":{"type":["null","string"]},"email":{"type":["null","string"]}},"type":["null","object"]},"type":["null","array"]}}}',
+    'estimates': '{"type":"object","properties":{"id":{"type":["null","integer"]},"client_id":{"type":["null","integer"]},"creator_id":{"type":["null","integer"]},"client_key":{"type":["null","string"]},"number":{"type":["null","string"]},"purchase_order":{"type":["null","string"]},"amount":{"type":["null","number"]},"tax":{"type":["null","string","number"]},"tax_amount":{"type":["null","number"]},"tax2":{"type":["null","string","number"]},"tax2_amount":{"type":["null","number"]},"discount":{"type":["null","string","number"]},"discount_amount":{"type":["null","number"]},"subject":{"type":["null","string"]},"notes":{"type":["null","string"]},"currency":{"type":["null","string"]},"state":{"type":["null","string"]},"issue_date":{"type":["null","string"],"format":"date-time"},"sent_at":{"type":["null","string"],"format":"date-time"},"accepted_at":{"type":["null","string"],"format":"date-time"},"declined_at":{"type":["null","string"],"format":"date-time"},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'expense_categories': '{"type":"object","properties":{"id":{"type":["null","integer"]},"name":{"type":["null","string"]},"unit_name":{"type":["null","string"]},"unit_price":{"type":["null","number"]},"is_active":{"type":["null","boolean"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'expense_report_categories': '{"type":"object","properties":{"date":{"type":["null","string"],"format":"date-time"},"expense_category_id":{"type":["null","integer"]},"expense_category_name":{"type":["null","string"]},"total_amount":{"type":["null","number"]},"billable_amount":{"type":["null","number"]},"currency":{"type":["null","string"]}}}',
+    'expense_report_clients': '{"type":"object","properties":{"date":{"type":["null","string"],"format":"date-time"},"client_id":{"type":["null","integer"]},"client_name":{"type":["null","string"]},"total_amount":{"type":["null","number"]},"billable_amount":{"type":["null","number"]},"currency":{"type":["null","string"]}}}',
+    'expense_report_projects': '{"type":"object","properties":{"date":{"type":["null","string"],"format":"date-time"},"client_id":{"type":["null","integer"]},"client_name":{"type":["null","string"]},"project_id":{"type":["null","integer"]},"project_name":{"type":["null","string"]},"total_amount":{"type":["null","number"]},"billable_amount":{"type":["null","number"]},"currency":{"type":["null","string"]}}}',
+    'expense_report_team': '{"type":"object","properties":{"date":{"type":["null","string"],"format":"date-time"},"user_id":{"type":["null","integer"]},"user_name":{"type":["null","string"]},"is_contractor":{"type":["null","boolean"]},"total_amount":{"type":["null","number"]},"billable_amount":{"type":["null","number"]},"currency":{"type":["null","string"]}}}',
+    'expenses': '{"type":"object","properties":{"id":{"type":["null","integer"]},"client_id":{"type":["null","integer"]},"project_id":{"type":["null","integer"]},"expense_category_id":{"type":["null","integer"]},"user_id":{"type":["null","integer"]},"user_assignment_id":{"type":["null","integer"]},"receipt_url":{"type":["null","string"]},"receipt_file_name":{"type":["null","string"]},"receipt_file_size":{"type":["null","integer"]},"receipt_content_type":{"type":["null","string"]},"invoice_id":{"type":["null","integer"]},"notes":{"type":["null","string"]},"billable":{"type":["null","boolean"]},"is_closed":{"type":["null","boolean"]},"is_locked":{"type":["null","boolean"]},"is_billed":{"type":["null","boolean"]},"locked_reason":{"type":["null","string"]},"spent_date":{"type":["null","string"],"format":"date-time"},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"},"total_cost":{"type":["null","number"]},"units":{"type":["null","number"]}}}',
+    'external_reference': '{"type":"object","properties":{"id":{"type":["null","string"]},"task_id":{"type":["null","integer"]},"group_id":{"type":["null","string"]},"permalink":{"type":["null","string"]},"service":{"type":["null","string"]},"service_icon_url":{"type":["null","string"]}}}',
+    'invoice_item_categories': '{"type":"object","properties":{"id":{"type":["null","integer"]},"name":{"type":["null","string"]},"use_as_service":{"type":["null","boolean"]},"use_as_expense":{"type":["null","boolean"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'invoice_line_items': '{"type":"object","properties":{"id":{"type":["null","integer"]},"project_id":{"type":["null","integer"]},"kind":{"type":["null","string"]},"description":{"type":["null","string"]},"quantity":{"type":["null","integer"]},"unit_price":{"type":["null","number"]},"amount":{"type":["null","number"]},"taxed":{"type":["null","boolean"]},"taxed2":{"type":["null","boolean"]},"invoice_id":{"type":["null","integer"]}}}',
+    'invoice_messages': '{"type":"object","properties":{"id":{"type":["null","integer"]},"sent_by":{"type":["null","string"]},"sent_by_email":{"type":["null","string"]},"sent_from":{"type":["null","string"]},"sent_from_email":{"type":["null","string"]},"subject":{"type":["null","string"]},"body":{"type":["null","string"]},"include_link_to_client_invoice":{"type":["null","boolean"]},"attach_pdf":{"type":["null","boolean"]},"send_me_a_copy":{"type":["null","boolean"]},"thank_you":{"type":["null","boolean"]},"event_type":{"type":["null","string"]},"reminder":{"type":["null","boolean"]},"send_reminder_on":{"type":["null","string"],"format":"date-time"},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"},"invoice_id":{"type":["null","integer"]},"recipients":{"items":{"properties":{"name":{"type":["null","string"]},"email":{"type":["null","string"]}},"type":["null","object"]},"type":["null","array"]}}}',
+    'invoice_payments': '{"type":"object","properties":{"id":{"type":["null","integer"]},"amount":{"type":["null","number"]},"paid_at":{"type":["null","string"],"format":"date-time"},"paid_date":{"type":["null","string"],"format":"date-time"},"recorded_by":{"type":["null","string"]},"recorded_by_email":{"type":["null","string"]},"notes":{"type":["null","string"]},"transaction_id":{"type":["null","string"]},"payment_gateway_id":{"type":["null","integer"]},"payment_gateway_name":{"type":["null","integer"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"},"invoice_id":{"type":["null","integer"]}}}',
+    'invoices': '{"type":"object","properties":{"id":{"type":["null","integer"]},"client_id":{"type":["null","integer"]},"estimate_id":{"type":["null","integer"]},"retainer_id":{"type":["null","integer"]},"creator_id":{"type":["null","integer"]},"client_key":{"type":["null","string"]},"number":{"type":["null","string"]},"purchase_order":{"type":["null","string"]},"amount":{"type":["null","number"]},"due_amount":{"type":["null","number"]},"tax":{"type":["null","string","number"]},"tax_amount":{"type":["null","number"]},"tax2":{"type":["null","string","number"]},"tax2_amount":{"type":["null","number"]},"discount":{"type":["null","string","number"]},"discount_amount":{"type":["null","number"]},"subject":{"type":["null","string"]},"notes":{"type":["null","string"]},"currency":{"type":["null","string"]},"state":{"type":["null","string"]},"period_start":{"type":["null","string"],"format":"date-time"},"period_end":{"type":["null","string"],"format":"date-time"},"issue_date":{"type":["null","string"],"format":"date-time"},"due_date":{"type":["null","string"],"format":"date-time"},"payment_term":{"type":["null","string"]},"sent_at":{"type":["null","string"],"format":"date-time"},"paid_at":{"type":["null","string"],"format":"date-time"},"paid_date":{"type":["null","string"],"format":"date-time"},"closed_at":{"type":["null","string"],"format":"date-time"},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'project_tasks': '{"type":"object","properties":{"id":{"type":["null","integer"]},"project_id":{"type":["null","integer"]},"task_id":{"type":["null","integer"]},"is_active":{"type":["null","boolean"]},"billable":{"type":["null","boolean"]},"hourly_rate":{"type":["null","number"]},"budget":{"type":["null","number"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'project_users': '{"type":"object","properties":{"id":{"type":["null","integer"]},"project_id":{"type":["null","integer"]},"user_id":{"type":["null","integer"]},"is_active":{"type":["null","boolean"]},"is_project_manager":{"type":["null","boolean"]},"hourly_rate":{"type":["null","number"]},"budget":{"type":["null","number"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'projects': '{"type":"object","properties":{"id":{"type":["null","integer"]},"client_id":{"type":["null","integer"]},"name":{"type":["null","string"]},"code":{"type":["null","string"]},"is_active":{"type":["null","boolean"]},"is_billable":{"type":["null","boolean"]},"is_fixed_fee":{"type":["null","boolean"]},"bill_by":{"type":["null","string"]},"hourly_rate":{"type":["null","number"]},"budget":{"type":["null","number"]},"budget_by":{"type":["null","string"]},"budget_is_monthly":{"type":["null","boolean"]},"notify_when_over_budget":{"type":["null","boolean"]},"over_budget_notification_percentage":{"type":["null","integer"]},"over_budget_notification_date":{"type":["null","string"],"format":"date-time"},"show_budget_to_all":{"type":["null","boolean"]},"cost_budget":{"type":["null","number"]},"cost_budget_include_expenses":{"type":["null","boolean"]},"fee":{"type":["null","number"]},"notes":{"type":["null","string"]},"starts_on":{"type":["null","string"]},"ends_on":{"type":["null","string"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'roles': '{"type":"object","properties":{"id":{"type":["null","integer"]},"name":{"type":["null","string"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'tasks': '{"type":"object","properties":{"id":{"type":["null","integer"]},"name":{"type":["null","string"]},"billable_by_default":{"type":["null","boolean"]},"default_hourly_rate":{"type":["null","number"]},"is_default":{"type":["null","boolean"]},"is_active":{"type":["null","boolean"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'time_entries': '{"type":"object","properties":{"id":{"type":["null","integer"]},"spent_date":{"type":["null","string"],"format":"date-time"},"user_id":{"type":["null","integer"]},"user_assignment_id":{"type":["null","integer"]},"client_id":{"type":["null","integer"]},"project_id":{"type":["null","integer"]},"task_id":{"type":["null","integer"]},"task_assignment_id":{"type":["null","integer"]},"external_reference_id":{"type":["null","string"]},"invoice_id":{"type":["null","integer"]},"hours":{"type":["null","number"]},"notes":{"type":["null","string"]},"is_locked":{"type":["null","boolean"]},"locked_reason":{"type":["null","string"]},"is_closed":{"type":["null","boolean"]},"is_billed":{"type":["null","boolean"]},"timer_started_at":{"type":["null","string"],"format":"date-time"},"started_time":{"type":["null","string"],"format":"time"},"ended_time":{"type":["null","string"],"format":"time"},"is_running":{"type":["null","boolean"]},"billable":{"type":["null","boolean"]},"budgeted":{"type":["null","number"]},"billable_rate":{"type":["null","number"]},"cost_rate":{"type":["null","number"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+    'time_entry_external_reference': '{"type":"object","properties":{"time_entry_id":{"type":["null","integer"]},"external_reference_id":{"type":["null","string"]}}}',
+    'time_report_clients': '{"type":"object","properties":{"date":{"type":["null","string"],"format":"date-time"},"client_id":{"type":["null","integer"]},"client_name":{"type":["null","string"]},"total_hours":{"type":["null","number"]},"billable_hours":{"type":["null","number"]},"currency":{"type":["null","string"]},"billable_amount":{"type":["null","number"]}}}',
+    'time_report_projects': '{"type":"object","properties":{"date":{"type":["null","string"],"format":"date-time"},"client_id":{"type":["null","integer"]},"client_name":{"type":["null","string"]},"project_id":{"type":["null","integer"]},"project_name":{"type":["null","string"]},"total_hours":{"type":["null","number"]},"billable_hours":{"type":["null","number"]},"currency":{"type":["null","string"]},"billable_amount":{"type":["null","number"]}}}',
+    'time_report_tasks': '{"type":"object","properties":{"date":{"type":["null","string"],"format":"date-time"},"task_id":{"type":["null","integer"]},"task_name":{"type":["null","string"]},"total_hours":{"type":["null","number"]},"billable_hours":{"type":["null","number"]},"currency":{"type":["null","string"]},"billable_amount":{"type":["null","number"]}}}',
+    'time_report_team': '{"type":"object","properties":{"date":{"type":["null","string"],"format":"date-time"},"user_id":{"type":["null","integer"]},"user_name":{"type":["null","string"]},"is_contractor":{"type":["null","boolean"]},"total_hours":{"type":["null","number"]},"billable_hours":{"type":["null","number"]},"currency":{"type":["null","string"]},"billable_amount":{"type":["null","number"]}}}',
+    'user_project_tasks': '{"type":"object","properties":{"user_id":{"type":["null","integer"]},"project_task_id":{"type":["null","integer"]}}}',
+    'user_projects': '{"type":"object","properties":{"id":{"type":["null","integer"]},"is_active":{"type":["null","boolean"]},"is_project_manager":{"type":["null","boolean"]},"hourly_rate":{"type":["null","number"]},"budget":{"type":["null","number"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"},"project_id":{"type":["null","integer"]},"client_id":{"type":["null","integer"]},"user_id":{"type":["null","integer"]}}}',
+    'user_roles': '{"type":"object","properties":{"user_id":{"type":["null","integer"]},"role_id":{"type":["null","integer"]}}}',
+    'users': '{"type":"object","properties":{"id":{"type":["null","integer"]},"first_name":{"type":["null","string"]},"last_name":{"type":["null","string"]},"email":{"type":["null","string"]},"telephone":{"type":["null","string"]},"timezone":{"type":["null","string"]},"has_access_to_all_future_projects":{"type":["null","boolean"]},"is_contractor":{"type":["null","boolean"]},"is_admin":{"type":["null","boolean"]},"is_project_manager":{"type":["null","boolean"]},"can_see_rates":{"type":["null","boolean"]},"can_create_projects":{"type":["null","boolean"]},"can_create_invoices":{"type":["null","boolean"]},"is_active":{"type":["null","boolean"]},"weekly_capacity":{"type":["null","integer"]},"default_hourly_rate":{"type":["null","number"]},"cost_rate":{"type":["null","number"]},"avatar_url":{"type":["null","string"]},"created_at":{"type":["null","string"],"format":"date-time"},"updated_at":{"type":["null","string"],"format":"date-time"}}}',
+}
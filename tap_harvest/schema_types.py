@@ -0,0 +1,14 @@
+"""
+Types of the JSON schemas in `tap_harvest/schemas/`.
+
+Properties list their types with `null` when they are nullable, e.g.
+`["null", "string"]`. The columnar transform and the Parquet export both pick
+how to handle a column from its other types.
+"""
+
+
+def non_null(schema):
+    """The types of a JSON schema other than null."""
+    types = schema.get('type', [])
+    types = [types] if isinstance(types, str) else types
+    return [typ for typ in types if typ != 'null']
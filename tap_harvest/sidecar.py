@@ -0,0 +1,69 @@
+"""
+Files kept next to the state between runs.
+
+Each run saves its file under a new name, and the state written after it
+points to that name. A target only saves that state once it has every
+record written before it, so the next run reads the file that matches what
+the target has. If a run fails, its state still points to the file it
+started from. Once the new file is saved, the others are removed, except the
+one the run started from, as its target may never save the new state.
+
+The files start with a magic line and a line of JSON header, and are written
+to a temporary name first, so a file is either complete or missing.
+"""
+
+import contextlib
+import json
+import os
+
+import singer
+from singer import utils
+
+LOGGER = singer.get_logger()
+
+
+def new_path(directory, prefix, suffix):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, '{}{}{}'.format(
+        prefix, utils.now().strftime('%Y%m%dT%H%M%S%f'), suffix))
+
+
+@contextlib.contextmanager
+def writing(path, magic, header):
+    """A handle to write the body of `path` to, after `magic` and `header`."""
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as handle:
+        handle.write(magic)
+        handle.write(json.dumps(header).encode('utf-8') + b'\n')
+        yield handle
+    os.replace(temporary, path)
+
+
+@contextlib.contextmanager
+def reading(path, magic, kind):
+    """(header, handle to read the body from) of a file written by `writing`."""
+    with open(path, 'rb') as handle:
+        if handle.readline() != magic:
+            raise ValueError("{} is not {}".format(path, kind))
+        yield json.loads(handle.readline()), handle
+
+
+def commit(directory, prefix, suffix, previous_path, save):
+    """Saves to a new file with `save(path)`, removes the old files and returns the path."""
+    path = new_path(directory, prefix, suffix)
+    save(path)
+    remove_old(directory, prefix, suffix, [path, previous_path])
+    return path
+
+
+def remove_old(directory, prefix, suffix, keep):
+    """Removes the `prefix`...`suffix` files in `directory` that are not in `keep`."""
+    keep = {os.path.abspath(path) for path in keep if path is not None}
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(prefix) and name.endswith(suffix) \
+           and os.path.abspath(path) not in keep:
+            try:
+                os.remove(path)
+            except OSError as err:
+                LOGGER.warning("Could not remove %s: %s", path, err)
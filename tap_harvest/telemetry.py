@@ -0,0 +1,224 @@
+"""
+Run-scoped Singer metrics for tap-harvest.
+
+Counters are opened once per (metric, stream) and kept for the whole run, so
+child streams that are synced once per parent row still report a single
+series instead of one METRIC line per parent. Running totals are kept next
+to the counters so they can be reported at the end of the run.
+
+Each stream's own wall time (excluding the child streams synced inside it)
+is also split into time spent waiting on HTTP, sleeping in the rate limiter,
+sleeping in backoff, transforming records and writing them out. Whatever is
+left is reported as "other". Requests made ahead on worker threads (see
+`tap_harvest.concurrency`) count towards their stream's counters, but only
+the time the sync spends waiting on them is in its breakdown.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+import singer
+from singer import metrics
+
+LOGGER = singer.get_logger()
+
+PAGE_COUNT = 'page_count'
+HTTP_REQUEST_COUNT = 'http_request_count'
+HTTP_RESPONSE_BYTES = 'http_response_bytes'
+HTTP_RETRY_COUNT = 'http_retry_count'
+HTTP_429_COUNT = 'http_429_count'
+# requests sent a second time because the first was slower than usual, and
+# how many of those second requests answered first
+HEDGE_COUNT = 'hedged_request_count'
+HEDGE_WIN_COUNT = 'hedge_win_count'
+# failures not retried because the run's retry budget was spent
+RETRY_BUDGET_SPENT = 'retry_budget_spent_count'
+# records not written again because an identical copy was written earlier in the run
+DUPLICATE_COUNT = 'duplicate_record_count'
+# records not written because they are unchanged since an earlier run
+UNCHANGED_COUNT = 'unchanged_record_count'
+# records written with `_sdc_deleted_at` because their id is gone
+DELETED_COUNT = 'deleted_record_count'
+RATE_LIMIT_SLEEP = 'rate_limit_sleep_seconds'
+BACKOFF_SLEEP = 'backoff_sleep_seconds'
+# wall time of the stream, including the child streams synced inside it
+STREAM_DURATION = 'duration_seconds'
+# wall time of the stream, excluding the child streams synced inside it
+SELF_TIME = 'self_seconds'
+HTTP_TIME = 'http_seconds'
+TRANSFORM_TIME = 'transform_seconds'
+WRITE_TIME = 'write_seconds'
+# requests the adaptive concurrency controller allows in flight
+CONCURRENCY_WINDOW = 'concurrency_window'
+
+SYNC_TIME_METRIC = 'sync_time'
+# (phase, totals key) for the time accounting breakdown
+TIME_PHASES = [
+    ('http', HTTP_TIME),
+    ('rate_limit', RATE_LIMIT_SLEEP),
+    ('backoff', BACKOFF_SLEEP),
+    ('transform', TRANSFORM_TIME),
+    ('write', WRITE_TIME),
+]
+
+# stream -> metric -> total for the run
+TOTALS = collections.defaultdict(collections.Counter)
+# metric -> latest value, for values that are not totals
+GAUGES = {}
+
+_COUNTERS = {}
+_OPEN_COUNTERS = contextlib.ExitStack()
+_LOCK = threading.Lock()
+# per thread: `streams`, the streams currently being synced, innermost (child)
+# stream last, `child_time`, the time spent in child streams per entry of
+# `streams`, and `background`, set on worker threads
+_LOCAL = threading.local()
+
+
+def _streams():
+    if not hasattr(_LOCAL, 'streams'):
+        _LOCAL.streams = []
+        _LOCAL.child_time = []
+        _LOCAL.background = False
+    return _LOCAL.streams
+
+
+def current_stream():
+    streams = _streams()
+    return streams[-1] if streams else None
+
+
+@contextlib.contextmanager
+def stream(name):
+    """Attributes requests, sleeps, time and records inside the block to `name`."""
+    streams = _streams()
+    child_times = _LOCAL.child_time
+    streams.append(name)
+    child_times.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        streams.pop()
+        child_time = child_times.pop()
+        if child_times:
+            child_times[-1] += elapsed
+        with _LOCK:
+            TOTALS[name][STREAM_DURATION] += elapsed
+            TOTALS[name][SELF_TIME] += elapsed - child_time
+
+
+@contextlib.contextmanager
+def background(name):
+    """Like `stream`, for work on a worker thread, whose time is not in the breakdown."""
+    streams = _streams()
+    streams.append(name)
+    _LOCAL.background = True
+    try:
+        yield
+    finally:
+        streams.pop()
+        _LOCAL.background = False
+
+
+def _counter(metric, stream_name):
+    key = (metric, stream_name)
+    counter = _COUNTERS.get(key)
+    if counter is None:
+        tags = {metrics.Tag.endpoint: stream_name} if stream_name else {}
+        counter = _COUNTERS[key] = _OPEN_COUNTERS.enter_context(metrics.Counter(metric, tags))
+    return counter
+
+
+def increment(metric, amount=1, stream_name=None):
+    stream_name = stream_name or current_stream()
+    with _LOCK:
+        _counter(metric, stream_name).increment(amount)
+        TOTALS[stream_name][metric] += amount
+
+
+def add_sleep(metric, seconds):
+    """Counts a sleep, which is only charged to the stream's wall time on its sync thread."""
+    stream_name = current_stream()
+    with _LOCK:
+        _counter(metric, stream_name).increment(seconds)
+        if not _LOCAL.background:
+            TOTALS[stream_name][metric] += seconds
+
+
+def add_time(phase_key, seconds):
+    """Charges `seconds` of the current stream's wall time to `phase_key`."""
+    stream_name = current_stream()
+    if _LOCAL.background:
+        return
+    with _LOCK:
+        TOTALS[stream_name][phase_key] += seconds
+
+
+def snapshot():
+    """A copy of `TOTALS`, taken under the lock so worker threads can keep counting."""
+    with _LOCK:
+        return {stream_name: collections.Counter(values)
+                for stream_name, values in TOTALS.items()}
+
+
+def set_gauge(metric, value):
+    GAUGES[metric] = value
+
+
+@contextlib.contextmanager
+def timed(phase_key):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(phase_key, time.perf_counter() - started)
+
+
+@contextlib.contextmanager
+def http_request_timer(endpoint):
+    with metrics.http_request_timer(current_stream() or endpoint) as timer, timed(HTTP_TIME):
+        yield timer
+
+
+def time_breakdown(totals=None):
+    """stream -> phase -> seconds, with "other" for time not in any phase."""
+    totals = snapshot() if totals is None else totals
+    breakdown = {}
+    for stream_name, values in totals.items():
+        if not stream_name or SELF_TIME not in values:
+            continue
+        phases = {phase: values[key] for phase, key in TIME_PHASES}
+        phases['other'] = max(0.0, values[SELF_TIME] - sum(phases.values()))
+        phases['total'] = values[SELF_TIME]
+        breakdown[stream_name] = phases
+    return breakdown
+
+
+def report():
+    """Logs the time accounting table and emits it as `sync_time` timer metrics."""
+    breakdown = time_breakdown()
+    if not breakdown:
+        return
+
+    phases = [phase for phase, _ in TIME_PHASES] + ['other', 'total']
+    row_format = "{:<32}" + " {:>11}" * len(phases)
+    LOGGER.info("Time accounting (seconds, child streams excluded):")
+    LOGGER.info(row_format.format("stream", *phases))
+    for stream_name, values in sorted(breakdown.items(), key=lambda item: -item[1]['total']):
+        LOGGER.info(row_format.format(stream_name,
+                                      *["{:.2f}".format(values[phase]) for phase in phases]))
+        for phase in phases:
+            metrics.log(LOGGER, metrics.Point('timer', SYNC_TIME_METRIC, values[phase],
+                                              {metrics.Tag.endpoint: stream_name,
+                                               'phase': phase}))
+
+
+def flush():
+    """Emits the remaining value of every open counter."""
+    with _LOCK:
+        _OPEN_COUNTERS.close()
+        _COUNTERS.clear()
@@ -0,0 +1,104 @@
+"""
+Process pool for the transform and serialization of large pages.
+
+With `transform_workers` above 0 in the config, each page of at least
+`transform_workers_min_rows` (default 500) rows is sent to one of that many
+worker processes. The worker transforms the page's rows and serializes each
+record to its RECORD message. While the workers run, the main process
+fetches the next pages, up to one page per worker ahead. The messages come
+back in page order and are written to stdout by the main process, so
+bookmarks, child streams and state are handled as they are without the pool,
+and the output is the same.
+
+Smaller pages are transformed in the main process, so a small run never
+starts the workers. Records are always transformed in the main process in
+the Parquet export mode and for streams whose unchanged records are skipped
+(see `fingerprint_dir`), as those need the records rather than messages.
+
+Workers are started with `spawn`, as forking a process that runs request
+threads is not safe.
+"""
+
+import collections
+import concurrent.futures
+import multiprocessing
+import sys
+
+import singer
+
+DEFAULT_MIN_ROWS = 500
+
+
+class Serialized(dict):
+    """A record serialized by a worker: only its bookmark, and the RECORD message in `line`."""
+
+    __slots__ = ('line',)
+
+    def __init__(self, bookmark_property, bookmark, line):
+        super().__init__({bookmark_property: bookmark})
+        self.line = line
+
+
+class TransformPool:
+    def __init__(self, workers, min_rows=DEFAULT_MIN_ROWS):
+        self.workers = workers
+        self.min_rows = min_rows
+        # started on the first page of at least `min_rows` rows
+        self._executor = None
+
+    def _submit(self, func, page):
+        """The future of func(*page) run in a worker, or None for a small page."""
+        if len(page[0]) < self.min_rows:
+            return None
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor.submit(func, *page)
+
+    def map_pages(self, func, pages):
+        """
+        Yields (page, func(*page)) for each page of `pages`, a tuple whose
+        first item is the page's rows, in order. Up to `workers` pages are
+        taken from `pages` ahead of the one yielded.
+        """
+        in_flight = collections.deque()
+        try:
+            for page in pages:
+                in_flight.append((page, self._submit(func, page)))
+                if len(in_flight) > self.workers:
+                    yield self._result(func, *in_flight.popleft())
+            while in_flight:
+                yield self._result(func, *in_flight.popleft())
+        finally:
+            for _, future in in_flight:
+                if future is not None:
+                    future.cancel()
+
+    @staticmethod
+    def _result(func, page, future):
+        # small pages are run when their turn comes, so that an error is
+        # raised after the pages before them are written
+        return page, func(*page) if future is None else future.result()
+
+    @staticmethod
+    def write(stream_name, record, time_extracted):
+        """Writes the message of a Serialized record, or writes the record as usual."""
+        if isinstance(record, Serialized):
+            # as singer.write_message, which flushes after each message; the
+            # STATE messages written after these still flush them
+            sys.stdout.write(record.line + '\n')
+        else:
+            singer.write_record(stream_name, record, time_extracted=time_extracted)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def from_config(config):
+    workers = int(config.get('transform_workers') or 0)
+    if workers <= 0:
+        return None
+    return TransformPool(workers,
+                         int(config.get('transform_workers_min_rows') or DEFAULT_MIN_ROWS))
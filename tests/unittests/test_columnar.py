@@ -0,0 +1,125 @@
+import copy
+import tap_harvest
+from tap_harvest import columnar
+import unittest
+from unittest import mock
+from singer import Transformer
+from singer.transform import SchemaMismatch
+
+
+SCHEMA = {"type": "object", "properties": {
+    "id": {"type": ["null", "integer"]},
+    "hours": {"type": ["null", "number"]},
+    "billable": {"type": ["null", "boolean"]},
+    "notes": {"type": ["null", "string"]},
+    "spent_date": {"type": ["null", "string"], "format": "date-time"},
+    "updated_at": {"type": ["null", "string"], "format": "date-time"},
+    "tax": {"type": ["null", "string", "number"]},
+    "client_id": {"type": ["null", "integer"]},
+    "tags": {"type": ["null", "array"], "items": {"type": ["null", "string"]}},
+}}
+
+ROWS = [
+    {"id": 1, "hours": 1.5, "billable": True, "notes": "a", "spent_date": "2021-01-02",
+     "updated_at": "2021-01-02T03:04:05Z", "tax": 10, "client": {"id": 7}, "tags": ["x"]},
+    # ints in number columns and bools in integer columns are converted
+    {"id": True, "hours": 2, "billable": None, "notes": "", "spent_date": None,
+     "updated_at": "2021-01-02T03:04:05.123+01:00", "tax": "exempt", "client": None,
+     "tags": None},
+    # keys the row does not have are left out, other keys are dropped
+    {"id": "3", "client": {"id": 8}, "updated_at": None, "spent_date": "20210102",
+     "extra": 1},
+]
+
+
+def row_path(rows, schema, map_handler=None, object_to_id=None):
+    with Transformer() as transformer:
+        return list(tap_harvest.transform_rows(copy.deepcopy(rows), schema, transformer,
+                                               map_handler=map_handler,
+                                               object_to_id=object_to_id))
+
+
+def columnar_path(rows, schema, map_handler=None, object_to_id=None):
+    with Transformer() as transformer:
+        return columnar.ColumnarTransform(schema, transformer).transform(
+            copy.deepcopy(rows), map_handler, object_to_id)
+
+
+class TestColumnarTransform(unittest.TestCase):
+
+    def assertSameRecords(self, expected, actual):
+        self.assertEqual([item for _, item in expected], [item for _, item in actual])
+        self.assertEqual([list(item) for _, item in expected],
+                         [list(item) for _, item in actual])
+
+    def test_records_match_the_row_path(self):
+        """
+            Verify that records are the ones transform_rows yields, with their keys in the
+            same order
+        """
+        object_to_id = ["client"]
+        self.assertSameRecords(row_path(ROWS, SCHEMA, object_to_id=object_to_id),
+                               columnar_path(ROWS, SCHEMA, object_to_id=object_to_id))
+
+    def test_map_handler_is_applied(self):
+        """
+            Verify that expenses are mapped before they are transformed
+        """
+        schema = tap_harvest.load_schema("expenses")
+        rows = [{"id": 1, "receipt": None, "updated_at": "2021-01-02T03:04:05Z",
+                 "created_at": None, "spent_date": "2021-01-02", "total_cost": 3},
+                {"id": 2, "receipt": {"url": "u", "file_name": "f", "file_size": 9,
+                                      "content_type": "image/png"},
+                 "updated_at": "2021-01-02T03:04:05Z", "created_at": "2021-01-01T00:00:00Z",
+                 "spent_date": "2021-01-02", "total_cost": 3.5}]
+        object_to_id = []
+        expected = row_path(rows, schema, tap_harvest.map_expense, object_to_id)
+        actual = columnar_path(rows, schema, tap_harvest.map_expense, object_to_id)
+
+        self.assertSameRecords(expected, actual)
+        self.assertEqual(actual[1][1]["receipt_file_size"], 9)
+        self.assertEqual(actual[1][0]["receipt_url"], "u")
+
+    def test_values_that_do_not_fit_raise(self):
+        """
+            Verify that a value the schema does not allow raises as it does on the row path
+        """
+        rows = [{"id": "x", "spent_date": None, "updated_at": None}]
+        with self.assertRaises(SchemaMismatch):
+            row_path(rows, SCHEMA)
+        with self.assertRaises(SchemaMismatch):
+            columnar_path(rows, SCHEMA)
+
+
+class TestColumnarSync(unittest.TestCase):
+
+    def setUp(self):
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.STATE.clear()
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+
+    def tearDown(self):
+        tap_harvest.CONFIG.pop("columnar_transform", None)
+
+    def sync(self, columnar_transform):
+        tap_harvest.CONFIG["columnar_transform"] = columnar_transform
+        tap_harvest.EMITTED_IDS.clear()
+        rows = [{"id": 1, "receipt": None, "updated_at": "2021-01-02T03:04:05Z",
+                 "created_at": None, "spent_date": "2021-01-02", "total_cost": 3,
+                 "client": {"id": 5}, "project": None, "expense_category": None,
+                 "user": None, "user_assignment": None, "invoice": None}]
+        with mock.patch("singer.write_record") as mocked_record, \
+             mock.patch("singer.write_schema"), mock.patch("singer.write_state"), \
+             mock.patch("tap_harvest.request",
+                        return_value={"expenses": rows, "next_page": None}):
+            tap_harvest.sync_expenses()
+        return [call[0][1] for call in mocked_record.call_args_list]
+
+    def test_records_are_written_the_same(self):
+        """
+            Verify that with columnar_transform set, expenses are written as they are without it
+        """
+        records = self.sync("true")
+        self.assertEqual(records[0]["client_id"], 5)
+        self.assertEqual(records, self.sync(""))
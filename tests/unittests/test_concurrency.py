@@ -0,0 +1,186 @@
+import threading
+import tap_harvest
+from tap_harvest import concurrency, telemetry
+import unittest
+from unittest import mock
+
+
+INVOICE = {"id": 1, "period_start": None, "period_end": None, "issue_date": None,
+           "due_date": None, "sent_at": None, "paid_at": None, "paid_date": None,
+           "closed_at": None, "created_at": None, "updated_at": "2021-01-01T00:00:00Z",
+           "client": None, "estimate": None, "retainer": None, "creator": None,
+           "line_items": [{"id": 10, "project": None}]}
+MESSAGE = {"id": 100, "send_reminder_on": None, "created_at": None, "updated_at": "2021-01-01T00:00:00Z"}
+
+
+def get_response(url, params=None):
+    if url.endswith("invoices"):
+        return {"invoices": [dict(INVOICE)], "next_page": None}
+    if url.endswith("messages"):
+        return {"invoice_messages": [dict(MESSAGE)], "next_page": None}
+    return {"invoice_payments": [], "next_page": None}
+
+
+class TestAIMDController(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = concurrency.AIMDController(max_window=4)
+
+    def tearDown(self):
+        telemetry.GAUGES.clear()
+
+    def test_window_grows_additively(self):
+        """
+            Verify that the window grows by one for each window's worth of healthy responses,
+            up to the maximum
+        """
+        self.controller.on_response(0, 0.1, 200)
+        self.assertEqual(self.controller.window, 2)
+        self.controller.on_response(0, 0.1, 200)
+        self.controller.on_response(0, 0.1, 200)
+        self.assertAlmostEqual(self.controller.window, 2.9, places=1)
+
+        for _ in range(20):
+            self.controller.on_response(0, 0.1, 200)
+        self.assertEqual(self.controller.window, 4)
+        self.assertEqual(telemetry.GAUGES[telemetry.CONCURRENCY_WINDOW], 4)
+
+    def test_window_is_cut_once_per_round(self):
+        """
+            Verify that a 429, 5xx or timeout halves the window, but responses to requests
+            sent before the cut do not cut it again
+        """
+        self.controller.window = 4
+        self.controller.on_response(1, 0.1, 429)
+        self.assertEqual(self.controller.window, 2)
+
+        self.controller.on_response(1, 0.1, 503)
+        self.assertEqual(self.controller.window, 2)
+
+        self.controller.on_response(float("inf"), 0.1)
+        self.assertEqual(self.controller.window, 1)
+
+    def test_latency_spike_holds_window(self):
+        """
+            Verify that a response much slower than the smoothed latency does not grow the window
+        """
+        self.controller.on_response(0, 0.1, 200)
+        self.controller.on_response(0, 1.0, 200)
+
+        self.assertEqual(self.controller.window, 2)
+
+    def test_throttle_caps_window_at_in_flight(self):
+        """
+            Verify that when the rate limiter makes requests wait, the window is not kept
+            above the requests in flight
+        """
+        self.controller.window = 4
+        self.controller.acquire()
+        self.controller.acquire()
+        self.controller.on_throttle()
+
+        self.assertEqual(self.controller.window, 2)
+
+    def test_acquire_waits_for_room(self):
+        """
+            Verify that no more requests than the window are in flight
+        """
+        self.controller.acquire()
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (self.controller.acquire(), acquired.set()))
+        waiter.start()
+
+        self.assertFalse(acquired.wait(0.05))
+        self.controller.release()
+        self.assertTrue(acquired.wait(1))
+        waiter.join()
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.fetch = mock.Mock(side_effect=lambda url, params: url)
+        self.prefetcher = concurrency.Prefetcher(concurrency.AIMDController(max_window=2),
+                                                 self.fetch)
+
+    def tearDown(self):
+        self.prefetcher.close()
+        telemetry.GAUGES.clear()
+
+    def test_take_skips_requests_the_sync_did_not_ask_for(self):
+        """
+            Verify that taking a request drops the ones scheduled before it, and that
+            requests that were not scheduled are not taken
+        """
+        self.prefetcher.schedule([("a", "url/1", {"page": 1}), ("a", "url/2", {"page": 1}),
+                                  ("a", "url/3", {"page": 1})])
+
+        self.assertEqual(self.prefetcher.take("url/2", {"page": 1}).result(), "url/2")
+        self.assertIsNone(self.prefetcher.take("url/1", {"page": 1}))
+        self.assertIsNone(self.prefetcher.take("url/3", {"page": 2}))
+        self.assertEqual(self.prefetcher.take("url/3", {"page": 1}).result(), "url/3")
+
+    def test_miss_drops_requests_with_old_params(self):
+        """
+            Verify that a request scheduled for the page taken, but with params the sync no
+            longer sends, is dropped on a miss so later requests get its place in the window
+        """
+        since = {"page": 1, "updated_since": "2020-01-01T00:00:00Z"}
+        self.prefetcher.schedule([("a", "url/1", since), ("a", "url/2", since),
+                                  ("a", "url/3", since)])
+
+        self.assertIsNone(self.prefetcher.take("url/1", {"page": 1}))
+        self.assertEqual([entry[1] for entry in self.prefetcher._entries], ["url/2", "url/3"])
+        self.assertTrue(all(entry[3] is not None for entry in self.prefetcher._entries))
+
+    def test_discard(self):
+        """
+            Verify that a stream's scheduled requests are dropped and the others are kept
+        """
+        self.prefetcher.schedule([("a", "url/1", {"page": 1}), ("b", "url/2", {"page": 1}),
+                                  ("a", "url/3", {"page": 1}), ("b", "url/4", {"page": 1})])
+
+        self.prefetcher.discard("a")
+        self.assertEqual([entry[1] for entry in self.prefetcher._entries], ["url/2", "url/4"])
+        self.assertEqual(self.prefetcher.take("url/4", {"page": 1}).result(), "url/4")
+
+
+class TestChildPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.STATE.clear()
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+
+    def tearDown(self):
+        tap_harvest.PREFETCHER.close()
+        tap_harvest.PREFETCHER = None
+        telemetry.GAUGES.clear()
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request", side_effect=get_response)
+    def test_child_pages_are_requested_ahead(self, mocked_request, mocked_state,
+                                             mocked_schema, mocked_record):
+        """
+            Verify that the first pages of child streams are requested on the prefetch
+            threads and that the same records are written
+        """
+        threads = []
+        tap_harvest.PREFETCHER = concurrency.from_config(
+            {"max_concurrency": 2},
+            lambda url, params: (threads.append(threading.current_thread()),
+                                 tap_harvest.request(url, params))[1])
+        tap_harvest.sync_invoices()
+
+        urls = sorted(call[0][0] for call in mocked_request.call_args_list)
+        self.assertEqual(urls, ["https://api.harvestapp.com/v2/invoices",
+                                "https://api.harvestapp.com/v2/invoices/1/messages",
+                                "https://api.harvestapp.com/v2/invoices/1/payments"])
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertEqual([call[0][0] for call in mocked_record.call_args_list],
+                         ["invoices", "invoice_messages", "invoice_line_items"])
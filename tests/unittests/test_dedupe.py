@@ -0,0 +1,74 @@
+import tap_harvest
+from tap_harvest import dedupe, telemetry
+import unittest
+from unittest import mock
+
+
+def get_time_entry(time_entry_id, external_reference):
+    schema = tap_harvest.load_schema("time_entries")
+    time_entry = {key: None for key, subschema in schema["properties"].items()
+                  if subschema.get("format") == "date-time"}
+    time_entry.update({key: None for key in ["user", "user_assignment", "client", "project",
+                                             "task", "task_assignment", "invoice"]})
+    time_entry.update({"id": time_entry_id, "updated_at": "2021-01-01T00:00:00Z",
+                       "external_reference": external_reference})
+    return time_entry
+
+
+class TestSeenIndex(unittest.TestCase):
+
+    def test_seen(self):
+        """
+            Verify that a record is reported as seen only when the same content was recorded
+        """
+        index = dedupe.SeenIndex()
+
+        self.assertFalse(index.seen("1", {"id": "1", "permalink": "a"}))
+        self.assertTrue(index.seen("1", {"id": "1", "permalink": "a"}))
+        self.assertFalse(index.seen("1", {"id": "1", "permalink": "b"}))
+
+    def test_bounded(self):
+        """
+            Verify that the least recently seen records are evicted beyond `max_size`
+        """
+        index = dedupe.SeenIndex(max_size=2)
+        for key in ["1", "2", "1", "3"]:
+            index.seen(key, {"id": key})
+
+        self.assertEqual(len(index), 2)
+        self.assertTrue(index.seen("1", {"id": "1"}))
+        self.assertFalse(index.seen("2", {"id": "2"}))
+
+
+class TestExternalReferenceDedupe(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.STATE.clear()
+        tap_harvest.EMITTED_IDS.clear()
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request")
+    def test_external_reference_written_once(self, mocked_request, mocked_state,
+                                             mocked_schema, mocked_record):
+        """
+            Verify that a shared external reference is written once per run
+            while every time entry still gets its pivot row
+        """
+        external_reference = {"id": "PROJ-1", "group_id": "1", "permalink": "https://example.com"}
+        mocked_request.return_value = {
+            "time_entries": [get_time_entry(1, dict(external_reference)),
+                             get_time_entry(2, dict(external_reference))],
+            "next_page": None}
+
+        tap_harvest.sync_time_entries()
+
+        streams = [call[0][0] for call in mocked_record.call_args_list]
+        self.assertEqual(streams.count("external_reference"), 1)
+        self.assertEqual(streams.count("time_entry_external_reference"), 2)
+        self.assertEqual(
+            telemetry.TOTALS["external_reference"][telemetry.DUPLICATE_COUNT], 1)
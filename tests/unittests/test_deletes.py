@@ -0,0 +1,150 @@
+import os
+import requests
+import tempfile
+import tap_harvest
+from tap_harvest import deletes, idset, telemetry
+import unittest
+from unittest import mock
+
+
+COMPANY = {"expense_feature": False, "invoice_feature": False, "estimate_feature": False}
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_first_run_only_takes_snapshots(self):
+        """
+            Verify that nothing is deleted without a previous snapshot
+        """
+        store = deletes.SnapshotStore(self.directory.name)
+        confirm = mock.Mock()
+
+        self.assertEqual(len(store.deleted("clients", idset.IdSet([1, 2]), confirm)), 0)
+        confirm.assert_not_called()
+
+    def test_missing_ids_are_confirmed(self):
+        """
+            Verify that an id is only deleted when the second sweep misses it too, and that
+            the snapshot keeps the ids of both sweeps
+        """
+        store = deletes.SnapshotStore(self.directory.name)
+        store.deleted("clients", idset.IdSet([1, 2, 3]), mock.Mock())
+
+        missing = store.deleted("clients", idset.IdSet([1]), lambda missing: idset.IdSet([3]))
+        self.assertEqual(list(missing), [2])
+        self.assertEqual(list(store.snapshots["clients"]), [1, 3])
+
+    def test_snapshots_are_saved_and_read_back(self):
+        """
+            Verify that committed snapshots are read back by the next run from the path in
+            the state
+        """
+        state = {}
+        store = deletes.SnapshotStore(self.directory.name)
+        store.deleted("clients", idset.IdSet([1, 2]), mock.Mock())
+        store.deleted("time_entries", idset.IdSet(range(100000)), mock.Mock())
+        path = store.commit(state)
+
+        self.assertEqual(state, {deletes.STATE_KEY: path})
+        snapshots = deletes.from_config({"snapshot_dir": self.directory.name}, state,
+                                        enabled=True).snapshots
+        self.assertEqual(list(snapshots["clients"]), [1, 2])
+        self.assertEqual(len(snapshots["time_entries"]), 100000)
+
+    def test_needs_snapshot_dir(self):
+        """
+            Verify that delete detection is off by default and needs a snapshot directory
+        """
+        self.assertIsNone(deletes.from_config({}, {}))
+        with self.assertRaises(Exception):
+            deletes.from_config({"detect_deletes": "true"}, {})
+
+
+class TestDetectDeletes(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        tap_harvest.SELECTED_STREAMS = {"clients"}
+        tap_harvest.TAP_STATE.clear()
+
+    def tearDown(self):
+        tap_harvest.SNAPSHOTS = None
+        tap_harvest.SELECTED_STREAMS = None
+        tap_harvest.TAP_STATE.clear()
+        self.directory.cleanup()
+
+    def detect(self, *sweeps, existing=()):
+        responses = iter(sweeps)
+        self.urls = []
+
+        def get_response(url, params=None):
+            self.urls.append(url.replace(tap_harvest.BASE_API_URL, ""))
+            if url.endswith("company"):
+                return COMPANY
+            record_id = url.rsplit("/", 1)[1]
+            if record_id.isdigit():
+                if int(record_id) in existing:
+                    return {"id": int(record_id)}
+                response = requests.Response()
+                response.status_code = 404
+                raise requests.exceptions.HTTPError(response=response)
+            return {"clients": [{"id": value} for value in next(responses)], "next_page": None}
+
+        tap_harvest.SNAPSHOTS = deletes.from_config({"snapshot_dir": self.directory.name},
+                                                    dict(tap_harvest.TAP_STATE), enabled=True)
+        with mock.patch("singer.write_record") as mocked_record, \
+             mock.patch("singer.write_schema") as mocked_schema, \
+             mock.patch("singer.write_state"), \
+             mock.patch("tap_harvest.request", side_effect=get_response):
+            tap_harvest.do_detect_deletes()
+        return mocked_record.call_args_list, mocked_schema.call_args_list
+
+    def test_deleted_records_are_written(self):
+        """
+            Verify that a record with _sdc_deleted_at is written for each id missing from both
+            sweeps, under a schema that has _sdc_deleted_at
+        """
+        records, _ = self.detect([1, 2, 3, 4])
+        self.assertEqual(records, [])
+
+        records, schemas = self.detect([1, 2], [1, 3])
+        self.assertEqual([call[0][1]["id"] for call in records], [4])
+        self.assertIn(deletes.DELETED_AT, records[0][0][1])
+        self.assertIn(deletes.DELETED_AT, schemas[0][0][1]["properties"])
+        self.assertEqual(telemetry.TOTALS["clients"][telemetry.DELETED_COUNT], 1)
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+        # 2 was gone by the second sweep, so it is found by the next run
+        records, _ = self.detect([1, 3])
+        self.assertEqual([call[0][1]["id"] for call in records], [2])
+
+    @mock.patch("tap_harvest.memory.DEFAULT_PER_PAGE", 1)
+    def test_few_missing_ids_are_requested_by_id(self):
+        """
+            Verify that ids missing from the sweep are confirmed one by one, without reading
+            the stream again, when that takes fewer requests
+        """
+        self.detect([1, 2, 3])
+
+        records, _ = self.detect([1], existing=[3])
+        self.assertEqual([call[0][1]["id"] for call in records], [2])
+        self.assertEqual(self.urls, ["company", "clients", "clients/2", "clients/3"])
+
+    def test_many_missing_ids_are_read_again(self):
+        """
+            Verify that the stream is read a second time when that takes fewer requests than
+            confirming each missing id
+        """
+        self.detect([1, 2, 3, 4])
+
+        records, _ = self.detect([1, 2], [1, 2, 3])
+        self.assertEqual([call[0][1]["id"] for call in records], [4])
+        self.assertEqual(self.urls, ["company", "clients", "clients"])
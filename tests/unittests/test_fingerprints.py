@@ -0,0 +1,126 @@
+import os
+import tempfile
+import tap_harvest
+from tap_harvest import fingerprints, telemetry
+import unittest
+from unittest import mock
+
+
+INVOICE = {"id": 1, "period_start": None, "period_end": None, "issue_date": None,
+           "due_date": None, "sent_at": None, "paid_at": None, "paid_date": None,
+           "closed_at": None, "created_at": None, "updated_at": "2021-01-01T00:00:00Z",
+           "client": None, "estimate": None, "retainer": None, "creator": None,
+           "line_items": []}
+MESSAGE = {"id": 100, "subject": "Invoice", "send_reminder_on": None, "created_at": None,
+           "updated_at": "2021-01-01T00:00:00Z"}
+
+
+class TestFingerprintIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "index.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_unchanged_records(self):
+        """
+            Verify that a record is unchanged only when it was recorded under its id with
+            the same content, and that records without an integer id are never unchanged
+        """
+        index = fingerprints.FingerprintIndex()
+
+        self.assertFalse(index.unchanged("invoice_messages", 1, {"id": 1, "subject": "a"}))
+        self.assertTrue(index.unchanged("invoice_messages", 1, {"id": 1, "subject": "a"}))
+        self.assertFalse(index.unchanged("invoice_messages", 1, {"id": 1, "subject": "b"}))
+        self.assertFalse(index.unchanged("invoice_payments", 1, {"id": 1, "subject": "b"}))
+        self.assertFalse(index.unchanged("invoice_messages", "x", {"id": "x"}))
+        self.assertFalse(index.unchanged("invoice_messages", "x", {"id": "x"}))
+
+    def test_save_and_load(self):
+        """
+            Verify that a saved index is read back with the changes of the run merged in
+        """
+        index = fingerprints.FingerprintIndex()
+        for key in (30, 10, 20):
+            index.unchanged("invoice_messages", key, {"id": key})
+        index.save(self.path)
+
+        loaded = fingerprints.FingerprintIndex.load(self.path)
+        self.assertEqual(list(loaded.merged("invoice_messages")[0]), [10, 20, 30])
+        self.assertTrue(loaded.unchanged("invoice_messages", 20, {"id": 20}))
+        self.assertFalse(loaded.unchanged("invoice_messages", 15, {"id": 15}))
+        self.assertFalse(loaded.unchanged("invoice_messages", 30, {"id": 30, "subject": "new"}))
+        self.assertEqual(list(loaded.merged("invoice_messages")[0]), [10, 15, 20, 30])
+
+    def test_unreadable_index_writes_every_record(self):
+        """
+            Verify that an index that cannot be read is replaced by an empty one
+        """
+        with open(self.path, "wb") as handle:
+            handle.write(b"not an index")
+
+        store = fingerprints.FingerprintStore(self.directory.name, self.path)
+        self.assertFalse(store.index.unchanged("invoice_messages", 1, {"id": 1}))
+
+    def test_commit_keeps_the_index_the_state_points_to(self):
+        """
+            Verify that the index is saved to a new file that the state points to, and that
+            only that file and the one the run started from are kept
+        """
+        state = {}
+        first = fingerprints.FingerprintStore(self.directory.name).commit(state)
+        second = fingerprints.FingerprintStore(self.directory.name, first).commit(state)
+        third = fingerprints.FingerprintStore(self.directory.name, second).commit(state)
+
+        self.assertEqual(state, {fingerprints.STATE_KEY: third})
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         sorted([os.path.basename(second), os.path.basename(third)]))
+
+
+class TestUnchangedChildRecords(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.SELECTED_STREAMS = {"invoices", "invoice_messages"}
+        self.state = {}
+
+    def tearDown(self):
+        tap_harvest.FINGERPRINTS = None
+        tap_harvest.SELECTED_STREAMS = None
+        self.directory.cleanup()
+
+    def sync(self, message):
+        def get_response(url, params=None):
+            if url.endswith("invoices"):
+                return {"invoices": [dict(INVOICE)], "next_page": None}
+            if url.endswith("messages"):
+                return {"invoice_messages": [dict(message)], "next_page": None}
+            return {"invoice_payments": [], "next_page": None}
+
+        tap_harvest.STATE.clear()
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+        tap_harvest.FINGERPRINTS = fingerprints.from_config(
+            {"fingerprint_dir": self.directory.name}, self.state)
+        with mock.patch("singer.write_record") as mocked_record, \
+             mock.patch("singer.write_schema"), mock.patch("singer.write_state"), \
+             mock.patch("tap_harvest.request", side_effect=get_response):
+            tap_harvest.sync_invoices()
+        tap_harvest.FINGERPRINTS.commit(self.state)
+        return [call[0][0] for call in mocked_record.call_args_list]
+
+    def test_unchanged_messages_are_not_written_again(self):
+        """
+            Verify that an invoice message written in an earlier run is only written again
+            once its content changes
+        """
+        self.assertEqual(self.sync(MESSAGE), ["invoices", "invoice_messages"])
+        self.assertEqual(self.sync(MESSAGE), ["invoices"])
+        self.assertEqual(telemetry.TOTALS["invoice_messages"][telemetry.UNCHANGED_COUNT], 1)
+        self.assertEqual(self.sync(dict(MESSAGE, subject="Reminder")),
+                         ["invoices", "invoice_messages"])
@@ -0,0 +1,103 @@
+import threading
+import tap_harvest
+from tap_harvest import hedging, telemetry
+import unittest
+from unittest import mock
+
+
+def learn(hedger, endpoint, seconds=0.01, count=hedging.MIN_SAMPLES):
+    for _ in range(count):
+        hedger.latencies.record(endpoint, seconds)
+
+
+class TestHedging(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+        self.hedger = hedging.Hedger(factor=2, max_workers=4)
+
+    def tearDown(self):
+        self.hedger.close()
+
+    def test_endpoint_key(self):
+        """
+            Verify that ids are left out of endpoint keys
+        """
+        self.assertEqual(hedging.endpoint_key("invoices/12/messages"), "invoices/{id}/messages")
+        self.assertEqual(hedging.endpoint_key("users/3"), "users/{id}")
+        self.assertEqual(hedging.endpoint_key("time_entries"), "time_entries")
+
+    def test_p99_needs_enough_samples(self):
+        """
+            Verify that there is no deadline until the endpoint has enough samples, and then
+            the deadline is the factor times the 99th percentile, but not below the minimum
+        """
+        learn(self.hedger, "clients", count=hedging.MIN_SAMPLES - 1)
+        self.assertIsNone(self.hedger.deadline("clients"))
+
+        self.hedger.latencies.record("clients", 5.0)
+        self.assertEqual(self.hedger.latencies.p99("clients"), 5.0)
+        self.assertEqual(self.hedger.deadline("clients"), 10.0)
+        learn(self.hedger, "tasks")
+        self.assertEqual(self.hedger.deadline("tasks"), hedging.MIN_DEADLINE)
+
+    @mock.patch("tap_harvest.hedging.MIN_DEADLINE", 0.01)
+    def test_slow_request_is_hedged(self):
+        """
+            Verify that a request still waiting at its deadline is sent again and that the
+            first response is used
+        """
+        learn(self.hedger, "clients")
+        release = threading.Event()
+        calls = []
+
+        def send(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                release.wait(5)
+                return "slow"
+            return "hedge"
+
+        self.assertEqual(self.hedger.send("clients", send, lambda: True, 300), "hedge")
+        release.set()
+        self.assertEqual(telemetry.TOTALS[None][telemetry.HEDGE_COUNT], 1)
+        self.assertEqual(telemetry.TOTALS[None][telemetry.HEDGE_WIN_COUNT], 1)
+
+        # both were sent with a timeout of TIMEOUT_FACTOR deadlines, and the
+        # latency of the one that lost is kept too
+        self.assertEqual(calls, [0.02 * hedging.TIMEOUT_FACTOR] * 2)
+        self.hedger._executor.shutdown(wait=True)
+        self.assertEqual(len(self.hedger.latencies._samples["clients"]),
+                         hedging.MIN_SAMPLES + 2)
+
+    def test_timeout_is_kept_without_hedging(self):
+        """
+            Verify that requests that cannot be hedged are sent with the request timeout
+        """
+        send = mock.Mock(return_value="response")
+
+        self.assertEqual(self.hedger.send("clients", send, lambda: True, 300), "response")
+        send.assert_called_once_with(300)
+
+    @mock.patch("tap_harvest.hedging.MIN_DEADLINE", 0.01)
+    def test_no_hedge_without_rate_budget(self):
+        """
+            Verify that no hedge is sent when the rate limiter has no room for it
+        """
+        learn(self.hedger, "clients")
+        send = mock.Mock(side_effect=lambda timeout: threading.Event().wait(0.05) or "slow")
+
+        self.assertEqual(self.hedger.send("clients", send, lambda: False), "slow")
+        self.assertEqual(send.call_count, 1)
+        self.assertNotIn(telemetry.HEDGE_COUNT, telemetry.TOTALS[None])
+
+    def test_rate_limiter_try_take(self):
+        """
+            Verify that try_take only takes a request out of the limit when it needs no wait
+        """
+        limiter = tap_harvest.RateLimiter(2, 60)
+
+        self.assertTrue(limiter.try_take())
+        self.assertTrue(limiter.try_take())
+        self.assertFalse(limiter.try_take())
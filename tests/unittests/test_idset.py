@@ -0,0 +1,104 @@
+import random
+import unittest
+from tap_harvest import idset
+
+
+class TestIdSet(unittest.TestCase):
+
+    def test_add_and_contains(self):
+        """
+            Verify that ids are added once and found afterwards
+        """
+        ids = idset.IdSet()
+
+        self.assertTrue(ids.add(2500000000))
+        self.assertFalse(ids.add(2500000000))
+        self.assertTrue(ids.add(0))
+        self.assertIn(2500000000, ids)
+        self.assertNotIn(2500000001, ids)
+        self.assertEqual(len(ids), 2)
+
+    def test_other_ids(self):
+        """
+            Verify that ids that are not positive integers are kept as well
+        """
+        ids = idset.IdSet(["PROJ-1", -1])
+
+        self.assertIn("PROJ-1", ids)
+        self.assertIn(-1, ids)
+        self.assertFalse(ids.add("PROJ-1"))
+        self.assertEqual(len(ids), 2)
+
+    def test_compact(self):
+        """
+            Verify that a million dense ids take about a bit each
+        """
+        ids = idset.IdSet(range(1000000, 2000000))
+
+        self.assertEqual(len(ids), 1000000)
+        self.assertLess(ids.nbytes(), 200 * 1024)
+
+    def test_compact_sparse_ids(self):
+        """
+            Verify that ids spread over billions, as Harvest's are, take a few bytes each,
+            and that they are read back from their bytes
+        """
+        generator = random.Random(0)
+        values = [generator.randrange(1000000000, 2500000000) for _ in range(200000)]
+        ids = idset.IdSet(values)
+
+        self.assertEqual(len(ids), len(set(values)))
+        self.assertLess(ids.nbytes(), 20 * len(ids))
+        self.assertEqual(list(ids), sorted(set(values)))
+        loaded = idset.IdSet.from_bytes(ids.to_bytes())
+        self.assertEqual(list(loaded), list(ids))
+        self.assertEqual(len(ids.difference(idset.IdSet(values[:100000]))),
+                         len(set(values) - set(values[:100000])))
+
+    def test_chunks_become_bitmaps(self):
+        """
+            Verify that a chunk becomes a bitmap past ARRAY_MAX ids, and that sets mixing
+            both kinds of chunk are merged and compared
+        """
+        dense = idset.IdSet(range(0, 2 * idset.ARRAY_MAX + 2, 2))
+        sparse = idset.IdSet(range(1, 2 * idset.ARRAY_MAX, 1000))
+        self.assertIsInstance(dense._chunks[0], bytearray)
+        self.assertNotIsInstance(sparse._chunks[0], bytearray)
+
+        self.assertEqual(list(sparse.difference(dense)), list(sparse))
+        self.assertEqual(len(dense.difference(sparse)), len(dense))
+        sparse.update(dense)
+        self.assertEqual(len(sparse), idset.ARRAY_MAX + 10)
+        self.assertEqual(len(sparse.difference(dense)), 9)
+        self.assertEqual(list(idset.IdSet.from_bytes(sparse.to_bytes())), list(sparse))
+
+    def test_difference_and_update(self):
+        """
+            Verify that a difference holds the ids missing from the other set, in order, and
+            that an update adds the other set's ids
+        """
+        ids = idset.IdSet([5, 70000, 3, "PROJ-1", 200000])
+        other = idset.IdSet([5, 200000, "PROJ-2"])
+
+        self.assertEqual(list(ids.difference(other)), [3, 70000, "PROJ-1"])
+        self.assertEqual(len(ids.difference(other)), 3)
+        self.assertEqual(len(ids.difference(ids)), 0)
+
+        other.update(ids)
+        self.assertEqual(len(other), 6)
+        self.assertEqual(list(other)[:4], [3, 5, 70000, 200000])
+
+    def test_bytes_round_trip(self):
+        """
+            Verify that a set is read back from its bytes, and that dense ids compress well
+        """
+        ids = idset.IdSet(range(1000000, 2000000))
+        ids.add("PROJ-1")
+        data = ids.to_bytes()
+
+        self.assertLess(len(data), 10 * 1024)
+        loaded = idset.IdSet.from_bytes(data)
+        self.assertEqual(len(loaded), len(ids))
+        self.assertIn(1500000, loaded)
+        self.assertIn("PROJ-1", loaded)
+        self.assertEqual(len(loaded.difference(ids)), 0)
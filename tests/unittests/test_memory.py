@@ -0,0 +1,67 @@
+import tap_harvest
+from tap_harvest import memory, telemetry
+import unittest
+from unittest import mock
+
+
+class TestMemoryCeiling(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+
+    def tearDown(self):
+        tap_harvest.MEMORY_CEILING = None
+
+    def test_next_page_keeps_the_offset(self):
+        """
+            Verify that the page number is recomputed from the offset when the page size changes
+        """
+        self.assertEqual(memory.next_page(2, 2000, 1000), 3)
+        self.assertEqual(memory.next_page(5, 250, 125), 9)
+        self.assertEqual(memory.next_page(1, 2000, 125), 1)
+
+    @mock.patch("tap_harvest.memory.current_rss_bytes", return_value=950 * 1024 * 1024)
+    def test_page_size_is_halved_under_pressure(self, mocked_rss):
+        """
+            Verify that the page size is halved while RSS is near the ceiling, down to the minimum
+        """
+        ceiling = memory.MemoryCeiling(1000)
+
+        self.assertEqual([ceiling.per_page() for _ in range(6)], [1000, 500, 250, 125, 125, 125])
+
+    @mock.patch("tap_harvest.memory.current_rss_bytes", return_value=100 * 1024 * 1024)
+    def test_page_size_is_kept_below_the_ceiling(self, mocked_rss):
+        """
+            Verify that the page size is not changed while RSS is well below the ceiling
+        """
+        self.assertEqual(memory.MemoryCeiling(1000).per_page(), 2000)
+
+    @mock.patch("sys.platform", "linux")
+    @mock.patch("resource.getrusage")
+    def test_peak_rss_is_in_bytes(self, mocked_getrusage):
+        """
+            Verify that the peak RSS is converted from the kilobytes Linux reports
+        """
+        mocked_getrusage.return_value.ru_maxrss = 2048
+        self.assertEqual(memory.peak_rss_bytes(), 2048 * 1024)
+
+        with mock.patch("sys.platform", "darwin"):
+            self.assertEqual(memory.peak_rss_bytes(), 2048)
+
+    @mock.patch("tap_harvest.request")
+    def test_get_pages_continues_from_the_offset(self, mocked_request):
+        """
+            Verify that after the page size is halved the next request starts at the next row
+        """
+        tap_harvest.MEMORY_CEILING = mock.Mock()
+        tap_harvest.MEMORY_CEILING.per_page.side_effect = [2000, 1000]
+        mocked_request.side_effect = [
+            {"clients": [{"id": 1}], "next_page": 2},
+            {"clients": [{"id": 2}], "next_page": None},
+        ]
+
+        pages = [list(rows) for rows, _ in
+                 tap_harvest.get_pages("https://api.harvestapp.com/v2/clients", "clients", {})]
+
+        self.assertEqual(pages, [[{"id": 1}], [{"id": 2}]])
+        self.assertEqual(mocked_request.call_args_list[1][0][1], {"page": 3, "per_page": 1000})
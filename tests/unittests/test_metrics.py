@@ -0,0 +1,220 @@
+import tap_harvest
+from tap_harvest import telemetry
+import unittest
+import requests
+from unittest import mock
+from singer import metrics
+from singer.transform import string_to_datetime
+
+
+def get_mock_http_response(status_code=200, contents='{"clients": []}'):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = contents.encode()
+    return response
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z", "user_agent": "test"})
+        tap_harvest.AUTH = mock.Mock()
+        tap_harvest.AUTH.get_access_token.return_value = "test"
+        tap_harvest.AUTH.get_account_id.return_value = "123"
+
+    @mock.patch("singer.metrics.log")
+    @mock.patch("requests.Session.send", return_value=get_mock_http_response())
+    def test_request_emits_http_timer(self, mocked_send, mocked_log):
+        """
+            Verify that every request emits an http_request_duration metric
+            tagged with the current stream and the status code
+        """
+        with telemetry.stream("clients"):
+            tap_harvest.request("https://api.harvestapp.com/v2/clients")
+
+        point = mocked_log.call_args[0][1]
+        self.assertEqual(point.metric, metrics.Metric.http_request_duration)
+        self.assertEqual(point.tags[metrics.Tag.endpoint], "clients")
+        self.assertEqual(point.tags[metrics.Tag.http_status_code], 200)
+        self.assertEqual(telemetry.TOTALS["clients"][telemetry.HTTP_REQUEST_COUNT], 1)
+        self.assertEqual(telemetry.TOTALS["clients"][telemetry.HTTP_RESPONSE_BYTES],
+                         len('{"clients": []}'))
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request")
+    def test_sync_endpoint_counts_records_and_pages(self, mocked_request, *args):
+        """
+            Verify that records and pages are counted per stream
+        """
+        mocked_request.side_effect = [
+            {"clients": [{"id": 1, "created_at": None, "updated_at": "2021-01-01T00:00:00Z"}], "next_page": 2},
+            {"clients": [{"id": 2, "created_at": None, "updated_at": "2021-01-01T00:00:00Z"}], "next_page": None},
+        ]
+        tap_harvest.sync_endpoint("clients")
+
+        self.assertEqual(telemetry.TOTALS["clients"][metrics.Metric.record_count], 2)
+        self.assertEqual(telemetry.TOTALS["clients"][telemetry.PAGE_COUNT], 2)
+
+    @mock.patch("time.sleep")
+    def test_ratelimit_sleep_is_counted(self, mocked_sleep):
+        """
+            Verify that the time the rate limiter sleeps is counted for the current stream
+        """
+        limited = tap_harvest.ratelimit(1, 15)(lambda: None)
+        with telemetry.stream("tasks"):
+            limited()
+            limited()
+
+        self.assertEqual(mocked_sleep.call_count, 1)
+        self.assertGreater(telemetry.TOTALS["tasks"][telemetry.RATE_LIMIT_SLEEP], 0)
+
+    @mock.patch("time.sleep")
+    def test_background_ratelimit_sleep_is_not_charged(self, mocked_sleep):
+        """
+            Verify that the rate limiter sleeping on a worker thread is not charged to
+            the stream's time, as the sync thread is not waiting on it
+        """
+        limited = tap_harvest.ratelimit(1, 15)(lambda: None)
+        with telemetry.background("tasks"):
+            limited()
+            limited()
+
+        self.assertEqual(mocked_sleep.call_count, 1)
+        self.assertNotIn(telemetry.RATE_LIMIT_SLEEP, telemetry.TOTALS["tasks"])
+
+    @mock.patch("time.perf_counter")
+    def test_time_breakdown_excludes_child_streams(self, mocked_perf_counter):
+        """
+            Verify that time spent in a child stream is not part of the parent's own time
+            and that the time not spent in any phase is reported as "other"
+        """
+        # parent starts, child starts, child ends, parent ends
+        mocked_perf_counter.side_effect = [0.0, 1.0, 4.0, 10.0]
+        with telemetry.stream("invoices"):
+            telemetry.add_time(telemetry.HTTP_TIME, 2.0)
+            with telemetry.stream("invoice_messages"):
+                telemetry.add_time(telemetry.HTTP_TIME, 3.0)
+
+        breakdown = telemetry.time_breakdown()
+
+        self.assertEqual(telemetry.TOTALS["invoices"][telemetry.STREAM_DURATION], 10.0)
+        self.assertEqual(breakdown["invoices"]["total"], 7.0)
+        self.assertEqual(breakdown["invoices"]["http"], 2.0)
+        self.assertEqual(breakdown["invoices"]["other"], 5.0)
+        self.assertEqual(breakdown["invoice_messages"]["total"], 3.0)
+        self.assertEqual(breakdown["invoice_messages"]["other"], 0.0)
+
+
+class TestStablePagination(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+        tap_harvest.STATE.clear()
+        tap_harvest.TAP_STATE.clear()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+
+    def tearDown(self):
+        tap_harvest.UPDATED_BEFORE = None
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request")
+    def test_rows_read_twice_are_written_once(self, mocked_request, mocked_state,
+                                              mocked_schema, mocked_record):
+        """
+            Verify that a row that moved to the next page while paginating is written once
+        """
+        mocked_request.side_effect = [
+            {"clients": [{"id": 1, "created_at": None, "updated_at": "2021-01-01T00:00:00Z"}], "next_page": 2},
+            {"clients": [{"id": 1, "created_at": None, "updated_at": "2021-01-01T00:00:00Z"},
+                         {"id": 2, "created_at": None, "updated_at": "2021-01-01T00:00:00Z"}], "next_page": None},
+        ]
+        tap_harvest.sync_endpoint("clients")
+
+        self.assertEqual([call[0][1]["id"] for call in mocked_record.call_args_list], [1, 2])
+        self.assertEqual(telemetry.TOTALS["clients"][telemetry.DUPLICATE_COUNT], 1)
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request")
+    def test_rows_updated_during_the_run_are_left_for_the_next(self, mocked_request, mocked_state,
+                                                               mocked_schema, mocked_record):
+        """
+            Verify that rows updated after the sync started are not written
+            and do not move the bookmark past the start of the sync
+        """
+        tap_harvest.UPDATED_BEFORE = "2021-06-01T00:00:00.000000Z"
+        mocked_request.return_value = {
+            "clients": [{"id": 1, "created_at": None, "updated_at": "2021-01-01T00:00:00Z"},
+                        {"id": 2, "created_at": None, "updated_at": "2021-07-01T00:00:00Z"}],
+            "next_page": None}
+        tap_harvest.sync_endpoint("clients")
+
+        self.assertEqual([call[0][1]["id"] for call in mocked_record.call_args_list], [1])
+        self.assertEqual(tap_harvest.TAP_STATE["clients"], "2021-01-01T00:00:00.000000Z")
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request")
+    def test_next_link_is_followed(self, mocked_request, *args):
+        """
+            Verify that `links.next` is followed when the response has it
+        """
+        mocked_request.side_effect = [
+            {"clients": [], "next_page": 2,
+             "links": {"next": "https://api.harvestapp.com/v2/clients?cursor=abc&per_page=2000"}},
+            {"clients": [], "next_page": None, "links": {"next": None}},
+        ]
+        tap_harvest.sync_endpoint("clients")
+
+        self.assertEqual(mocked_request.call_args_list[1][0],
+                         ("https://api.harvestapp.com/v2/clients",
+                          {"cursor": "abc", "per_page": "2000"}))
+
+
+class TestPreTransformFilter(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        tap_harvest.EMITTED_IDS.clear()
+        tap_harvest.STATE.clear()
+        tap_harvest.CONFIG.update({"start_date": "2021-01-01T00:00:00Z"})
+
+    def test_normalize_datetime_matches_transform(self):
+        """
+            Verify that the raw bookmark is normalized to the value Transformer.transform gives
+        """
+        for value in ["2021-01-01T00:00:00Z", "2021-01-01T10:20:30.123Z",
+                      "2021-01-01T02:00:00+02:00", "2021-01-01"]:
+            self.assertEqual(tap_harvest.normalize_datetime(value),
+                             string_to_datetime(value))
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request")
+    def test_rows_before_the_bookmark_are_not_transformed(self, mocked_request, mocked_state,
+                                                          mocked_schema, mocked_record):
+        """
+            Verify that rows updated before the bookmark are dropped before transform
+        """
+        mocked_request.return_value = {
+            "clients": [{"id": 1, "created_at": None, "updated_at": "2020-01-01T00:00:00Z"},
+                        {"id": 2, "created_at": None, "updated_at": "2021-02-01T00:00:00Z"}],
+            "next_page": None}
+        with mock.patch("singer.Transformer.transform", side_effect=lambda row, schema: row) \
+             as mocked_transform:
+            tap_harvest.sync_endpoint("clients")
+
+        self.assertEqual(mocked_transform.call_count, 1)
+        self.assertEqual([call[0][1]["id"] for call in mocked_record.call_args_list], [2])
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+import datetime
+from unittest import mock
+from tap_harvest import openmetrics, telemetry
+
+
+class TestOpenMetricsExporter(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+
+    def test_render_stream_counters(self):
+        """
+            Verify that stream totals are rendered as OpenMetrics counters with a `_total` suffix
+        """
+        telemetry.TOTALS["clients"]["record_count"] = 5
+        telemetry.TOTALS["clients"][telemetry.HTTP_429_COUNT] = 2
+
+        text = openmetrics.render(telemetry.TOTALS, {}, 0)
+
+        self.assertIn('# TYPE tap_harvest_records counter', text)
+        self.assertIn('tap_harvest_records_total{stream="clients"} 5.0', text)
+        self.assertIn('tap_harvest_http_429_total{stream="clients"} 2.0', text)
+        self.assertIn('tap_harvest_run_complete 0', text)
+        self.assertTrue(text.endswith('# EOF\n'))
+
+    def test_write_renders_a_snapshot(self):
+        """
+            Verify that the exporter renders a copy of the totals taken under the lock,
+            which worker threads can keep counting into while it is written
+        """
+        telemetry.TOTALS["clients"]["record_count"] = 5
+        snapshot = telemetry.snapshot()
+        telemetry.TOTALS["clients"]["record_count"] += 1
+        telemetry.TOTALS["tasks"]["record_count"] = 1
+
+        self.assertEqual(snapshot, {"clients": {"record_count": 5}})
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch("tap_harvest.telemetry.snapshot", return_value=snapshot):
+            path = os.path.join(directory, "tap_harvest.prom")
+            openmetrics.TextfileExporter(path).write({})
+            with open(path) as handle:
+                text = handle.read()
+
+        self.assertIn('tap_harvest_records_total{stream="clients"} 5.0', text)
+        self.assertNotIn('stream="tasks"', text)
+
+    def test_bookmark_lag(self):
+        """
+            Verify that bookmark lag is the time between now and the bookmark
+        """
+        now = datetime.datetime(2020, 1, 2, tzinfo=datetime.timezone.utc)
+        lags = openmetrics.bookmark_lags({"clients": "2020-01-01T00:00:00Z"}, now=now)
+
+        self.assertEqual(lags, {"clients": 86400.0})
+
+    def test_write_replaces_file(self):
+        """
+            Verify that the exporter writes the file and leaves no temporary file behind
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tap_harvest.prom")
+            exporter = openmetrics.from_config({"metrics_textfile": path})
+            exporter.write({}, complete=True)
+
+            self.assertEqual(os.listdir(directory), ["tap_harvest.prom"])
+            with open(path) as handle:
+                self.assertIn('tap_harvest_run_complete 1.0', handle.read())
+
+    def test_disabled_without_config(self):
+        """
+            Verify that no exporter is created when `metrics_textfile` is not configured
+        """
+        self.assertIsNone(openmetrics.from_config({}))
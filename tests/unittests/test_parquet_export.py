@@ -0,0 +1,203 @@
+import json
+import os
+import tempfile
+import tap_harvest
+from tap_harvest import telemetry
+import unittest
+from unittest import mock
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    from tap_harvest import parquet_export
+except ImportError:
+    pyarrow = None
+
+
+SCHEMA = {"type": "object", "properties": {
+    "id": {"type": ["null", "integer"]},
+    "hours": {"type": ["null", "number"]},
+    "tax": {"type": ["null", "string", "number"]},
+    "updated_at": {"type": ["null", "string"], "format": "date-time"},
+    "recipients": {"type": ["null", "array"], "items": {
+        "type": ["null", "object"], "properties": {"name": {"type": ["null", "string"]}}}},
+}}
+
+
+def files(directory, stream):
+    return sorted(os.path.relpath(os.path.join(root, name), os.path.join(directory, stream))
+                  for root, _, names in os.walk(os.path.join(directory, stream))
+                  for name in names)
+
+
+def read_rows(directory, stream):
+    rows = []
+    for name in files(directory, stream):
+        table = pyarrow.parquet.read_table(os.path.join(directory, stream, name))
+        rows.extend(table.to_pylist())
+    return rows
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestParquetExport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_types_come_from_the_schema(self):
+        """
+            Verify that columns get the Arrow type of their schema, and that values of mixed
+            types are written as strings
+        """
+        export = parquet_export.ParquetExport(self.directory.name)
+        export.set_schema("invoices", SCHEMA)
+        export.write("invoices", {"id": 1, "hours": 1.5, "tax": 10,
+                                  "updated_at": "2021-01-01T00:00:00.000000Z",
+                                  "recipients": [{"name": "a"}]})
+        export.write("invoices", {"id": 2, "tax": "exempt"})
+        export.commit({}, force=True)
+
+        table = pyarrow.parquet.read_table(os.path.join(self.directory.name, "invoices"))
+        self.assertEqual(table.schema.field("id").type, pyarrow.int64())
+        self.assertEqual(table.schema.field("hours").type, pyarrow.float64())
+        self.assertEqual(table.schema.field("updated_at").type, parquet_export.TIMESTAMP)
+        self.assertEqual(table.schema.field("recipients").type,
+                         pyarrow.list_(pyarrow.struct([("name", pyarrow.string())])))
+        self.assertEqual(table.column("tax").to_pylist(), ["10", "exempt"])
+        self.assertEqual(table.column("hours").to_pylist(), [1.5, None])
+
+    def test_files_are_committed_with_the_state(self):
+        """
+            Verify that files are only renamed to .parquet when they are committed, that
+            the state is written next to them, and that commits wait for enough rows
+        """
+        export = parquet_export.ParquetExport(self.directory.name, row_group_size=2)
+        export.set_schema("invoices", SCHEMA)
+        export.write("invoices", {"id": 1})
+        export.commit({"invoices": "2021-01-01T00:00:00Z"})
+
+        self.assertEqual([name[-len(parquet_export.IN_PROGRESS):] for name in
+                          files(self.directory.name, "invoices")],
+                         [parquet_export.IN_PROGRESS])
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, "state.json")))
+
+        export.commit({"invoices": "2021-01-02T00:00:00Z"}, force=True)
+        self.assertEqual([row["id"] for row in read_rows(self.directory.name, "invoices")], [1])
+        with open(os.path.join(self.directory.name, "state.json"), encoding="utf-8") as handle:
+            self.assertEqual(json.load(handle), {"invoices": "2021-01-02T00:00:00Z"})
+
+    def test_uncommitted_files_are_removed(self):
+        """
+            Verify that the next export removes the files an interrupted export did not commit
+        """
+        export = parquet_export.ParquetExport(self.directory.name)
+        export.set_schema("invoices", SCHEMA)
+        export.write("invoices", {"id": 1})
+        export.commit({}, force=True)
+        export.write("invoices", {"id": 2})
+
+        parquet_export.ParquetExport(self.directory.name)
+        self.assertEqual([row["id"] for row in read_rows(self.directory.name, "invoices")], [1])
+
+    def test_files_are_partitioned_by_date(self):
+        """
+            Verify that records are written under the date of their replication key, and
+            records without one under the null partition
+        """
+        export = parquet_export.ParquetExport(self.directory.name)
+        export.set_schema("invoices", SCHEMA)
+        for record_id, updated_at in ((1, "2021-01-01T10:00:00.000000Z"),
+                                      (2, "2021-01-02T00:00:00.000000Z"),
+                                      (3, "2021-01-01T23:00:00.000000Z"), (4, None)):
+            export.write("invoices", {"id": record_id, "updated_at": updated_at})
+        export.commit({}, force=True)
+
+        self.assertEqual([os.path.dirname(name) for name in files(self.directory.name, "invoices")],
+                         ["updated_at_date=2021-01-01", "updated_at_date=2021-01-02",
+                          "updated_at_date=" + parquet_export.NULL_PARTITION])
+        table = pyarrow.parquet.read_table(os.path.join(self.directory.name, "invoices"))
+        self.assertEqual(sorted(zip(table.column("id").to_pylist(),
+                                    table.column("updated_at_date").to_pylist())),
+                         [(1, "2021-01-01"), (2, "2021-01-02"), (3, "2021-01-01"), (4, None)])
+
+    @mock.patch("tap_harvest.parquet_export.MAX_OPEN_FILES", 1)
+    def test_closed_files_wait_for_the_commit(self):
+        """
+            Verify that files closed to keep few of them open are only renamed by the commit
+        """
+        export = parquet_export.ParquetExport(self.directory.name)
+        export.set_schema("invoices", SCHEMA)
+        export.write("invoices", {"id": 1, "updated_at": "2021-01-01T00:00:00.000000Z"})
+        export.write("invoices", {"id": 2, "updated_at": "2021-01-02T00:00:00.000000Z"})
+
+        self.assertTrue(all(name.endswith(parquet_export.IN_PROGRESS)
+                            for name in files(self.directory.name, "invoices")))
+        export.commit({}, force=True)
+        self.assertEqual([row["id"] for row in read_rows(self.directory.name, "invoices")],
+                         [1, 2])
+
+    def test_interrupted_commit_is_finished(self):
+        """
+            Verify that the next export renames the files and writes the state of a commit
+            that was interrupted once its commit file was written
+        """
+        export = parquet_export.ParquetExport(self.directory.name)
+        export.set_schema("invoices", SCHEMA)
+        export.write("invoices", {"id": 1})
+        export.commit({"invoices": "2021-01-01T00:00:00Z"}, force=True)
+        export.write("invoices", {"id": 2})
+        with mock.patch.object(parquet_export.ParquetExport, "_finish_commit"):
+            export.commit({"invoices": "2021-01-02T00:00:00Z"}, force=True)
+        export.write("invoices", {"id": 3})
+
+        parquet_export.ParquetExport(self.directory.name)
+        self.assertEqual([row["id"] for row in read_rows(self.directory.name, "invoices")],
+                         [1, 2])
+        with open(os.path.join(self.directory.name, "state.json"), encoding="utf-8") as handle:
+            self.assertEqual(json.load(handle), {"invoices": "2021-01-02T00:00:00Z"})
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestExportSync(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        self.directory = tempfile.TemporaryDirectory()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.STATE.clear()
+        tap_harvest.TAP_STATE.clear()
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+        tap_harvest.PARQUET = parquet_export.ParquetExport(self.directory.name)
+
+    def tearDown(self):
+        tap_harvest.PARQUET = None
+        tap_harvest.TAP_STATE.clear()
+        self.directory.cleanup()
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request")
+    def test_records_go_to_parquet(self, mocked_request, mocked_state, mocked_schema,
+                                   mocked_record):
+        """
+            Verify that in export mode records and state are written to the export directory
+            and no Singer messages are written
+        """
+        mocked_request.return_value = {"clients": [{"id": 1, "name": "Acme", "created_at": None,
+                                                    "updated_at": "2021-01-01T00:00:00Z"}],
+                                       "next_page": None}
+        tap_harvest.sync_endpoint("clients")
+        tap_harvest.PARQUET.commit(tap_harvest.TAP_STATE, force=True)
+
+        self.assertEqual([row["name"] for row in read_rows(self.directory.name, "clients")],
+                         ["Acme"])
+        with open(os.path.join(self.directory.name, "state.json"), encoding="utf-8") as handle:
+            self.assertEqual(json.load(handle), {"clients": "2021-01-01T00:00:00.000000Z"})
+        mocked_record.assert_not_called()
+        mocked_schema.assert_not_called()
+        mocked_state.assert_not_called()
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+import tap_harvest
+from tap_harvest import profiling
+
+
+class TestProfiling(unittest.TestCase):
+
+    def tearDown(self):
+        profiling.PROFILE_DIR = None
+        del profiling._PROFILES[:]
+        tracemalloc.stop()
+
+    def test_profile_writes_stream_files(self):
+        """
+            Verify that a profiled stream writes a pstats file and a text summary,
+            and that nested streams are part of the outer profile
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            profiling.enable(directory, top_n=5)
+            with profiling.profile("invoices"):
+                with profiling.profile("invoice_messages"):
+                    sum(range(1000))
+            profiling.write_summary()
+
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ["all.prof", "invoices.prof", "invoices.txt", "summary.txt"])
+
+    def test_profile_disabled(self):
+        """
+            Verify that nothing is profiled unless profiling is enabled
+        """
+        with mock.patch("cProfile.Profile") as mocked_profile:
+            with profiling.profile("clients"):
+                pass
+        self.assertFalse(mocked_profile.called)
+
+    @mock.patch("singer.utils.check_config")
+    @mock.patch("singer.utils.load_json", return_value={})
+    def test_profile_cli_argument(self, *args):
+        """
+            Verify that `--profile DIR` is accepted next to the standard singer arguments
+        """
+        with mock.patch.object(sys, "argv", ["tap-harvest", "--config", "config.json",
+                                             "--profile", "/tmp/profiles"]):
+            args = tap_harvest.parse_args()
+        self.assertEqual(args.profile_dir, "/tmp/profiles")
+        self.assertEqual(args.config_path, "config.json")
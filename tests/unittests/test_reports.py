@@ -0,0 +1,121 @@
+import datetime
+import tap_harvest
+from tap_harvest import telemetry
+import unittest
+from unittest import mock
+from singer import metadata
+
+
+NOW = datetime.datetime(2021, 3, 10, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def get_report(url, params=None):
+    if params["from"] == "20210309":
+        return {"results": [{"client_id": 1, "client_name": "Acme", "total_hours": 7.5,
+                             "billable_hours": 5.0, "currency": "EUR",
+                             "billable_amount": 500.0}],
+                "next_page": None}
+    return {"results": [], "next_page": None}
+
+
+class TestReportStreams(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        tap_harvest.CONFIG.update({"start_date": "2021-01-01T00:00:00Z"})
+        tap_harvest.STATE.clear()
+        tap_harvest.TAP_STATE.clear()
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+
+    def tearDown(self):
+        tap_harvest.SELECTED_STREAMS = None
+        tap_harvest.CONFIG.pop("report_lookback_days", None)
+        tap_harvest.CONFIG.pop("report_backfill_days", None)
+
+    def test_report_streams_are_replicated_by_date(self):
+        """
+            Verify that report streams are discovered as incremental streams with
+            `date` as their replication key
+        """
+        catalog = tap_harvest.get_catalog()
+        entry = catalog.get_stream("time_report_projects")
+        mdata = metadata.to_map(entry.metadata)
+
+        self.assertEqual(metadata.get(mdata, (), "valid-replication-keys"), ["date"])
+        self.assertEqual(metadata.get(mdata, (), "forced-replication-method"), "INCREMENTAL")
+        self.assertEqual(entry.key_properties, ["date", "project_id", "currency"])
+
+    @mock.patch("tap_harvest.request")
+    def test_reports_are_opt_in(self, mocked_request):
+        """
+            Verify that report streams are not synced unless selected in the catalog
+        """
+        tap_harvest.sync_report("time_report_clients")
+
+        self.assertTrue(tap_harvest.is_selected("clients"))
+        self.assertFalse(tap_harvest.is_selected("time_report_clients"))
+        mocked_request.assert_not_called()
+
+    @mock.patch("singer.utils.now", return_value=NOW)
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request", side_effect=get_report)
+    def test_days_since_bookmark_are_read(self, mocked_request, mocked_state,
+                                          mocked_schema, mocked_record, mocked_now):
+        """
+            Verify that each day from `report_lookback_days` before the bookmark until
+            today is requested on its own, and that its rows are written with their date
+        """
+        tap_harvest.SELECTED_STREAMS = {"time_report_clients"}
+        tap_harvest.CONFIG["report_lookback_days"] = 2
+        tap_harvest.STATE["time_report_clients"] = "2021-03-09T00:00:00.000000Z"
+
+        tap_harvest.sync_report("time_report_clients")
+
+        urls = {call[0][0] for call in mocked_request.call_args_list}
+        self.assertEqual(urls, {"https://api.harvestapp.com/v2/reports/time/clients"})
+        params = [call[0][1] for call in mocked_request.call_args_list]
+        self.assertEqual([(param["from"], param["to"]) for param in params],
+                         [("20210307", "20210307"), ("20210308", "20210308"),
+                          ("20210309", "20210309"), ("20210310", "20210310")])
+        self.assertEqual(mocked_record.call_count, 1)
+        record = mocked_record.call_args[0][1]
+        self.assertEqual(record["date"], "2021-03-09T00:00:00.000000Z")
+        self.assertEqual(record["billable_amount"], 500.0)
+        self.assertEqual(tap_harvest.TAP_STATE["time_report_clients"],
+                         "2021-03-10T00:00:00.000000Z")
+
+    @mock.patch.object(tap_harvest.request_report.limiter, "wait")
+    @mock.patch("singer.utils.now", return_value=NOW)
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request", side_effect=get_report)
+    def test_first_run_can_be_bounded(self, mocked_request, mocked_state, mocked_schema,
+                                      mocked_record, mocked_now, mocked_wait):
+        """
+            Verify that a report stream without a bookmark is read from `start_date`, or
+            from `report_backfill_days` before today when that is set and later, with a
+            warning
+        """
+        tap_harvest.SELECTED_STREAMS = {"time_report_clients"}
+        tap_harvest.sync_report("time_report_clients")
+        self.assertEqual(mocked_request.call_args_list[0][0][1]["from"], "20210101")
+
+        mocked_request.reset_mock()
+        tap_harvest.STATE.clear()
+        tap_harvest.CONFIG["report_backfill_days"] = 3
+        with self.assertLogs(level="WARNING") as logs:
+            tap_harvest.sync_report("time_report_clients")
+        self.assertIn("report_backfill_days", logs.output[0])
+
+        params = [call[0][1] for call in mocked_request.call_args_list]
+        self.assertEqual([param["from"] for param in params],
+                         ["20210307", "20210308", "20210309", "20210310"])
+
+        mocked_request.reset_mock()
+        tap_harvest.STATE.clear()
+        tap_harvest.CONFIG["report_backfill_days"] = 100
+        tap_harvest.sync_report("time_report_clients")
+        self.assertEqual(mocked_request.call_args_list[0][0][1]["from"], "20210101")
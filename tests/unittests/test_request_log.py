@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+from tap_harvest import request_log, telemetry
+
+
+class TestRequestLog(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+
+    def test_count_rows(self):
+        """
+            Verify that the rows of a page are the items of its list values
+        """
+        page = {"time_entries": [{"id": 1}, {"id": 2}], "next_page": 2, "links": {}}
+
+        self.assertEqual(request_log.count_rows(page), 2)
+
+    @mock.patch("tap_harvest.request_log.LOGGER")
+    def test_unsampled_request_is_not_logged(self, mocked_logger):
+        """
+            Verify that a fast, successful request is not logged when it is not sampled
+        """
+        logger = request_log.RequestLogger(sample_rate=0, progress_interval=0)
+        logger.log("https://api.harvestapp.com/v2/clients", 200, 0.1, 10, 1)
+
+        mocked_logger.info.assert_not_called()
+        mocked_logger.warning.assert_not_called()
+
+    @mock.patch("tap_harvest.request_log.LOGGER")
+    def test_slow_request_is_always_logged(self, mocked_logger):
+        """
+            Verify that a request slower than the threshold is logged even when not sampled
+        """
+        logger = request_log.RequestLogger(sample_rate=0, slow_threshold=5, progress_interval=0)
+        with telemetry.stream("clients"):
+            logger.log("https://api.harvestapp.com/v2/clients", 200, 6.0, 10, 1)
+
+        line = mocked_logger.warning.call_args[0][1]
+        self.assertIn('"slow": true', line)
+        self.assertIn('"stream": "clients"', line)
+
+    @mock.patch("time.monotonic")
+    @mock.patch("tap_harvest.request_log.LOGGER")
+    def test_progress_summary(self, mocked_logger, mocked_monotonic):
+        """
+            Verify that a progress summary is logged per stream once the interval has passed
+        """
+        mocked_monotonic.side_effect = [0, 30, 61, 61]
+        telemetry.TOTALS["clients"][telemetry.PAGE_COUNT] = 3
+        logger = request_log.RequestLogger(progress_interval=60)
+
+        logger.maybe_log_progress()
+        mocked_logger.info.assert_not_called()
+
+        logger.maybe_log_progress()
+        line = mocked_logger.info.call_args[0][1]
+        self.assertIn('"pages": 3', line)
@@ -0,0 +1,103 @@
+import email.utils
+import time
+import tap_harvest
+from tap_harvest import retry, telemetry
+import unittest
+import requests
+from unittest import mock
+
+
+def get_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b'{"clients": [], "next_page": null}'
+    response.headers.update(headers or {})
+    return response
+
+
+def http_error(status_code, headers=None):
+    return requests.exceptions.HTTPError(response=get_response(status_code, headers))
+
+
+@mock.patch("time.sleep")
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        telemetry.TOTALS.clear()
+
+    def test_retry_after_is_honoured(self, mocked_sleep):
+        """
+            Verify that a 429 with Retry-After is retried after the time asked for,
+            without spending the retry budget
+        """
+        policy = retry.RetryPolicy(retry.RetryBudget(ratio=0, minimum=0))
+        func = mock.Mock(side_effect=[http_error(429, {"Retry-After": "7"}), "ok"])
+
+        self.assertEqual(policy.call(func), "ok")
+        mocked_sleep.assert_called_once_with(7.0)
+        self.assertEqual(policy.budget.retries, 0)
+        self.assertEqual(telemetry.TOTALS[None][telemetry.HTTP_RETRY_COUNT], 1)
+
+    def test_retry_after_date(self, mocked_sleep):
+        """
+            Verify that Retry-After given as an HTTP date is turned into seconds
+        """
+        header = email.utils.formatdate(time.time() + 30, usegmt=True)
+        wait = retry.retry_after(get_response(503, {"Retry-After": header}))
+
+        self.assertGreater(wait, 25)
+        self.assertLessEqual(wait, 30)
+        self.assertIsNone(retry.retry_after(get_response(500, {"Retry-After": "5"})))
+
+    def test_client_errors_are_not_retried(self, mocked_sleep):
+        """
+            Verify that 4xx responses other than 429 are raised without retrying
+        """
+        func = mock.Mock(side_effect=http_error(404))
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            retry.RetryPolicy().call(func)
+        self.assertEqual(func.call_count, 1)
+        mocked_sleep.assert_not_called()
+
+    def test_decorrelated_jitter(self, mocked_sleep):
+        """
+            Verify that each wait is between the base delay and three times the previous wait,
+            and never above the maximum
+        """
+        policy = retry.RetryPolicy()
+        delay = retry.BASE_DELAY
+        for _ in range(50):
+            next_delay = policy.next_delay(delay)
+            self.assertGreaterEqual(next_delay, retry.BASE_DELAY)
+            self.assertLessEqual(next_delay, min(retry.MAX_DELAY, delay * 3))
+            delay = next_delay
+
+    def test_spent_budget_stops_retries(self, mocked_sleep):
+        """
+            Verify that failures are raised without retrying once the budget is spent
+        """
+        policy = retry.RetryPolicy(retry.RetryBudget(ratio=0, minimum=1))
+        func = mock.Mock(side_effect=requests.exceptions.ConnectionError)
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            policy.call(func)
+        self.assertEqual(func.call_count, 2)
+        self.assertEqual(telemetry.TOTALS[None][telemetry.RETRY_BUDGET_SPENT], 1)
+
+    @mock.patch("tap_harvest.AUTH")
+    @mock.patch("requests.Request.prepare")
+    @mock.patch("requests.Session.send")
+    def test_request_waits_on_429(self, mocked_send, mocked_prepare, mocked_auth, mocked_sleep):
+        """
+            Verify that request() waits and retries on a 429 instead of giving up
+        """
+        mocked_auth.get_access_token.return_value = "token"
+        mocked_auth.get_account_id.return_value = "1"
+        mocked_send.side_effect = [get_response(429, {"Retry-After": "3"}), get_response(200)]
+
+        self.assertEqual(tap_harvest.request("https://api.harvestapp.com/v2/clients"),
+                         {"clients": [], "next_page": None})
+        self.assertEqual(mocked_send.call_count, 2)
+        self.assertIn(mock.call(3.0), mocked_sleep.call_args_list)
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+import tap_harvest
+from tap_harvest import bundle_schemas, schema_bundle
+import unittest
+from unittest import mock
+
+
+class TestSchemaBundle(unittest.TestCase):
+
+    def setUp(self):
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+
+    def test_bundle_is_up_to_date(self):
+        """
+            Verify that the schema bundle matches the JSON schemas,
+            run `python -m tap_harvest.bundle_schemas` when this fails
+        """
+        self.assertEqual(schema_bundle.SCHEMAS, bundle_schemas.read_schemas())
+
+    @mock.patch("singer.utils.load_json")
+    def test_schemas_load_from_the_bundle(self, mocked_load_json):
+        """
+            Verify that bundled schemas are loaded without reading the schema files
+        """
+        schema = tap_harvest.load_schema("time_entries")
+
+        self.assertIn("updated_at", schema["properties"])
+        mocked_load_json.assert_not_called()
+
+    @mock.patch("singer.write_schema")
+    def test_schema_is_written_once(self, mocked_write_schema):
+        """
+            Verify that child streams write their SCHEMA message once per run,
+            not once per parent row
+        """
+        for _ in range(3):
+            tap_harvest.load_and_write_schema("user_roles", key_properties=["user_id", "role_id"])
+
+        self.assertEqual(mocked_write_schema.call_count, 1)
+
+    def test_optional_features_are_not_imported(self):
+        """
+            Verify that importing the tap does not import the modules of features the
+            config has to turn on
+        """
+        optional = ["tap_harvest.columnar", "tap_harvest.concurrency", "tap_harvest.deletes",
+                    "tap_harvest.fingerprints", "tap_harvest.hedging", "tap_harvest.openmetrics",
+                    "tap_harvest.parquet_export", "tap_harvest.workers"]
+        imported = subprocess.run(
+            [sys.executable, "-c", "import sys, tap_harvest; print(' '.join(sys.modules))"],
+            capture_output=True, check=True, text=True).stdout.split()
+
+        self.assertEqual([name for name in optional if name in imported], [])
@@ -0,0 +1,230 @@
+import tap_harvest
+import requests
+from tap_harvest import telemetry
+import unittest
+from unittest import mock
+from singer import metadata
+
+
+INVOICE = {"id": 1, "period_start": None, "period_end": None, "issue_date": None,
+           "due_date": None, "sent_at": None, "paid_at": None, "paid_date": None,
+           "closed_at": None, "created_at": None, "updated_at": "2021-01-01T00:00:00Z",
+           "client": None, "estimate": None, "retainer": None, "creator": None,
+           "line_items": [{"id": 10, "project": None}]}
+MESSAGE = {"id": 100, "send_reminder_on": None, "created_at": None, "updated_at": "2021-01-01T00:00:00Z"}
+
+
+def get_response(url, params=None):
+    if url.endswith("invoices"):
+        return {"invoices": [dict(INVOICE)], "next_page": None}
+    if url.endswith("messages"):
+        return {"invoice_messages": [dict(MESSAGE)], "next_page": None}
+    return {"invoice_payments": [], "next_page": None}
+
+
+class TestDiscovery(unittest.TestCase):
+
+    def test_catalog_has_every_schema(self):
+        """
+            Verify that discovery returns a stream for every schema with its key properties,
+            replication key and parent stream
+        """
+        catalog = tap_harvest.get_catalog()
+        streams = {entry.tap_stream_id: entry for entry in catalog.streams}
+
+        self.assertEqual(set(streams), set(tap_harvest.STREAMS))
+        invoice_messages = metadata.to_map(streams["invoice_messages"].metadata)
+        self.assertEqual(metadata.get(invoice_messages, (), "table-key-properties"), ["id"])
+        self.assertEqual(metadata.get(invoice_messages, (), "valid-replication-keys"),
+                         ["updated_at"])
+        self.assertEqual(metadata.get(invoice_messages, (), "parent-tap-stream-id"), "invoices")
+        user_roles = metadata.to_map(streams["user_roles"].metadata)
+        self.assertEqual(metadata.get(user_roles, (), "forced-replication-method"), "FULL_TABLE")
+
+
+class TestSelection(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.STATE.clear()
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+
+    def tearDown(self):
+        tap_harvest.SELECTED_STREAMS = None
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request", side_effect=get_response)
+    def test_unselected_children_are_not_requested(self, mocked_request, mocked_state,
+                                                   mocked_schema, mocked_record):
+        """
+            Verify that the parent of a selected child is fetched but not emitted
+            and that unselected child streams make no requests
+        """
+        tap_harvest.SELECTED_STREAMS = {"invoice_messages"}
+        tap_harvest.sync_invoices()
+
+        urls = [call[0][0] for call in mocked_request.call_args_list]
+        self.assertEqual(urls, ["https://api.harvestapp.com/v2/invoices",
+                                "https://api.harvestapp.com/v2/invoices/1/messages"])
+        self.assertEqual({call[0][0] for call in mocked_record.call_args_list},
+                         {"invoice_messages"})
+        self.assertEqual({call[0][0] for call in mocked_schema.call_args_list},
+                         {"invoice_messages"})
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request", side_effect=get_response)
+    def test_unselected_parent_keeps_its_bookmark(self, mocked_request, mocked_state,
+                                                  mocked_schema, mocked_record):
+        """
+            Verify that a parent fetched only for its children does not move its own
+            bookmark, so it is synced from the start date once it is selected
+        """
+        tap_harvest.TAP_STATE.clear()
+        tap_harvest.SELECTED_STREAMS = {"invoice_messages"}
+        tap_harvest.sync_invoices()
+
+        self.assertNotIn("invoices", tap_harvest.TAP_STATE)
+        self.assertEqual(tap_harvest.TAP_STATE["invoices__children"],
+                         "2021-01-01T00:00:00.000000Z")
+
+        tap_harvest.STATE.update(tap_harvest.TAP_STATE)
+        tap_harvest.SELECTED_STREAMS = {"invoices", "invoice_messages"}
+        tap_harvest.sync_invoices()
+        self.assertEqual(mocked_request.call_args_list[2][0][1]["updated_since"],
+                         "2020-01-01T00:00:00Z")
+        tap_harvest.TAP_STATE.clear()
+
+    @mock.patch("tap_harvest.request")
+    def test_unselected_stream_is_skipped(self, mocked_request):
+        """
+            Verify that a stream with nothing selected makes no requests
+        """
+        tap_harvest.SELECTED_STREAMS = {"clients"}
+        tap_harvest.sync_invoices()
+
+        mocked_request.assert_not_called()
+
+    def test_selected_streams_from_catalog(self):
+        """
+            Verify that only streams selected in the catalog are synced
+        """
+        catalog = tap_harvest.get_catalog()
+        for entry in catalog.streams:
+            if entry.tap_stream_id == "clients":
+                mdata = metadata.write(metadata.to_map(entry.metadata), (), "selected", True)
+                entry.metadata = metadata.to_list(mdata)
+
+        self.assertEqual(tap_harvest.get_selected_streams(catalog), {"clients"})
+        self.assertIsNone(tap_harvest.get_selected_streams(None))
+
+
+class TestFieldSelection(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.STATE.clear()
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+
+    def tearDown(self):
+        tap_harvest.SELECTED_STREAMS = None
+        tap_harvest.SELECTED_FIELDS = {}
+
+    def test_deselected_fields(self):
+        """
+            Verify that deselected properties are dropped, but key properties and the
+            replication key are kept even when deselected
+        """
+        catalog = tap_harvest.get_catalog()
+        for entry in catalog.streams:
+            mdata = metadata.to_map(entry.metadata)
+            for key in entry.schema.properties:
+                if key != "subject":
+                    mdata = metadata.write(mdata, ("properties", key), "selected", False)
+            entry.metadata = metadata.to_list(mdata)
+
+        fields = tap_harvest.get_selected_fields(catalog)
+
+        self.assertEqual(fields["invoice_messages"], {"id", "updated_at", "subject"})
+        self.assertEqual(fields["user_roles"], {"user_id", "role_id"})
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request", side_effect=get_response)
+    def test_rows_are_projected_before_transform(self, mocked_request, mocked_state,
+                                                 mocked_schema, mocked_record):
+        """
+            Verify that only selected properties are transformed, written and described
+            in the schema, while the for_each handlers still see the whole row
+        """
+        tap_harvest.SELECTED_STREAMS = {"invoices", "invoice_line_items"}
+        tap_harvest.SELECTED_FIELDS = {"invoices": {"id", "updated_at"}}
+        tap_harvest.sync_invoices()
+
+        records = {call[0][0]: call[0][1] for call in mocked_record.call_args_list}
+        self.assertEqual(set(records["invoices"]), {"id", "updated_at"})
+        self.assertEqual(records["invoice_line_items"]["invoice_id"], 1)
+        schemas = {call[0][0]: call[0][1] for call in mocked_schema.call_args_list}
+        self.assertEqual(set(schemas["invoices"]["properties"]), {"id", "updated_at"})
+
+
+def reject_updated_since(url, params=None):
+    if url.endswith("messages") and "updated_since" in params:
+        raise requests.exceptions.HTTPError(response=mock.Mock(status_code=422))
+    return get_response(url, params)
+
+
+class TestChildUpdatedSince(unittest.TestCase):
+
+    def setUp(self):
+        telemetry.flush()
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.STATE.clear()
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+        tap_harvest.EMITTED_IDS.clear()
+        tap_harvest.SELECTED_STREAMS = {"invoice_messages"}
+
+    def tearDown(self):
+        tap_harvest.SELECTED_STREAMS = None
+        tap_harvest.CHILD_UPDATED_SINCE["invoice_messages"] = True
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request", side_effect=get_response)
+    def test_child_request_has_updated_since(self, mocked_request, mocked_state,
+                                             mocked_schema, mocked_record):
+        """
+            Verify that child endpoints are asked only for children updated since
+            the child stream's bookmark
+        """
+        tap_harvest.sync_invoices()
+
+        params = mocked_request.call_args_list[1][0][1]
+        self.assertEqual(params["updated_since"], "2020-01-01T00:00:00Z")
+        self.assertEqual(mocked_record.call_count, 1)
+
+    @mock.patch("singer.write_record")
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_harvest.request", side_effect=reject_updated_since)
+    def test_rejected_updated_since_reads_in_full(self, mocked_request, mocked_state,
+                                                  mocked_schema, mocked_record):
+        """
+            Verify that an endpoint answering updated_since with 422 is read in full
+            and is not sent updated_since again
+        """
+        tap_harvest.sync_invoices()
+
+        params = [call[0][1] for call in mocked_request.call_args_list[1:]]
+        self.assertEqual(["updated_since" in param for param in params], [True, False])
+        self.assertFalse(tap_harvest.CHILD_UPDATED_SINCE["invoice_messages"])
+        self.assertEqual(mocked_record.call_count, 1)
@@ -0,0 +1,91 @@
+import datetime
+import io
+import tap_harvest
+from tap_harvest import workers
+import unittest
+from unittest import mock
+
+
+NOW = datetime.datetime(2021, 2, 1, tzinfo=datetime.timezone.utc)
+OBJECTS = {"client": None, "project": {"id": 3}, "expense_category": None, "user": None,
+           "user_assignment": None, "invoice": None}
+
+
+def expense(expense_id, updated_at):
+    return dict(OBJECTS, id=expense_id, receipt=None, updated_at=updated_at, created_at=None,
+                spent_date="2021-01-02", total_cost=expense_id * 1.5)
+
+
+class TestTransformPool(unittest.TestCase):
+
+    def test_pages_come_back_in_order(self):
+        """
+            Verify that results are yielded in the order of the pages, whether the pages
+            were run in a worker or in this process
+        """
+        pool = workers.TransformPool(2, min_rows=3)
+        try:
+            pages = [([3, 2, 1],), ([5, 4],), ([9, 8, 7],), ([6],)]
+            self.assertEqual(list(pool.map_pages(sorted, iter(pages))),
+                             [(page, sorted(page[0])) for page in pages])
+        finally:
+            pool.close()
+
+    def test_small_runs_do_not_start_workers(self):
+        """
+            Verify that pages smaller than min_rows are run in this process
+        """
+        pool = workers.TransformPool(2)
+        self.assertEqual([result for _, result in pool.map_pages(sorted, [([2, 1],)])], [[1, 2]])
+        self.assertIsNone(pool._executor)
+
+    def test_from_config(self):
+        """
+            Verify that the pool is off by default
+        """
+        self.assertIsNone(workers.from_config({}))
+        self.assertIsNone(workers.from_config({"transform_workers": "0"}))
+        pool = workers.from_config({"transform_workers": "3", "transform_workers_min_rows": 10})
+        self.assertEqual((pool.workers, pool.min_rows), (3, 10))
+
+
+class TestPoolSync(unittest.TestCase):
+
+    def setUp(self):
+        tap_harvest.CONFIG.update({"start_date": "2020-01-01T00:00:00Z"})
+        tap_harvest.WRITTEN_SCHEMAS.clear()
+
+    def tearDown(self):
+        if tap_harvest.TRANSFORM_POOL is not None:
+            tap_harvest.TRANSFORM_POOL.close()
+        tap_harvest.TRANSFORM_POOL = None
+
+    def sync(self, pool):
+        tap_harvest.TRANSFORM_POOL = pool
+        tap_harvest.STATE.clear()
+        tap_harvest.TAP_STATE.clear()
+        tap_harvest.EMITTED_IDS.clear()
+        # the second expense moved to the second page while the first was read
+        pages = {1: {"expenses": [expense(1, "2021-01-01T00:00:00Z"),
+                                  expense(2, "2021-01-02T00:00:00Z")], "next_page": 2},
+                 2: {"expenses": [expense(2, "2021-01-02T00:00:00Z"),
+                                  expense(3, "2021-01-03T00:00:00Z")], "next_page": None}}
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout, \
+             mock.patch("singer.utils.now", return_value=NOW), \
+             mock.patch("singer.write_schema"), mock.patch("singer.write_state"), \
+             mock.patch("tap_harvest.request",
+                        side_effect=lambda url, params: pages[int(params["page"])]):
+            tap_harvest.sync_expenses()
+        return stdout.getvalue(), dict(tap_harvest.TAP_STATE)
+
+    def test_workers_write_the_same_messages(self):
+        """
+            Verify that records serialized by the workers are written in the same order and
+            with the same state as in process, and that rows written while a page was in a
+            worker are not written again
+        """
+        expected = self.sync(None)
+        self.assertEqual(expected[0].count('"RECORD"'), 3)
+        pool = workers.TransformPool(1, min_rows=1)
+        self.assertEqual(self.sync(pool), expected)
+        self.assertIsNotNone(pool._executor)